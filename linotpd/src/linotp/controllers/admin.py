@@ -50,6 +50,9 @@ from linotp.lib.token import setPinSo
 from linotp.lib.token import setRealms, getTokenType
 from linotp.lib.token import getTokens4UserOrSerial
 from linotp.lib.token import getTokenRealms
+from linotp.lib.token_bulk import BULK_OPERATIONS
+from linotp.lib.token_bulk import bulk_token_operation
+from linotp.lib.token_bulk import get_filtered_serials
 from linotp.tokens import tokenclass_registry
 
 from linotp.lib.error import ParameterError
@@ -82,6 +85,7 @@ from linotp.lib.challenges import Challenges
 
 from linotp.lib.policy import checkPolicyPre
 from linotp.lib.policy import checkPolicyPost
+from linotp.lib.policy import getAdminPolicies
 from linotp.lib.policy import PolicyException
 from linotp.lib.policy import getOTPPINEncrypt
 
@@ -165,6 +169,12 @@ class AdminController(BaseController):
             if serial:
                 c.audit['serial'] = serial
                 c.audit['token_type'] = getTokenType(serial)
+
+            # the bulk operations are reported like the single operations
+
+            if action == 'bulk':
+                action = self.request_params.get('operation', action)
+
             if action in ['assign', 'unassign', 'enable', 'disable', 'init',
                           'loadtokens', 'copyTokenUser', 'losttoken',
                           'remove', 'tokenrealm']:
@@ -1366,6 +1376,116 @@ class AdminController(BaseController):
         finally:
             Session.close()
 
+    def bulk(self):
+        """
+        method:
+            admin/bulk
+
+        description:
+            run an admin operation on many tokens with one request. The
+            admin policies are evaluated once and the tokens are changed
+            in chunks.
+
+        arguments:
+            * operation - required - one of enable, disable, remove,
+                          unassign, reset or tokenrealm
+            * tokens[]  - the token serials
+            * filter    - or the token filter expression of admin/show
+            * realms    - the comma separated list of the new token realms
+                          for the tokenrealm operation
+
+        returns:
+            a json result with the number of changed tokens and the lists
+            of the denied and not found serials
+
+        exception:
+            if an error occurs an exception is serialized and returned
+
+        remark:
+            tokens, which the admin is not allowed to manage, are skipped
+            and returned as denied
+        """
+
+        param = self.request_params
+
+        try:
+
+            try:
+                operation = param['operation']
+            except KeyError:
+                raise ParameterError("Missing parameter: 'operation'")
+
+            if operation not in BULK_OPERATIONS:
+                raise ParameterError("Unsupported operation: %r. Supported "
+                                     "are: %s" % (operation, ', '.join(
+                                         sorted(BULK_OPERATIONS))))
+
+            realms = None
+            if operation == 'tokenrealm':
+                try:
+                    realms = [realm.strip().lower() for realm
+                              in param['realms'].split(',') if realm.strip()]
+                except KeyError:
+                    raise ParameterError("Missing parameter: 'realms'")
+
+            if 'tokens' in param:
+                serials = param['tokens']
+                if isinstance(serials, (str, unicode)):
+                    serials = serials.split(',')
+                serials = [serial.strip() for serial in serials]
+
+            elif 'filter' in param:
+
+                # the search is restricted to the realms of the admin
+
+                policies = getAdminPolicies(BULK_OPERATIONS[operation])
+
+                search_realms = '*'
+                if policies['active'] and '*' not in policies['realms']:
+                    search_realms = policies['realms']
+
+                serials = get_filtered_serials(param['filter'],
+                                               search_realms)
+
+            else:
+                raise ParameterError("Missing parameter: 'tokens' or "
+                                     "'filter'")
+
+            log.info("[bulk] %s of %d tokens", operation, len(serials))
+
+            result = bulk_token_operation(operation, serials, realms=realms)
+
+            c.audit['success'] = result['processed']
+            c.audit['action_detail'] = (
+                "%s: %d changed, %d denied, %d not found" % (
+                    operation, result['processed'], len(result['denied']),
+                    len(result['not_found'])))
+            c.audit['info'] = ("%r " % serials)[:80]
+
+            if operation == 'tokenrealm':
+                c.audit['source_realm'] = result['realms']
+                c.audit['realm'] = realms
+            else:
+                c.audit['realm'] = result['realms']
+
+            logTokenNum(c.audit)
+
+            Session.commit()
+            return sendResult(response, result, 1)
+
+        except PolicyException as pe:
+            log.exception('[bulk] policy failed %r' % pe)
+            Session.rollback()
+            return sendError(response, unicode(pe), 1)
+
+        except Exception as e:
+            log.exception('[bulk] failed: %r' % e)
+            Session.rollback()
+            return sendError(response, e, 1)
+
+        finally:
+            Session.close()
+
 
 ########################################################
 
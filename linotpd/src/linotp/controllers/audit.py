@@ -110,6 +110,30 @@ class AuditController(BaseController):
                 it a parameter or=true is passed, the filters will
                 be OR concatenated.
 
+            The values are matched exactly, unless they contain the
+            wildcard '%'.
+
+            * from, to - optional: date range of the audit entries, like
+                         '2018-01-31' or '2018-01-31 12:00:00'. A 'to' day
+                         includes the whole day.
+            * cursor - optional: keyset paging - the number of the last
+                       entry of the previous page or empty for the first
+                       page. The response contains the cursor of the next
+                       page. The 'page' parameter is then ignored.
+            * count - optional: if set to "estimate", the total is only
+                      estimated instead of counted
+
+            For the export of large audit trails:
+
+            * stream - optional: if set to "true", the rows are fetched by a
+                       server side cursor
+            * verify - optional: "true" verifies the signature of each row,
+                       "parallel" verifies the signatures in batches by a
+                       process pool, which requires the config entry
+                       linotpAudit.sql.verify_processes, and "false" skips
+                       the verification and returns the signature for a
+                       later verification
+
             The Flexigrid provides us the following parameters:
                 ('page', u'1'), ('rp', u'25'),
                 ('sortname', u'number'),
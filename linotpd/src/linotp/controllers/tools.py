@@ -198,6 +198,65 @@ class ToolsController(BaseController):
         finally:
             Session.close()
 
+    def update_token_owner(self):
+        """
+        fill the owner login of the assigned tokens, which is used for the
+        token search by user in admin/show
+
+        :param refresh: (optional) update the owner login of all assigned
+                        tokens - by default only the tokens, where the owner
+                        login is not resolved yet, are updated
+        """
+
+        from linotp.lib.tools.update_token_owner import UpdateTokenOwnerHandler
+
+        try:
+            refresh = boolean(self.request_params.get('refresh', False))
+
+            handler = UpdateTokenOwnerHandler()
+            ret = handler.update_token_owners(refresh=refresh)
+
+            c.audit['info'] = ("%d token owners updated, %d unknown" %
+                               (ret['updated'], ret['unknown']))
+            c.audit['success'] = True
+
+            Session.commit()
+            return sendResult(response, ret)
+
+        except Exception as e:
+            log.exception("failed: %r" % e)
+            Session.rollback()
+            return sendError(response, e, 1)
+
+        finally:
+            Session.close()
+
+    def refresh_otp_lookahead(self):
+        """
+        rebuild the otp lookahead index of the unassigned tokens, which is
+        used for the auto assignment and the token lookup by otp - the
+        refresh could be run as regular background job
+        """
+
+        from linotp.lib.otp_lookahead import refresh_otp_lookahead
+
+        try:
+            ret = refresh_otp_lookahead()
+
+            c.audit['info'] = "%d tokens indexed" % ret['indexed']
+            c.audit['success'] = True
+
+            Session.commit()
+            return sendResult(response, ret)
+
+        except Exception as e:
+            log.exception("failed: %r" % e)
+            Session.rollback()
+            return sendError(response, e, 1)
+
+        finally:
+            Session.close()
+
     def import_users(self):
         """
         import users from a csv file into an dedicated sql resolver
@@ -28,6 +28,7 @@
 validate controller - to check the authentication request
 """
 
+import json
 import logging
 
 import webob
@@ -53,7 +54,9 @@ from linotp.lib.reply import sendQRImageResult
 from linotp.lib.reply import sendResult, sendError
 from linotp.lib.selftest import isSelfTest
 from linotp.lib.token import getTokens4UserOrSerial
+from linotp.lib.token import get_token_ids_of_batch
 from linotp.lib.token import get_tokenserial_of_transaction
+from linotp.lib.token import lock_tokens
 from linotp.tokens.base import TokenClass
 
 from linotp.lib.user import User
@@ -111,12 +114,13 @@ class ValidateController(BaseController):
         return response
 
 
-    def _check(self, param):
+    def _check(self, param, tokens=None):
         '''
         basic check function, that can be used by different controllers
 
         :param param: dict of all caller parameters
         :type param: dict
+        :param tokens: the already read and locked tokens of the user
 
         :return: Tuple of True or False and opt
         :rtype: Tuple(boolean, opt)
@@ -158,7 +162,8 @@ class ValidateController(BaseController):
                     options = {}
                 options['initTime'] = initTime
         vh = ValidationHandler()
-        (ok, opt) = vh.checkUserPass(user, passw, options=options)
+        (ok, opt) = vh.checkUserPass(user, passw, options=options,
+                                     tokens=tokens)
 
         c.audit.update(request_context.get('audit'))
         c.audit['success'] = ok
@@ -822,6 +827,253 @@ class ValidateController(BaseController):
             Session.close()
 
 
+    def _check_serial(self, param, tokens=None):
+        '''
+        check the serial and the password of a batch item like check_s
+
+        :param param: dict of the item parameters
+        :param tokens: the already read and locked tokens of the serial
+        :return: Tuple of True or False and opt
+        '''
+
+        options = {}
+        options.update(param)
+        for k in ['user', 'serial', "pass", "init"]:
+            if k in options:
+                del options[k]
+
+        if 'init' in param:
+            if isSelfTest() is True:
+                options['initTime'] = param.get('init')
+
+        serial = param.get('serial')
+        c.audit['serial'] = serial
+
+        options['scope'] = {"check_s": True}
+        vh = ValidationHandler()
+        (ok, opt) = vh.checkSerialPass(serial, param.get('pass'),
+                                       options=options, tokens=tokens)
+        c.audit['success'] = ok
+
+        return (ok, opt)
+
+    def _get_batch_token_ids(self, params):
+        '''
+        read the token ids of all batch items with one query
+
+        :param params: list of the item parameter dicts
+        :return: list of the token id lists of the items - None for the
+                 items, where the tokens are read by the validation itself
+        '''
+
+        users = []
+        user_items = []
+        serials = []
+
+        for pos, param in enumerate(params):
+
+            if 'serial' in param:
+                if param['serial'] and '*' not in param['serial']:
+                    serials.append(param['serial'])
+                continue
+
+            # the user is resolved like in _check, including the setrealm
+            # policy, so that the same tokens are found
+
+            try:
+                user = getUserFromParam(param)
+                if user.is_empty or not user.login:
+                    continue
+
+                realm = user.realm or getDefaultRealm()
+                user.realm = set_realm(user.login, realm)
+
+            except Exception as exx:
+                log.warning("[check_batch] user of item %d not resolved: "
+                            "%r" % (pos, exx))
+                continue
+
+            users.append(user)
+            user_items.append(pos)
+
+        token_ids = [None] * len(params)
+
+        try:
+            (user_token_ids,
+             serial_token_ids) = get_token_ids_of_batch(users, serials)
+
+        except Exception as exx:
+            log.warning("[check_batch] failed to read the tokens of the "
+                        "items: %r" % exx)
+            return token_ids
+
+        for pos, ids in zip(user_items, user_token_ids):
+            token_ids[pos] = ids
+
+        for pos, param in enumerate(params):
+            if param.get('serial') in serial_token_ids:
+                token_ids[pos] = serial_token_ids[param['serial']]
+
+        return token_ids
+
+    def check_batch(self):
+        '''
+        This function is used to validate many credentials with one request,
+        e.g. for a RADIUS frontend, which multiplexes the logins of its
+        clients.
+
+        method:
+            validate/check_batch
+
+        arguments:
+
+           * items: list of the credentials - as json list, where each item
+                    is a dict with the parameters of validate/check (user,
+                    realm, pass, ...) or of validate/check_s (serial, pass)
+                    and an optional id, which is returned with the result
+
+        remark:
+            the number of items is limited by the config entry
+            validate.batch.max_items (default 100)
+
+        returns:
+            JSON response with a list of the item results::
+
+                {
+                    "result": {
+                        "status": true,
+                        "value": [
+                            {"id": 1, "status": true, "value": true},
+                            {"id": 2, "status": true, "value": false,
+                             "detail": {...}}
+                        ]
+                    }
+                }
+
+            every item is audited on its own and the items share the request
+            context - the config, the policies and the resolvers are loaded
+            only once for all items and the tokens of all items are read
+            with one query.
+        '''
+
+        request_audit = c.audit
+        request_user = request_context.get('RequestUser')
+
+        try:
+            items = self.request_params.get('items')
+            if items is None:
+                raise ParameterError(_('Missing required parameter "items"!'))
+
+            if isinstance(items, basestring):
+                items = json.loads(items)
+
+            if (not isinstance(items, list) or
+                    not all(isinstance(item, dict) for item in items)):
+                raise ParameterError(_('Parameter "items" must be a list of '
+                                       'dicts!'))
+
+            max_items = int(getFromConfig('validate.batch.max_items', 100))
+            if len(items) > max_items:
+                raise ParameterError(_('Too many items: %d - the maximum is '
+                                       '%d!') % (len(items), max_items))
+
+        except Exception as exx:
+            log.exception("[check_batch] invalid request: %r" % exx)
+            c.audit['info'] = unicode(exx)
+            Session.close()
+            return sendError(response, exx)
+
+        params = [dict((key, unicode(value))
+                       for key, value in item.items() if key != 'id')
+                  for item in items]
+
+        # the tokens are read for all items at once, but as every item is
+        # committed on its own, they are locked per item
+
+        batch_token_ids = self._get_batch_token_ids(params)
+
+        results = []
+
+        for item, param, token_ids in zip(items, params, batch_token_ids):
+
+            # every item gets its own audit entry, which starts with the
+            # data of the request
+
+            c.audit = dict(request_audit)
+            request_context['audit'] = c.audit
+
+            result = {'status': True}
+            if 'id' in item:
+                result['id'] = item['id']
+
+            ok = False
+            opt = None
+
+            # the policies of the item are evaluated for the user of the item
+
+            item_user = User()
+            request_context['RequestUser'] = item_user
+
+            try:
+                try:
+                    item_user = getUserFromParam(param)
+                    request_context['RequestUser'] = item_user
+
+                    tokens = None
+                    if token_ids is not None:
+                        tokens = lock_tokens(token_ids)
+
+                    if 'serial' in param:
+                        (ok, opt) = self._check_serial(param, tokens=tokens)
+                    else:
+                        (ok, opt) = self._check(param, tokens=tokens)
+
+                except (AuthorizeException, ParameterError) as exx:
+                    log.warning("[check_batch] authorization failed for "
+                                "validate/check_batch: %r" % exx)
+                    c.audit['success'] = False
+                    c.audit['info'] = unicode(exx)
+                    ok = False
+                    if is_auth_return(ok, user=item_user):
+                        if opt is None:
+                            opt = {}
+                        opt['error'] = c.audit.get('info')
+
+                Session.commit()
+
+            except Exception as exx:
+                log.exception("[check_batch] item failed: %r" % exx)
+                c.audit['info'] = "%r" % exx
+                Session.rollback()
+                result['status'] = False
+                ok = False
+                opt = None
+
+            result['value'] = ok
+            if opt is not None:
+                result['detail'] = opt
+
+            results.append(result)
+
+            audit.log(c.audit)
+
+        # the request itself is audited with the summary of the items
+
+        c.audit = request_audit
+        request_context['audit'] = c.audit
+        request_context['RequestUser'] = request_user
+
+        c.audit['success'] = all(result['value'] for result in results)
+        c.audit['action_detail'] = "%d items, %d valid" % (
+            len(results), len([r for r in results if r['value']]))
+
+        try:
+            Session.commit()
+            return sendResult(response, results, 0)
+
+        finally:
+            Session.close()
+
     def ok(self):
         return sendResult(response, True, 0)
 
@@ -40,6 +40,25 @@ pver = float(int(ma) + int(mi) * 0.1)
 
 log = logging.getLogger(__name__)
 
+try:
+
+    from hmac import compare_digest
+
+except ImportError:
+
+    # for python version < 2.7.7
+
+    def compare_digest(a, b):
+
+        if len(a) != len(b):
+            return False
+
+        result = 0
+        for letter_a, letter_b in zip(a, b):
+            result |= ord(letter_a) ^ ord(letter_b)
+
+        return result == 0
+
 
 class HmacOtp():
 
@@ -84,6 +103,33 @@ class HmacOtp():
             self.counter = counter + 1
         return sotp
 
+    def window(self, start, end):
+        """
+        generate the otp values of a counter window
+
+        the secret is decrypted only once for the whole window instead of
+        once per counter
+
+        :param start: the first counter of the window
+        :param end: the end of the window (excluded)
+        :return: list of (counter, otp value) tuples
+        """
+
+        counters = range(start, end)
+        if not counters:
+            return []
+
+        data_inputs = [struct.pack(">Q", c) for c in counters]
+        digests = self.secretObj.hmac_digests(data_inputs,
+                                              hash_algo=self.hashfunc)
+
+        otps = []
+        for c, digest in zip(counters, digests):
+            otp = str(self.truncate(str(digest)))
+            otps.append((c, (self.digits - len(otp)) * "0" + otp))
+
+        return otps
+
     def checkOtp(self, anOtpVal, window, symetric=False):
         res = -1
         start = self.counter
@@ -94,12 +140,20 @@ class HmacOtp():
             start = 0 if (start < 0) else start
             end = self.counter + (window)
 
-        for c in range(start , end):
-            otpval = self.generate(c)
+        otp_val = unicode(anOtpVal).encode('utf-8')
 
-            if (unicode(otpval) == unicode(anOtpVal)):
+        # compare against every otp of the window, so that the duration of
+        # the check does not reveal the position of the matching counter
+        for c, otpval in self.window(start, end):
+            if compare_digest(otpval, otp_val) and res == -1:
                 res = c
-                break
+
+        # keep the counter state as a counter by counter evaluation would do
+        if res != -1:
+            self.counter = res + 1
+        elif start < end:
+            self.counter = end
+
         #return -1 or the counter
         return res
 
@@ -34,6 +34,74 @@ from linotp.lib.security.provider import SecurityProvider
 
 log = logging.getLogger(__name__)
 
+
+class ConfigSnapshot(object):
+    """
+    immutable, versioned view of the global linotp config
+
+    a snapshot is never modified after it has been published - every change
+    of the global config creates a new snapshot (copy on write), which
+    replaces the former one by a single reference assignment. Thus a request
+    could refer to the actual snapshot without any copy or lock.
+    """
+
+    def __init__(self, entries=None, version=0):
+        self._entries = entries or {}
+        self.version = version
+
+    def derive(self, update=None, remove=None):
+        """
+        create the successor snapshot with the given modifications
+
+        :param update: dict of entries, which are added or replaced
+        :param remove: list of entry names, which are removed
+        :return: new ConfigSnapshot with the next version
+        """
+
+        entries = dict(self._entries)
+
+        for key in remove or []:
+            entries.pop(key, None)
+
+        if update:
+            entries.update(copy.deepcopy(update))
+
+        return ConfigSnapshot(entries, self.version + 1)
+
+    def __getitem__(self, key):
+        return self._entries[key]
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        return self._entries.get(key, default)
+
+    def keys(self):
+        return self._entries.keys()
+
+    def items(self):
+        return self._entries.items()
+
+    def copy_into(self, target):
+        """
+        put the snapshot entries into the given (request local) dict
+        """
+        dict.update(target, self._entries)
+
+    def as_dict(self):
+        """
+        :return: a modifiable (shallow) copy of the snapshot entries
+        """
+        return dict(self._entries)
+
+
 class Globals(object):
 
     """Globals acts as a container for objects available throughout the
@@ -50,7 +118,7 @@ class Globals(object):
         self.rwl2 = RWLock()
         self.rcount = 0
 
-        self.config = {}
+        self.config_snapshot = ConfigSnapshot()
         self.config_incomplete = False
         self.configLock = RWLock()
         secLock = RWLock()
@@ -59,39 +127,38 @@ class Globals(object):
 
         self.cache_manager = None
 
+    def getConfigSnapshot(self):
+        '''
+            retrieve the actual, immutable config snapshot
+
+            as the snapshot is replaced as a whole on every change, no lock
+            is required for reading it
+        '''
+        return self.config_snapshot
+
     def getConfig(self):
         '''
-            retrieve (the deep copy of) the actual config
+            retrieve (a modifiable copy of) the actual config
         '''
-        self.configLock.acquire_read()
-        try:
-            config = copy.deepcopy(self.config)
-        finally:
-            self.configLock.release()
-        return config
+        return self.config_snapshot.as_dict()
 
     def setConfig(self, config, replace=False):
         '''
             set the app global config for linotp
         '''
-        err = None
+        ty = type(config).__name__
+        if ty != 'dict':
+            raise Exception('cannot set global config from object ' + ty)
+
         self.configLock.acquire_write()
         try:
-            ty = type(config).__name__
-            if ty != 'dict':
-                self.configLock.release()
-                err = 'cannot set global config from object ' + ty
-
-            else:
-                conf = copy.deepcopy(config)
-                if replace is True:
-                    self.config = conf
-                else:
-                    self.config.update(conf)
+            snapshot = self.config_snapshot
+            if replace is True:
+                snapshot = ConfigSnapshot(version=snapshot.version)
+
+            self.config_snapshot = snapshot.derive(update=config)
         finally:
             self.configLock.release()
-            if err is not None:
-                raise Exception(err)
         return
 
     def isConfigComplet(self):
@@ -119,17 +186,18 @@ class Globals(object):
         '''
             delete one entry in the appl_globals
         '''
+        ty = type(conf).__name__
+
+        if ty == 'list' or ty == 'dict':
+            keys = list(conf)
+        elif ty == 'str' or ty == 'unicode':
+            keys = [conf]
+        else:
+            return
+
         self.configLock.acquire_write()
         try:
-            ty = type(conf).__name__
-
-            if ty == 'list' or ty == 'dict':
-                for k in conf:
-                    if self.config.has_key(k):
-                        del self.config[k]
-            elif ty == 'str' or ty == 'unicode':
-                if self.config.has_key(conf):
-                    del self.config[conf]
+            self.config_snapshot = self.config_snapshot.derive(remove=keys)
         finally:
             self.configLock.release()
         return
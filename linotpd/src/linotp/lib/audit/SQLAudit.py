@@ -35,14 +35,23 @@ uses a public/private key for signing the log entries
 
 """
 
+import atexit
 import datetime
-from sqlalchemy import schema, types, orm, and_, or_, asc, desc
-
-from M2Crypto import EVP, RSA
+import itertools
+import multiprocessing
+import operator
+import re
+import threading
+from sqlalchemy import schema, types, orm, and_, or_, asc, desc, func
+
+from M2Crypto import BIO, EVP, RSA
 from binascii import hexlify
 from binascii import unhexlify
 from sqlalchemy import create_engine
+from linotp.lib.audit.archive import AuditArchive
 from linotp.lib.audit.base import AuditBase
+from linotp.lib.audit.writer import AuditQueueFull
+from linotp.lib.audit.writer import BatchWriter
 from pylons import config
 
 import logging.config
@@ -63,10 +72,103 @@ log = logging.getLogger(__name__)
 
 metadata = schema.MetaData()
 
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+SEARCH_DATE_FORMATS = [TIMESTAMP_FORMAT, "%Y-%m-%d %H:%M:%S",
+                       "%Y-%m-%d %H:%M", "%Y-%m-%d"]
+
+
 def now():
-    u_now = u"%s" % datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+    u_now = u"%s" % datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
     return u_now
 
+
+def parse_search_date(value):
+    """
+    parse the date of a search range, which might be given with or without
+    time and microseconds
+
+    :param value: date string like '2018-01-31 12:00:00'
+    :return: tuple of the datetime and the boolean, if only a day was given
+    :raises ValueError: if the date format is not supported
+    """
+
+    value = value.strip()
+
+    for date_format in SEARCH_DATE_FORMATS:
+        try:
+            date = datetime.datetime.strptime(value, date_format)
+            return date, date_format == "%Y-%m-%d"
+        except ValueError:
+            pass
+
+    raise ValueError("unsupported date format: %r" % value)
+
+
+def _created_condition(compare, date):
+    """
+    compare the created datetime of the entries with a date of the search
+    range - the entries without created datetime, e.g. after an offline
+    upgrade of the audit table, are compared by their timestamp string,
+    which sorts like the datetime
+
+    :param compare: comparison operator like operator.ge
+    :param date: the datetime of the search range
+    :return: sqlalchemy condition
+    """
+
+    return or_(compare(AuditTable.created, date),
+               and_(AuditTable.created == None,
+                    compare(AuditTable.timestamp,
+                            u"%s" % date.strftime(TIMESTAMP_FORMAT))))
+
+
+def _compare(column, value):
+    """
+    compare the column by a LIKE only if the search value contains a
+    wildcard - otherwise the exact match could make use of the index
+    """
+
+    if '%' in value:
+        return column.like(value)
+
+    return column == value
+
+
+def _match(value):
+    """
+    the python counterpart of _compare for the rows of the audit archive
+
+    :return: function, which is called with the row value
+    """
+
+    if '%' not in value:
+        return lambda row_value: row_value == value
+
+    regex = '.*'.join(re.escape(part).replace('\\_', '.')
+                      for part in value.split('%'))
+    pattern = re.compile('^%s$' % regex, re.IGNORECASE | re.DOTALL)
+
+    return lambda row_value: pattern.match(u'%s' % (row_value or '')) is not None
+
+
+# the search parameters and the corresponding audit columns
+
+SEARCH_COLUMNS = {
+    'serial': 'serial',
+    'user': 'user',
+    'realm': 'realm',
+    'action': 'action',
+    'action_detail': 'action_detail',
+    'date': 'timestamp',
+    'success': 'success',
+    'tokentype': 'tokentype',
+    'administrator': 'administrator',
+    'info': 'info',
+    'linotp_server': 'linotp_server',
+    'client': 'client',
+    }
+
 ######################## MODEL ################################################
 table_prefix = config.get("linotpAudit.sql.table_prefix", "")
 
@@ -77,6 +179,7 @@ audit_table = schema.Table(audit_table_name, metadata,
                                                        optional=True),
                   primary_key=True),
     schema.Column('timestamp', types.Unicode(30), default=now, index=True),
+    schema.Column('created', types.DateTime, index=True),
     schema.Column('signature', types.Unicode(512), default=u''),
     schema.Column('action', types.Unicode(30), index=True),
     schema.Column('success', types.Unicode(30), default=u"False"),
@@ -172,7 +275,12 @@ class AuditTable(object):
         self.client = unicode(client or '')
         self.log_level = unicode(log_level or '')
         self.clearance_level = clearance_level
-        self.timestamp = now()
+
+        # the timestamp string is part of the signature, the created datetime
+        # is used for the range search
+        created = datetime.datetime.now()
+        self.timestamp = u"%s" % created.strftime(TIMESTAMP_FORMAT)
+        self.created = created
         self.siganture = ' '
 
     def _get_field_len(self, col_name):
@@ -273,6 +381,44 @@ def add_column(engine, table, column):
     return result
 
 
+# the signature verification in the processes of the verify pool - as the
+# M2Crypto key could not be pickled, every process loads the public key once
+
+_pool_verify_key = None
+
+
+def _init_verify_process(public_key):
+    global _pool_verify_key
+
+    rsa_key = RSA.load_pub_key_bio(BIO.MemoryBuffer(public_key))
+    _pool_verify_key = EVP.PKey()
+    _pool_verify_key.reset_context(md='sha256')
+    _pool_verify_key.assign_rsa(rsa_key)
+
+
+def _verify_signatures(items):
+    """
+    verify the signatures in a process of the verify pool
+
+    :param items: list of tuples with the signed string and the signature
+    :return: list of booleans
+    """
+
+    results = []
+
+    for s_audit, signature in items:
+        if not signature:
+            results.append(False)
+            continue
+
+        _pool_verify_key.verify_init()
+        _pool_verify_key.verify_update(s_audit)
+        results.append(
+            _pool_verify_key.verify_final(unhexlify(signature)) == 1)
+
+    return results
+
+
 ###############################################################################
 class Audit(AuditBase):
     """
@@ -286,6 +432,29 @@ class Audit(AuditBase):
         implicit_returning = config.get("linotpSQL.implicit_returning", True)
 
         self.engine = None
+
+        # initialize signing keys
+        self.readKeys()
+
+        # the process pool for the batch verification is forked, when the
+        # audit is loaded - before the engine connects and before the writer
+        # thread is started, so that the processes do not inherit any db
+        # connection or lock of the audit
+
+        self.verify_pool = None
+        self.verify_processes = int(config.get(
+                                'linotpAudit.sql.verify_processes', 0))
+        self.verify_timeout = float(config.get(
+                                'linotpAudit.sql.verify_timeout', 60))
+
+        if self.verify_processes > 0:
+            self.verify_pool = multiprocessing.Pool(
+                                    self.verify_processes,
+                                    initializer=_init_verify_process,
+                                    initargs=(self.public,))
+
+            atexit.register(self.verify_pool.terminate)
+
         ########################## SESSION ##################################
 
         # Create an engine and create all the tables we need
@@ -310,14 +479,47 @@ class Audit(AuditBase):
                                    autocommit=True, expire_on_commit=True)
         self.session = orm.scoped_session(self.sm)
 
-        # initialize signing keys
-        self.readKeys()
+        # the private key is parsed only once - as the key context is not
+        # thread safe, the signing is serialized by the sign lock
+
+        self.SignEVP = EVP.load_key_string(self.private)
+        self.sign_lock = threading.Lock()
 
         self.PublicKey = RSA.load_pub_key(
                                           self.config.get("linotpAudit.key.public"))
         self.VerifyEVP = EVP.PKey()
         self.VerifyEVP.reset_context(md='sha256')
         self.VerifyEVP.assign_rsa(self.PublicKey)
+        self.verify_lock = threading.Lock()
+
+        # the archive segments of the audit trail - see linotp-sql-janitor
+        self.archive = None
+        if config.get('linotpAudit.archive.dir'):
+            self.archive = AuditArchive(config.get('linotpAudit.archive.dir'))
+
+        # in the async mode the audit entries are queued and written in
+        # batches by a background writer - the default is the synchronous
+        # write within the request
+
+        self.writer = None
+
+        if config.get('linotpAudit.sql.async', 'False') == 'True':
+
+            self.writer = BatchWriter(
+                self._write_batch,
+                queue_size=int(config.get(
+                    'linotpAudit.sql.async.queue_size', 10000)),
+                batch_size=int(config.get(
+                    'linotpAudit.sql.async.batch_size', 100)),
+                flush_interval=float(config.get(
+                    'linotpAudit.sql.async.flush_interval', 0.5)),
+                put_timeout=float(config.get(
+                    'linotpAudit.sql.async.put_timeout', 2.0)))
+
+            self.writer.start()
+
+            # flush all queued entries on shutdown
+            atexit.register(self.writer.stop)
 
         return
 
@@ -354,11 +556,13 @@ class Audit(AuditBase):
         line = self._attr_to_dict(audit_line)
         s_audit = getAsString(line)
 
-        key = EVP.load_key_string(self.private)
-        key.reset_context(md='sha256')
-        key.sign_init()
-        key.sign_update(s_audit)
-        signature = key.sign_final()
+        with self.sign_lock:
+            key = self.SignEVP
+            key.reset_context(md='sha256')
+            key.sign_init()
+            key.sign_update(s_audit)
+            signature = key.sign_final()
+
         return hexlify(signature)
 
 
@@ -373,12 +577,84 @@ class Audit(AuditBase):
 
         s_audit = getAsString(auditline)
 
-        self.VerifyEVP.verify_init()
-        self.VerifyEVP.verify_update(s_audit)
-        res = self.VerifyEVP.verify_final(unhexlify(signature))
+        with self.verify_lock:
+            self.VerifyEVP.verify_init()
+            self.VerifyEVP.verify_update(s_audit)
+            res = self.VerifyEVP.verify_final(unhexlify(signature))
 
         return res
 
+    def verifyRows(self, audit_lines):
+        '''
+        convert a batch of audit db rows into audit dicts, where the
+        signatures are verified in parallel by the verify pool
+
+        without verify pool, which requires the config entry
+        linotpAudit.sql.verify_processes, or if the pool fails or does not
+        answer within linotpAudit.sql.verify_timeout seconds, the signatures
+        are verified serially
+
+        :param audit_lines: list of audit db rows
+        :return: list of audit entry dicts
+        '''
+
+        lines = [self.row2dict(audit_line, verify=False)
+                 for audit_line in audit_lines]
+
+        results = None
+
+        pool = self.verify_pool
+        if pool is not None:
+            results = self._verify_parallel(pool, lines)
+
+        if results is None:
+            results = [self._verify(line, line['signature']) == 1
+                       for line in lines]
+
+        for line, result in zip(lines, results):
+            line['sig_check'] = "OK" if result else "FAIL"
+
+        return lines
+
+    def _verify_parallel(self, pool, lines):
+        '''
+        verify the signatures of the audit entries by the verify pool
+
+        :param pool: the verify pool
+        :param lines: list of audit entry dicts
+        :return: list of booleans or None, if the pool failed
+        '''
+
+        items = [(getAsString(line), line['signature']) for line in lines]
+
+        chunk_size = len(items) // (self.verify_processes * 4) + 1
+        chunks = [items[i:i + chunk_size]
+                  for i in range(0, len(items), chunk_size)]
+
+        try:
+            chunk_results = pool.map_async(_verify_signatures, chunks).get(
+                                                        self.verify_timeout)
+
+        except multiprocessing.TimeoutError:
+            log.error("[verifyRows] the verify pool did not answer within "
+                      "%r seconds - verifying serially", self.verify_timeout)
+
+            # a stuck pool is not used anymore
+            self.verify_pool = None
+            pool.terminate()
+            return None
+
+        except Exception as exx:
+            log.exception("[verifyRows] batch verification failed - "
+                          "verifying serially: %r", exx)
+            return None
+
+        results = []
+        for chunk_result in chunk_results:
+            results.extend(chunk_result)
+
+        return results
+
     def log(self, param):
         '''
         This method is used to log the data. It splits information of
@@ -429,13 +705,60 @@ class Audit(AuditBase):
                     config_param=self.config,
             )
 
-        self.session.add(at)
-        self.session.flush()
-        # At this point "at" contains the primary key id
-        at.signature = self._sign(at)
-        self.session.merge(at)
-        self.session.flush()
+        if self.writer:
+            try:
+                self.writer.put(at)
+                return
+
+            except AuditQueueFull as exx:
+                # we don't lose the entry but write it within the request
+                log.warning("[log_entry] %r - writing audit entry "
+                            "synchronously", exx)
 
+        self._write_entries([at])
+
+    def _write_entries(self, entries):
+        '''
+        write the audit entries within one transaction
+
+        the entries are inserted first, as the signature covers the id of
+        the audit entry, and then updated with their signature
+        '''
+
+        self.session.begin()
+        try:
+            self.session.add_all(entries)
+            self.session.flush()
+
+            # At this point the entries contain the primary key id
+            for at in entries:
+                at.signature = self._sign(at)
+
+            self.session.flush()
+            self.session.commit()
+
+        except Exception:
+            self.session.rollback()
+            raise
+
+    def _write_batch(self, entries):
+        '''
+        write a batch of audit entries - called by the background writer
+
+        if the batch could not be written, the entries are preserved at
+        least in the log
+        '''
+
+        try:
+            self._write_entries(entries)
+
+        except Exception as exx:
+            log.exception("[_write_batch] failed to write %d audit "
+                          "entries: %r", len(entries), exx)
+
+            for at in entries:
+                log.error("[_write_batch] lost audit entry: %r",
+                          self._attr_to_dict(at))
 
     def initialize_log(self, param):
         '''
@@ -456,8 +779,13 @@ class Audit(AuditBase):
     def _buildCondition(self, param, AND):
         '''
         create the sqlalchemy condition from the params
+
+        the search values are compared exactly, unless they contain the
+        wildcard '%'. The date range given by 'from' and 'to' is always
+        AND concatenated to the other conditions.
         '''
         conditions = []
+        range_conditions = []
         boolCheck = and_
         if not AND:
             boolCheck = or_
@@ -465,43 +793,195 @@ class Audit(AuditBase):
         for k, v in param.items():
             if "" != v:
                 if "serial" == k:
-                    conditions.append(AuditTable.serial.like(v))
+                    conditions.append(_compare(AuditTable.serial, v))
                 elif "user" == k:
-                    conditions.append(AuditTable.user.like(v))
+                    conditions.append(_compare(AuditTable.user, v))
                 elif "realm" == k:
-                    conditions.append(AuditTable.realm.like(v))
+                    conditions.append(_compare(AuditTable.realm, v))
                 elif "action" == k:
-                    conditions.append(AuditTable.action.like(v))
+                    conditions.append(_compare(AuditTable.action, v))
                 elif "action_detail" == k:
-                    conditions.append(AuditTable.action_detail.like(v))
+                    conditions.append(_compare(AuditTable.action_detail, v))
                 elif "date" == k:
-                    conditions.append(AuditTable.timestamp.like(v))
+                    conditions.append(_compare(AuditTable.timestamp, v))
                 elif "number" == k:
-                    conditions.append(AuditTable.id.like(v))
+                    try:
+                        conditions.append(AuditTable.id == int(v))
+                    except ValueError:
+                        conditions.append(AuditTable.id.like(v))
                 elif "success" == k:
-                    conditions.append(AuditTable.success.like(v))
+                    conditions.append(_compare(AuditTable.success, v))
                 elif "tokentype" == k:
-                    conditions.append(AuditTable.tokentype.like(v))
+                    conditions.append(_compare(AuditTable.tokentype, v))
                 elif "administrator" == k:
-                    conditions.append(AuditTable.administrator.like(v))
+                    conditions.append(_compare(AuditTable.administrator, v))
                 elif "info" == k:
-                    conditions.append(AuditTable.info.like(v))
+                    conditions.append(_compare(AuditTable.info, v))
                 elif "linotp_server" == k:
-                    conditions.append(AuditTable.linotp_server.like(v))
+                    conditions.append(_compare(AuditTable.linotp_server, v))
                 elif "client" == k:
-                    conditions.append(AuditTable.client.like(v))
+                    conditions.append(_compare(AuditTable.client, v))
+                elif "from" == k:
+                    start, _day = parse_search_date(v)
+                    range_conditions.append(
+                        _created_condition(operator.ge, start))
+                elif "to" == k:
+                    end, day = parse_search_date(v)
+                    if day:
+                        # the whole day is included
+                        end = end + datetime.timedelta(days=1)
+                        range_conditions.append(
+                            _created_condition(operator.lt, end))
+                    else:
+                        range_conditions.append(
+                            _created_condition(operator.le, end))
 
         all_conditions = None
         if conditions:
             all_conditions = boolCheck(*conditions)
 
+        if range_conditions:
+            if all_conditions is not None:
+                range_conditions.append(all_conditions)
+            all_conditions = and_(*range_conditions)
+
         return all_conditions
 
-    def row2dict(self, audit_line):
+    def _searchRange(self, param):
+        '''
+        get the id and timestamp range of the search
+
+        :return: tuple of min id, max id, start and end timestamp string
+        '''
+
+        min_id = max_id = start = end = None
+
+        if param.get('number'):
+            min_id = max_id = int(param['number'])
+
+        if param.get('from'):
+            start_date, _day = parse_search_date(param['from'])
+            start = start_date.strftime(TIMESTAMP_FORMAT)
+
+        if param.get('to'):
+            end_date, day = parse_search_date(param['to'])
+            if day:
+                end_date = (end_date + datetime.timedelta(days=1) -
+                            datetime.timedelta(microseconds=1))
+            end = end_date.strftime(TIMESTAMP_FORMAT)
+
+        return min_id, max_id, start, end
+
+    def _archiveSegments(self, param):
+        '''
+        get the archive segments, which are part of the search
+
+        the archive is only searched, if the search is restricted by the
+        number or the date range, which overlaps archived segments
+
+        :return: list of the segments
+        '''
+
+        if not self.archive:
+            return []
+
+        try:
+            min_id, max_id, start, end = self._searchRange(param)
+        except ValueError:
+            # number is a LIKE pattern
+            return []
+
+        if min_id is None and start is None and end is None:
+            return []
+
+        return self.archive.find_segments(min_id, max_id, start, end)
+
+    def _buildMatcher(self, param, AND, descending=False, cursor=None):
+        '''
+        create the python counterpart of the search condition for the rows
+        of the audit archive
+
+        :return: function, which is called with an archived row
+        '''
+
+        checks = []
+        boolCheck = all
+        if not AND:
+            boolCheck = any
+
+        for k, v in param.items():
+            if "" != v and k in SEARCH_COLUMNS:
+                checks.append((SEARCH_COLUMNS[k], _match(v)))
+
+        min_id, max_id, start, end = self._searchRange(param)
+
+        def match(row):
+
+            if min_id is not None and not min_id <= row.id <= max_id:
+                return False
+
+            if start is not None and row.timestamp < start:
+                return False
+
+            if end is not None and row.timestamp > end:
+                return False
+
+            if cursor is not None:
+                if descending and row.id >= cursor:
+                    return False
+                if not descending and row.id <= cursor:
+                    return False
+
+            if not checks:
+                return True
+
+            return boolCheck(check(getattr(row, column))
+                             for column, check in checks)
+
+        return match
+
+    def _keysetCondition(self, order, descending, cursor):
+        '''
+        create the keyset condition, which selects the entries after the
+        cursor entry in the given order - the id is the tie breaker for
+        non unique order columns
+
+        :param order: the order column
+        :param descending: boolean, if the order is descending
+        :param cursor: the id of the last entry of the previous page
+        :return: sqlalchemy condition
+        '''
+
+        if descending:
+            after_id = AuditTable.id < cursor
+        else:
+            after_id = AuditTable.id > cursor
+
+        if order is AuditTable.id:
+            return after_id
+
+        # lookup the order value of the cursor entry by its primary key
+        row = self.session.query(order).filter(AuditTable.id == cursor).first()
+        if row is None:
+            log.warning("[_keysetCondition] cursor entry %r not found - "
+                        "continue by id", cursor)
+            return after_id
+
+        value = row[0]
+        if descending:
+            after_value = order < value
+        else:
+            after_value = order > value
+
+        return or_(after_value, and_(order == value, after_id))
+
+    def row2dict(self, audit_line, verify=True):
         """
         convert an SQL audit db to a audit dict
 
         :param audit_line: audit db row
+        :param verify: if False, the signature is not verified but returned
+                       for a later verification
         :return: audit entry dict
         """
 
@@ -515,6 +995,11 @@ class Audit(AuditBase):
             elif value is None:
                 line[key] = ''
 
+        if not verify:
+            line['sig_check'] = ""
+            line['signature'] = audit_line.signature
+            return line
+
         # Signature check
         # TODO: use instead the verify_init
 
@@ -584,25 +1069,49 @@ class Audit(AuditBase):
                 order = AuditTable.clearance_level
 
         # build the ordering
-        order_dir = asc(order)
+        descending = False
 
         if rp_dict.get("sortorder"):
             sorto = rp_dict.get('sortorder').lower()
             if "desc" == sorto:
-                order_dir = desc(order)
+                descending = True
+
+        direction = desc if descending else asc
+
+        order_dir = [direction(order)]
+        if order is not AuditTable.id:
+            # the id is the tie breaker to get a stable ordering
+            order_dir.append(direction(AuditTable.id))
+
+        # in the keyset mode the page starts after the cursor entry, which
+        # is the last entry of the previous page - an empty cursor is the
+        # first page
+
+        if rp_dict.get('cursor'):
+            key_condition = self._keysetCondition(
+                                order, descending, int(rp_dict['cursor']))
+
+            if condition is None:
+                condition = key_condition
+            else:
+                condition = and_(condition, key_condition)
 
         if type(condition).__name__ == 'NoneType':
             audit_q = self.session.query(AuditTable)\
-                .order_by(order_dir)
+                .order_by(*order_dir)
         else:
             audit_q = self.session.query(AuditTable)\
                 .filter(condition)\
-                .order_by(order_dir)
+                .order_by(*order_dir)
 
-        # FIXME? BUT THIS IS SO MUCH SLOWER!
-        # FIXME: Here desc() ordering also does not work! :/
+        start = stop = None
 
-        if 'rp' in rp_dict or 'page' in rp_dict:
+        if 'cursor' in rp_dict:
+            # the keyset paging does not require an offset
+            start = 0
+            stop = int(rp_dict.get('rp', 15))
+
+        elif 'rp' in rp_dict or 'page' in rp_dict:
             # build the LIMIT and OFFSET
             page = 1
             offset = 0
@@ -618,28 +1127,99 @@ class Audit(AuditBase):
 
             start = offset
             stop = offset + limit
+
+        # the archived entries are older than the entries in the audit table
+        # so they could only be combined, if the result is ordered by id
+
+        segments = []
+        if order is AuditTable.id or order is AuditTable.timestamp:
+            segments = self._archiveSegments(param)
+
+        if start is not None and not segments:
             audit_q = audit_q.slice(start, stop)
 
         ## we drop here the ORM due to memory consumption
         ## and return a resultproxy for row iteration
-        result = self.session.execute(audit_q.statement)
-        return result
+        statement = audit_q.statement
+        if rp_dict.get('stream'):
+            # fetch the rows by a server side cursor, where supported
+            statement = statement.execution_options(stream_results=True)
+
+        result = self.session.execute(statement)
+
+        if not segments:
+            return result
+
+        cursor = None
+        if rp_dict.get('cursor'):
+            cursor = int(rp_dict['cursor'])
+
+        archived = self.archive.rows(
+                        segments,
+                        self._buildMatcher(param, AND, descending, cursor),
+                        descending)
+
+        if descending:
+            rows = itertools.chain(result, archived)
+        else:
+            rows = itertools.chain(archived, result)
+
+        if start is not None:
+            rows = itertools.islice(rows, start, stop)
+
+        return rows
 
 
 
-    def getTotal(self, param, AND=True, display_error=True):
+    def getTotal(self, param, AND=True, display_error=True, estimate=False):
         '''
         This method returns the total number of audit entries in
         the audit store
+
+        :param estimate: if True, the total is only estimated: without
+                         search condition from the id range, otherwise the
+                         count is limited to linotpAudit.sql.count_limit
         '''
         condition = self._buildCondition(param, AND)
+
+        if estimate:
+            return self._estimateTotal(condition)
+
         if type(condition).__name__ == 'NoneType':
             c = self.session.query(AuditTable).count()
         else:
             c = self.session.query(AuditTable).filter(condition).count()
 
+        segments = self._archiveSegments(param)
+        if segments:
+            match = self._buildMatcher(param, AND)
+            c += sum(1 for _row in self.archive.rows(segments, match))
+
         return c
 
+    def _estimateTotal(self, condition):
+        '''
+        estimate the number of audit entries without a full count
+        '''
+
+        if condition is None:
+            min_id, max_id = self.session.query(func.min(AuditTable.id),
+                                                func.max(AuditTable.id)).one()
+            if min_id is None:
+                return 0
+
+            return max_id - min_id + 1
+
+        count_limit = int(self.config.get('linotpAudit.sql.count_limit',
+                                          10000))
+
+        ids = self.session.query(AuditTable.id)\
+            .filter(condition)\
+            .limit(count_limit)\
+            .subquery()
+
+        return self.session.query(func.count()).select_from(ids).scalar()
+
 def getAsString(data):
     '''
     We need to distinguish, if this is an entry after the adding the
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+archive segments of the audit trail
+
+old audit entries are moved from the audit table into compressed segment
+files. A segment contains the complete rows - including the timestamp
+string and the signature - so the signatures could still be verified.
+
+the segments are described by the manifest in the archive directory, which
+holds for every segment the id and date range, the number of rows and the
+sha256 hash of the segment file.
+"""
+
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+
+from sqlalchemy import and_, select
+
+log = logging.getLogger(__name__)
+
+# the timestamp string format of the audit entries
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+MANIFEST = 'manifest.json'
+
+
+class ArchivedRow(object):
+    """
+    an audit row of an archive segment, which provides the same attribute
+    access as the audit db rows
+    """
+
+    def __init__(self, entry):
+        self.__dict__.update(entry)
+
+
+def _row_to_entry(row):
+    """
+    convert an audit db row into a json serializable dict
+    """
+
+    entry = {}
+
+    for key, value in row.items():
+        if isinstance(value, datetime.datetime):
+            value = value.strftime(TIMESTAMP_FORMAT)
+        entry[key] = value
+
+    return entry
+
+
+class AuditArchive(object):
+    """
+    the archive directory with the audit segments and their manifest
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._manifest = None
+        self._manifest_mtime = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def get_segments(self):
+        """
+        get the segment descriptions of the manifest - the manifest is
+        reloaded if it has been changed
+
+        :return: list of segment dicts, ordered by id
+        """
+
+        path = self._path(MANIFEST)
+
+        if not os.path.isfile(path):
+            return []
+
+        mtime = os.path.getmtime(path)
+        if self._manifest is None or mtime != self._manifest_mtime:
+            with open(path, 'r') as manifest:
+                self._manifest = json.load(manifest).get('segments', [])
+            self._manifest_mtime = mtime
+
+        return self._manifest
+
+    def _save_segments(self, segments):
+        """
+        write the manifest - the manifest is replaced atomically
+        """
+
+        path = self._path(MANIFEST)
+        tmp_path = path + '.tmp'
+
+        with open(tmp_path, 'w') as manifest:
+            json.dump({'segments': segments}, manifest, indent=2)
+            manifest.flush()
+            os.fsync(manifest.fileno())
+
+        os.rename(tmp_path, path)
+
+        self._manifest = None
+
+    def find_segments(self, min_id=None, max_id=None, start=None, end=None):
+        """
+        get the segments, which overlap the id and date range
+
+        :param min_id: lowest id or None
+        :param max_id: highest id or None
+        :param start: earliest timestamp string or None
+        :param end: latest timestamp string or None
+        :return: list of segment dicts
+        """
+
+        segments = []
+
+        for segment in self.get_segments():
+            if min_id is not None and segment['last_id'] < min_id:
+                continue
+            if max_id is not None and segment['first_id'] > max_id:
+                continue
+            if start is not None and segment['last_date'] < start:
+                continue
+            if end is not None and segment['first_date'] > end:
+                continue
+            segments.append(segment)
+
+        return segments
+
+    def read_segment(self, segment):
+        """
+        read the rows of a segment
+
+        :param segment: the segment dict
+        :return: generator of ArchivedRow, ordered by id
+        """
+
+        with gzip.open(self._path(segment['name']), 'rb') as segment_file:
+            for line in segment_file:
+                yield ArchivedRow(json.loads(line))
+
+    def rows(self, segments, match=None, descending=False):
+        """
+        read the matching rows of the segments
+
+        :param segments: list of segment dicts
+        :param match: function, which is called with the row
+        :param descending: if True, the rows are returned in descending id
+                           order - as the segments are stream compressed,
+                           the rows of one segment are reversed in memory
+        :return: generator of ArchivedRow
+        """
+
+        if descending:
+            segments = reversed(segments)
+
+        for segment in segments:
+
+            rows = self.read_segment(segment)
+            if match:
+                rows = (row for row in rows if match(row))
+
+            if descending:
+                rows = reversed(list(rows))
+
+            for row in rows:
+                yield row
+
+    def verify_segment(self, segment):
+        """
+        verify the segment file by its hash in the manifest
+
+        :return: boolean
+        """
+
+        return _file_hash(self._path(segment['name'])) == segment['sha256']
+
+    def rollover(self, connection, table, max_id, segment_size=100000,
+                 chunk_size=1000):
+        """
+        move all audit entries up to the max id into archive segments
+
+        the rows of a segment are only deleted from the table after the
+        segment has been written and registered in the manifest. The rows
+        are read and deleted in chunks to keep the transactions small.
+
+        :param connection: the sqlalchemy connection of the audit db
+        :param table: the audit table
+        :param max_id: the highest id, which should be archived
+        :param segment_size: the maximum number of rows of one segment
+        :param chunk_size: the number of rows read or deleted at once
+        :return: list of the new segment dicts
+        """
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        new_segments = []
+
+        while True:
+
+            segment = self._write_segment(connection, table, max_id,
+                                          segment_size, chunk_size)
+            if not segment:
+                break
+
+            segments = list(self.get_segments())
+            segments.append(segment)
+            self._save_segments(segments)
+
+            new_segments.append(segment)
+
+            log.info("archived %d audit entries %d-%d into segment %s",
+                     segment['rows'], segment['first_id'],
+                     segment['last_id'], segment['name'])
+
+            delete_chunks(connection, table, segment['first_id'],
+                          segment['last_id'], chunk_size)
+
+        return new_segments
+
+    def _write_segment(self, connection, table, max_id, segment_size,
+                       chunk_size):
+        """
+        write the oldest audit rows up to the max id into a new segment
+
+        :return: the segment dict or None if there are no rows to archive
+        """
+
+        tmp_path = self._path('segment.tmp')
+
+        rows = 0
+        first_id = last_id = None
+        first_date = last_date = None
+
+        with gzip.open(tmp_path, 'wb') as segment_file:
+
+            while rows < segment_size:
+
+                query = select([table])\
+                    .where(table.c.id <= max_id)\
+                    .order_by(table.c.id)\
+                    .limit(min(chunk_size, segment_size - rows))
+
+                if last_id is not None:
+                    query = query.where(table.c.id > last_id)
+
+                chunk = connection.execute(query).fetchall()
+                if not chunk:
+                    break
+
+                for row in chunk:
+                    entry = _row_to_entry(row)
+                    segment_file.write(json.dumps(entry) + '\n')
+
+                    if first_id is None:
+                        first_id = entry['id']
+                        first_date = entry['timestamp']
+                    last_id = entry['id']
+                    last_date = entry['timestamp']
+
+                rows += len(chunk)
+
+        if not rows:
+            os.remove(tmp_path)
+            return None
+
+        name = 'audit.%d-%d.jsonl.gz' % (first_id, last_id)
+        path = self._path(name)
+
+        # the segment file is completely written before it is registered
+        with open(tmp_path, 'rb') as segment_file:
+            os.fsync(segment_file.fileno())
+        os.rename(tmp_path, path)
+
+        return {
+            'name': name,
+            'first_id': first_id,
+            'last_id': last_id,
+            'first_date': first_date,
+            'last_date': last_date,
+            'rows': rows,
+            'sha256': _file_hash(path),
+            }
+
+
+def delete_chunks(connection, table, first_id, last_id, chunk_size=1000):
+    """
+    delete the audit entries of the id range in chunks, each in its own
+    transaction
+
+    :return: the number of deleted rows
+    """
+
+    deleted = 0
+    start = first_id
+
+    while start <= last_id:
+        end = min(start + chunk_size - 1, last_id)
+
+        with connection.begin():
+            result = connection.execute(
+                table.delete(and_(table.c.id >= start, table.c.id <= end)))
+            deleted += result.rowcount
+
+        start = end + 1
+
+    return deleted
+
+
+def _file_hash(path):
+
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as segment_file:
+        for block in iter(lambda: segment_file.read(1024 * 1024), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+# eof #
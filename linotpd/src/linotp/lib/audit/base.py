@@ -138,7 +138,7 @@ class AuditBase(object):
     def getAuditId(self):
         return self.name
 
-    def getTotal(self, param, AND=True, display_error=True):
+    def getTotal(self, param, AND=True, display_error=True, estimate=False):
         '''
         This method returns the total number of audit entries in the audit store
         '''
@@ -37,6 +37,9 @@ import linotp.lib.crypto
 import logging
 log = logging.getLogger(__name__)
 
+# number of rows, which are verified together by the verify pool
+VERIFY_BATCH_SIZE = 1000
+
 
 class AuditQuery(object):
     """ build the the audit query and return result iterator
@@ -48,6 +51,15 @@ class AuditQuery(object):
         self._audit = audit
         self._search_dict = {}
         self._rp_dict = {}
+        self._estimate = False
+        self.cursor = None
+
+        # the signature verification: 'true' - per row, 'parallel' - in
+        # batches by the verify pool or 'false' - the signature is returned
+        # for a later verification
+        self.verify = (param.get('verify', 'true') or 'true').lower()
+        if self.verify not in ['true', 'false', 'parallel']:
+            raise ValueError('invalid verify mode %r' % self.verify)
 
         self.audit = audit
 
@@ -77,6 +89,8 @@ class AuditQuery(object):
                             'log_level',
                              'clearance_level'
                                      ]
+            if self.verify == 'false':
+                self._columns.append('signature')
 
         if "query" in param:
             if "extsearch" == param['qtype']:
@@ -101,12 +115,36 @@ class AuditQuery(object):
                 self._search_dict[param['qtype']] = value
         else:
             for key, value in param.items():
+                if key in ['cursor', 'count', 'stream', 'verify']:
+                    continue
                 ## unicode escape search parameter to match
                 ## encoding in db, which stores audit
                 ## entries in escaped format
                 value = linotp.lib.crypto.uencode(value)
                 self._search_dict[key] = value
 
+        # the date range is always part of the search, independent of the
+        # flexigrid query
+        for key in ['from', 'to']:
+            if param.get(key):
+                self._search_dict[key] = param[key]
+
+        # keyset paging: the cursor is the number of the last entry of the
+        # previous page - an empty cursor requests the first page
+        if 'cursor' in param:
+            cursor = param.get('cursor') or ''
+            if cursor and not cursor.isdigit():
+                raise ValueError('invalid cursor %r' % cursor)
+            self._rp_dict['cursor'] = cursor
+
+        # fetch the rows by a server side cursor
+        if (param.get('stream', 'false') or 'false').lower() == 'true':
+            self._rp_dict['stream'] = True
+
+        # the total could be estimated to avoid the full count
+        if param.get('count', 'exact') == 'estimate':
+            self._estimate = True
+
         if 'page' in param:
             try:
                 self.page = int(param.get('page', '1') or '1')
@@ -143,6 +181,9 @@ class AuditQuery(object):
     def get_page(self):
         return self.page
 
+    def with_cursor(self):
+        return 'cursor' in self._rp_dict
+
     def with_headers(self):
         return self.headers
 
@@ -153,13 +194,42 @@ class AuditQuery(object):
 
         self.audit_search = self._audit.searchQuery(self._search_dict,
                                                    rp_dict=self._rp_dict)
+
+        if self.verify == 'parallel':
+            self.audit_search = self._verify_batches(self.audit_search)
+
         return self.audit_search
 
+    def _verify_batches(self, result):
+        """
+        verify the signatures of the result rows in batches
+
+        :param result: the result rows of the search query
+        :return: generator of the verified audit entry dicts
+        """
+
+        batch = []
+
+        for row in result:
+            batch.append(row)
+
+            if len(batch) >= VERIFY_BATCH_SIZE:
+                for entry in self._audit.verifyRows(batch):
+                    yield entry
+                batch = []
+
+        if batch:
+            for entry in self._audit.verifyRows(batch):
+                yield entry
+
     def get_entry(self, row):
         entry = {}
         if type(row) != dict:
             ## convert table data to dict!
-            row = self._audit.row2dict(row)
+            if self.verify == 'false':
+                row = self._audit.row2dict(row, verify=False)
+            else:
+                row = self._audit.row2dict(row)
         if 'number' in row:
             cell = []
             for col in self._columns:
@@ -175,12 +245,15 @@ class AuditQuery(object):
                 cell.append(row.get(col))
             entry = {'id': row['number'],
                      'cell': cell}
+            self.cursor = row['number']
             if self.headers is True:
                 entry['data'] = self._columns
 
         return entry
 
     def get_total(self):
+        if self._estimate:
+            return self._audit.getTotal(self._search_dict, estimate=True)
         return self._audit.getTotal(self._search_dict)
 
 class JSONAuditIterator(object):
@@ -219,7 +292,13 @@ class JSONAuditIterator(object):
 
         except StopIteration as exx:
             if self.closed is False:
-                res = '%s ], "total": %d }' % (prefix, self.audit_query.get_total())
+                total = self.audit_query.get_total()
+                if self.audit_query.with_cursor():
+                    # the cursor for the next page
+                    res = '%s ], "total": %d, "cursor": %s }' % (
+                            prefix, total, json.dumps(self.audit_query.cursor))
+                else:
+                    res = '%s ], "total": %d }' % (prefix, total)
                 self.closed = True
             else:
                 raise exx
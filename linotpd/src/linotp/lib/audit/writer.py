@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+background writer for audit entries
+
+the audit entries are queued in-process and written in batches by a
+background thread, so that the request does not have to wait for the
+database write and the signature calculation.
+"""
+
+import Queue
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class AuditQueueFull(Exception):
+    pass
+
+
+class BatchWriter(object):
+    """
+    write the queued entries in batches by a background thread
+
+    - the queue is bounded: if it is full, the request is blocked for the
+      put timeout, which is the back pressure on the requests
+    - a batch is written, when the batch size is reached or the flush
+      interval has passed since the first entry of the batch
+    - on stop, all queued entries are written before the thread ends
+    """
+
+    def __init__(self, write_batch, queue_size=10000, batch_size=100,
+                 flush_interval=0.5, put_timeout=2.0, name='AuditWriter'):
+        """
+        :param write_batch: function, which writes a list of entries
+        :param queue_size: maximum number of entries in the queue
+        :param batch_size: maximum number of entries in one batch
+        :param flush_interval: seconds a queued entry waits for more entries
+        :param put_timeout: seconds a put waits, if the queue is full
+        """
+
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+
+        self.queue = Queue.Queue(maxsize=queue_size)
+
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name)
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def put(self, entry):
+        """
+        queue an entry for the background write
+
+        :param entry: the entry, which is handed over to write_batch
+        :raises AuditQueueFull: if the queue is still full after the
+                                put timeout or the writer is stopped
+        """
+
+        if self._stop_event.is_set():
+            raise AuditQueueFull('audit writer is stopped')
+
+        try:
+            self.queue.put(entry, block=True, timeout=self.put_timeout)
+        except Queue.Full:
+            raise AuditQueueFull('audit queue is full')
+
+    def flush(self):
+        """
+        wait until all queued entries are written
+        """
+        self.queue.join()
+
+    def stop(self, timeout=None):
+        """
+        stop the background writer after all queued entries are written
+
+        :param timeout: seconds to wait for the writer to finish
+        """
+
+        self._stop_event.set()
+
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _next_batch(self):
+        """
+        collect the entries of the next batch
+
+        :return: list of entries - might be empty
+        """
+
+        batch = []
+
+        try:
+            batch.append(self.queue.get(block=True,
+                                        timeout=self.flush_interval))
+        except Queue.Empty:
+            return batch
+
+        deadline = time.time() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+
+            wait = deadline - time.time()
+            if wait <= 0 or self._stop_event.is_set():
+                wait = 0
+
+            try:
+                if wait:
+                    batch.append(self.queue.get(block=True, timeout=wait))
+                else:
+                    batch.append(self.queue.get(block=False))
+            except Queue.Empty:
+                break
+
+        return batch
+
+    def _write(self, batch):
+
+        try:
+            self.write_batch(batch)
+
+        except Exception as exx:
+            log.exception('[_write] failed to write %d audit entries: %r',
+                          len(batch), exx)
+
+        finally:
+            for _entry in batch:
+                self.queue.task_done()
+
+    def _run(self):
+
+        while True:
+
+            batch = self._next_batch()
+
+            if batch:
+                self._write(batch)
+
+            elif self._stop_event.is_set():
+                break
+
+        return
+
+# eof #
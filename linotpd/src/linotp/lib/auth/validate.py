@@ -230,6 +230,23 @@ def split_pin_otp(token, passw, user=None, options=None):
         return 3, pin, otp
 
 
+def _filter_token_type(tokens, token_type=None):
+    """
+    filter the tokens by the token type, like getTokens4UserOrSerial does
+
+    :param tokens: list of token class objects
+    :param token_type: the token type or None
+    :return: list of token class objects
+    """
+
+    if not token_type:
+        return list(tokens)
+
+    return [token for token in tokens
+            if (token.token.LinOtpTokenType or '').lower() ==
+            token_type.lower()]
+
+
 class ValidationHandler(object):
 
     def check_by_transactionid(self, transid, passw, options=None):
@@ -295,18 +312,27 @@ class ValidationHandler(object):
 
         return ok, reply
 
-    def checkSerialPass(self, serial, passw, options=None, user=None):
+    def checkSerialPass(self, serial, passw, options=None, user=None,
+                        tokens=None):
         """
         This function checks the otp for a given serial
 
         :attention: the parameter user must be set, as the pin policy==1 will
                     verify the user pin
+
+        :param tokens: the already read and locked tokens of the serial,
+                       e.g. of a batch request - if not given, the tokens
+                       are read by the serial
         """
 
         token_type = options.get('token_type', None)
 
-        tokenList = getTokens4UserOrSerial(None, serial, token_type=token_type,
-                                           read_for_update=True)
+        if tokens is None:
+            tokenList = getTokens4UserOrSerial(None, serial,
+                                               token_type=token_type,
+                                               read_for_update=True)
+        else:
+            tokenList = _filter_token_type(tokens, token_type)
 
         if passw is None:
             # other than zero or one token should not happen, as serial is
@@ -465,12 +491,15 @@ class ValidationHandler(object):
 
         return len(reply) > 0, reply
 
-    def checkUserPass(self, user, passw, options=None):
+    def checkUserPass(self, user, passw, options=None, tokens=None):
         """
         :param user: the to be identified user
         :param passw: the identification pass
         :param options: optional parameters, which are provided
                     to the token checkOTP / checkPass
+        :param tokens: the already read and locked tokens of the user, e.g.
+                    of a batch request - if not given, the tokens are read
+                    by the user or the serial of the options
 
         :return: tuple of True/False and optional information
         """
@@ -543,12 +572,15 @@ class ValidationHandler(object):
 
         # ------------------------------------------------------------------ --
 
-        tokenList = getTokens4UserOrSerial(
-                               query_user,
-                               serial,
-                               token_type=token_type,
-                               read_for_update=True
-                               )
+        if tokens is None or serial:
+            tokenList = getTokens4UserOrSerial(
+                                   query_user,
+                                   serial,
+                                   token_type=token_type,
+                                   read_for_update=True
+                                   )
+        else:
+            tokenList = _filter_token_type(tokens, token_type)
 
         if len(tokenList) == 0:
             audit['action_detail'] = 'User has no tokens assigned'
@@ -659,11 +691,18 @@ class ValidationHandler(object):
                                     check_options.get('transactionid', ''))
         if transid:
             expired, challenges = Challenges.get_challenges(transid=transid,
-                                                            filter_open=True)
+                                                            filter_open=True,
+                                                            tokens=tokenList)
             for challenge in challenges:
                 serial = challenge.tokenserial
                 transaction_serials.append(serial)
 
+        else:
+            # if there is no transaction id given we check all token
+            # related challenges, which are fetched for all tokens at once
+            token_challenges = Challenges.get_challenges_of_tokens(
+                                                tokenList, filter_open=True)
+
         # -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- -- --
 
         audit_entry = {}
@@ -781,12 +820,8 @@ class ValidationHandler(object):
             # start the token validation
 
             if not transid:
-                # if there is no transaction id given we check all token
-                # related challenges
                 (_ex_challenges,
-                 challenges) = Challenges.get_challenges(token,
-                                                         options=check_options,
-                                                         filter_open=True)
+                 challenges) = token_challenges[token.getSerial()]
 
             try:
                 (ret, reply) = token.check_token(
@@ -835,11 +870,9 @@ class ValidationHandler(object):
             [valid_tokens, pin_matching_tokens, challenge_tokens, valid_tokens])
 
         # now we care for all involved tokens and their challenges
-        for token in (valid_tokens + pin_matching_tokens +
-                      challenge_tokens + invalid_tokens):
-            expired, _valid = Challenges.get_challenges(token)
-            if expired:
-                Challenges.delete_challenges(None, expired)
+        Challenges.delete_expired_challenges(
+            valid_tokens + pin_matching_tokens +
+            challenge_tokens + invalid_tokens)
 
         log.debug("Number of valid tokens found "
                   "(validTokenNum): %d" % len(valid_tokens))
@@ -60,6 +60,7 @@ from linotp.lib.context import request_context
 from linotp.lib.context import request_context_safety
 from linotp.lib.logs import init_logging_config
 from linotp.lib.logs import log_request_timedelta
+from linotp.lib.policy.user_match import log_user_match_statistics
 
 # this is a hack for the static code analyser, which
 # would otherwise show session.close() as error
@@ -71,7 +72,7 @@ import linotp.model.meta
 from linotp.model.migrate import run_data_model_migration
 
 from linotp.lib.config import getLinotpConfig
-from linotp.lib.policy.util import parse_policies
+from linotp.lib.policy.index import get_policy_index
 
 from linotp.lib.util import get_client
 from uuid import uuid4
@@ -309,6 +310,40 @@ def set_defaults():
                value="64800", typ="int",
                description="expiration of resolver caching entries")
 
+    set_config(key="resolver_instance_cache.enabled",
+               value="True", typ="bool",
+               description="reuse the resolver instances across requests")
+
+    set_config(key="otp_lookahead.enabled",
+               value="False", typ="bool",
+               description=("use the otp lookahead index of the unassigned "
+                            "tokens for the auto assignment"))
+
+    set_config(key="otp_lookahead.window",
+               value="20", typ="int",
+               description="number of indexed otp values per token")
+
+    set_config(key="policy_user_match_cache.enabled",
+               value="False", typ="bool",
+               description=("cache the policy user condition matches "
+                            "across the requests"))
+
+    set_config(key='policy_user_match_cache.expiration',
+               value="60", typ="int",
+               description="expiration of the policy user match entries")
+
+    set_config(key="validate.batch.max_items",
+               value="100", typ="int",
+               description="maximum number of items of a validate/check_batch")
+
+    set_config(key="negative_user_cache.enabled",
+               value="False", typ="bool",
+               description="enable caching of unknown users")
+
+    set_config(key='negative_user_cache.expiration',
+               value="60", typ="int",
+               description="expiration of the unknown user caching entries")
+
     if not is_upgrade:
         set_config(key='NewPolicyEvaluation',
                    value="True", typ="boolean",
@@ -370,7 +405,7 @@ def setup_app(conf, conf_global=None, unitTest=False):
     #
 
     # define the most recent target version
-    sql_data_model_version = "2.9.1.0"
+    sql_data_model_version = "2.10.1.2"
 
     # get the actual version - should be None or should be the same
     # if migration is finished
@@ -573,6 +608,7 @@ class BaseController(WSGIController):
                         data = getattr(c, data_obj)
                         del data
 
+                log_user_match_statistics(log)
                 log_request_timedelta(log)
 
             return ret
@@ -631,7 +667,7 @@ class BaseController(WSGIController):
         linotp_config = getLinotpConfig()
 
         request_context['Config'] = linotp_config
-        request_context['Policies'] = parse_policies(linotp_config)
+        request_context['Policies'] = get_policy_index(linotp_config)
         request_context['translate'] = translate
         request_context['CacheManager'] = environment['beaker.cache']
         request_context['Path'] = environment.get("PATH_INFO", "") or ""
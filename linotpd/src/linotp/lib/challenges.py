@@ -90,7 +90,7 @@ class Challenges(object):
             conditions += (and_(Challenge.tokenserial == serial),)
 
         if filter_open is True:
-            conditions += (and_(Challenge.session.like('%"status": "open"%')),)
+            conditions += (and_(Challenge.status == u'open'),)
 
         # SQLAlchemy requires the conditions in one arg as tuple
         condition = and_(*conditions)
@@ -301,16 +301,29 @@ class Challenges(object):
 
             # SQLAlchemy requires the conditions in one arg as tupple
             condition = and_(*conditions)
-            del_challes = Session.query(Challenge).filter(condition).all()
 
-            # and delete them via session
-            for dell in del_challes:
-                Session.delete(dell)
+            # and delete them with one bulk statement
+            Session.query(Challenge).filter(condition).delete(
+                                            synchronize_session='fetch')
 
         return res
 
     @staticmethod
-    def get_challenges(token=None, transid=None, options=None, filter_open=False):
+    def get_challenges(token=None, transid=None, options=None,
+                       filter_open=False, tokens=None):
+        """
+        get the expired and the valid challenges of a token or a transaction
+
+        :param token: the token, whose challenges are looked up
+        :param transid: the transaction id of the challenges
+        :param options: request options, which might contain the transid as
+                        state or transactionid
+        :param filter_open: only lookup the open challenges
+        :param tokens: optional list of already loaded tokens, which are used
+                       to get the challenge validity
+
+        :return: tuple of the list of expired and the list of valid challenges
+        """
 
         if not options:
             options = {}
@@ -324,42 +337,145 @@ class Challenges(object):
 
         # transaction ids are handled preferred
         if transid:
-            challenges = Challenges.lookup_challenges(transid=transid)
+            challenges = Challenges.lookup_challenges(
+                                        transid=transid,
+                                        filter_open=filter_open)
         elif token:
-            challenges = Challenges.lookup_challenges(serial=token.getSerial())
+            challenges = Challenges.lookup_challenges(
+                                        serial=token.getSerial(),
+                                        filter_open=filter_open)
         else:
             challenges = []
 
+        known_tokens = list(tokens or [])
+        if token:
+            known_tokens.append(token)
+
+        validities = Challenges._get_challenge_validities(challenges,
+                                                          known_tokens)
+
+        return Challenges._split_expired(challenges, validities)
+
+    @staticmethod
+    def get_challenges_of_tokens(tokens, filter_open=False):
+        """
+        get the expired and valid challenges of all given tokens with one
+        database query
+
+        :param tokens: list of tokens
+        :param filter_open: only lookup the open challenges
+
+        :return: dict with the token serial as key and a tuple of the list of
+                 expired and the list of valid challenges
+        """
+
+        serials = set(token.getSerial() for token in tokens)
+
+        token_challenges = dict((serial, ([], [])) for serial in serials)
+
+        if not serials:
+            return token_challenges
+
+        conditions = (and_(Challenge.tokenserial.in_(list(serials))),)
+
+        if filter_open is True:
+            conditions += (and_(Challenge.status == u'open'),)
+
+        condition = and_(*conditions)
+        challenges = Session.query(Challenge).\
+            filter(condition).order_by(desc(Challenge.id)).all()
+
+        validities = Challenges._get_challenge_validities(challenges, tokens)
+
+        expired, valid = Challenges._split_expired(challenges, validities)
+
+        for challenge in expired:
+            token_challenges[challenge.tokenserial][0].append(challenge)
+
+        for challenge in valid:
+            token_challenges[challenge.tokenserial][1].append(challenge)
+
+        return token_challenges
+
+    @staticmethod
+    def _get_challenge_validities(challenges, tokens=None):
+        """
+        get the challenge validity of all tokens, the challenges belong to
+
+        the validity is taken from the already loaded tokens - only the
+        missing tokens are loaded, but each token only once
+
+        :param challenges: list of challenges
+        :param tokens: list of already loaded tokens
+        :return: dict with the token serial and its challenge validity
+        """
+
+        validities = {}
+
+        for token in tokens or []:
+            serial = token.getSerial()
+            if serial not in validities:
+                validities[serial] = token.get_challenge_validity()
+
+        for challenge in challenges:
+            serial = challenge.tokenserial
+            if serial not in validities:
+                c_tokens = linotp.lib.token.getTokens4UserOrSerial(
+                                                                serial=serial)
+                validities[serial] = c_tokens[0].get_challenge_validity()
+
+        return validities
+
+    @staticmethod
+    def _split_expired(challenges, validities):
+        """
+        split the challenges into the expired and the valid ones
+
+        :param challenges: list of challenges
+        :param validities: dict with the challenge validity per token serial
+        :return: tuple of the list of expired and the list of valid challenges
+        """
+
         expired_challenges = []
         valid_chalenges = []
 
+        c_now = datetime.datetime.now()
+
         for challenge in challenges:
-            # if we should filter the
-            if filter_open:
-                stat = challenge.is_open()
-                if not stat:
-                    continue
 
             # lookup the validty time of the challenge which is per token
-            serial = challenge.tokenserial
-            tokens = linotp.lib.token.getTokens4UserOrSerial(serial=serial)
-            validity = tokens[0].get_challenge_validity()
+            validity = validities[challenge.tokenserial]
 
             c_start_time = challenge.get('timestamp')
             c_expire_time = c_start_time + datetime.timedelta(seconds=validity)
-            c_now = datetime.datetime.now()
+
             if c_now > c_expire_time:
                 expired_challenges.append(challenge)
             else:
-                # if we want to see only the open challenges, we check so :)
-                if filter_open:
-                    if challenge.is_open():
-                        valid_chalenges.append(challenge)
-                else:
-                    valid_chalenges.append(challenge)
+                valid_chalenges.append(challenge)
 
         return expired_challenges, valid_chalenges
 
+    @staticmethod
+    def delete_expired_challenges(tokens):
+        """
+        delete the expired challenges of all given tokens
+
+        :param tokens: list of tokens
+        :return: - nothing -
+        """
+
+        expired_challenges = []
+
+        token_challenges = Challenges.get_challenges_of_tokens(tokens)
+        for expired, _valid in token_challenges.values():
+            expired_challenges.extend(expired)
+
+        if expired_challenges:
+            Challenges.delete_challenges(None, expired_challenges)
+
+        return
+
     @staticmethod
     def handle_related_challenge(matching_challenges):
         """
@@ -371,13 +487,16 @@ class Challenges(object):
         from linotp.lib.token import getTokens4UserOrSerial
 
         to_be_closed_challenges = []
+        tokens = {}
 
         for matching_challenge in matching_challenges:
 
             # gather all challenges which are now obsolete
             # from the token point of view
             serial = matching_challenge.tokenserial
-            token = getTokens4UserOrSerial(serial=serial)[0]
+            if serial not in tokens:
+                tokens[serial] = getTokens4UserOrSerial(serial=serial)[0]
+            token = tokens[serial]
             token_challenges = Challenges.lookup_challenges(serial=serial)
             to_be_closed = token.challenge_janitor([matching_challenge],
                                                    token_challenges)
@@ -74,8 +74,9 @@ class LinOtpConfig(dict):
 
         self.delay = False
         self.realms = None
+        self.snapshot_version = None
         self.glo = getGlobalObject()
-        conf = self.glo.getConfig()
+        conf = self.glo.getConfigSnapshot()
 
         do_reload = False
 
@@ -107,14 +108,10 @@ class LinOtpConfig(dict):
 
     def refreshConfig(self, do_reload=False):
 
-        conf = self.glo.getConfig()
-
         if do_reload is True:
             # in case there is no entry in the dbconf or
             # the config file is newer, we write the config back to the db
-            entries = conf.keys()
-            for entry in entries:
-                del conf[entry]
+            conf = {}
 
             writeback = False
             # get all conf entries from the config file
@@ -148,7 +145,13 @@ class LinOtpConfig(dict):
 
             self.glo.setConfig(conf, replace=True)
 
-        self.parent.update(conf)
+        # the request works on its own copy of the shared config snapshot:
+        # the snapshot is immutable, so only the references are copied
+
+        snapshot = self.glo.getConfigSnapshot()
+        snapshot.copy_into(self)
+        self.snapshot_version = snapshot.version
+
         return
 
     def setRealms(self, realmDict):
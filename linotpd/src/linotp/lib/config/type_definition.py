@@ -37,6 +37,7 @@ from linotp.lib.type_utils import check_networks_expression
 Config_Types = {
     'linotp.user_lookup_cache.expiration': ('duration', is_duration),
     'linotp.resolver_lookup_cache.expiration': ('duration', is_duration),
+    'linotp.negative_user_cache.expiration': ('duration', is_duration),
     'linotp.client.FORWARDED_PROXY': ('network', check_networks_expression),
     }
 
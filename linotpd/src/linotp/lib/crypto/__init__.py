@@ -214,6 +214,33 @@ class SecretObj(object):
 
         return h_digest
 
+    def hmac_digests(self, data_inputs, hash_algo=None):
+        """
+        calculate the hmac digests of a list of data inputs
+
+        the secret is decrypted only once for the whole list and cleared
+        afterwards, which is used for the evaluation of an otp window
+
+        :param data_inputs: list of data, e.g. the packed counters
+        :param hash_algo: the hashing function
+        :return: list of the digests in the order of the data inputs
+        """
+
+        if not hash_algo:
+            hash_algo = get_hashalgo_from_description('sha1')
+
+        data_inputs = [data_input if pver > 2.6 else str(data_input)
+                       for data_input in data_inputs]
+
+        self._setupKey_()
+        try:
+            h_digests = hmac_digests(bkey=self.bkey, data_inputs=data_inputs,
+                                     hsm=self.hsm, hash_algo=hash_algo)
+        finally:
+            self._clearKey_(preserve=self.preserve)
+
+        return h_digests
+
     def aes_decrypt(self, data_input):
         '''
         support inplace aes decryption for the yubikey
@@ -552,6 +579,20 @@ def hmac_digest(bkey, data_input, hsm=None, hash_algo=None):
     return h
 
 
+def hmac_digests(bkey, data_inputs, hsm=None, hash_algo=None):
+
+    hsm_obj = _get_hsm_obj_from_context(hsm)
+
+    if hash_algo is None:
+        hash_algo = get_hashalgo_from_description('sha1')
+
+    if not hasattr(hsm_obj, 'hmac_digests'):
+        return [hsm_obj.hmac_digest(bkey, data_input, hash_algo)
+                for data_input in data_inputs]
+
+    return hsm_obj.hmac_digests(bkey, data_inputs, hash_algo)
+
+
 def encryptPassword(password):
     """Encrypt password (i.e. ldap password)
 
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+negative cache for the user lookups
+
+the lookup of an unknown user has to ask every resolver of the realm. To
+protect the resolvers against repeated lookups of unknown users, the
+'user not found' results are remembered in a separate cache with a short
+expiration and a bounded size.
+"""
+
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+
+class NegativeCache(object):
+    """
+    process wide, size bounded cache of the 'not found' lookups
+    """
+
+    def __init__(self, max_entries=10000, expiretime=60):
+        """
+        :param max_entries: the maximum number of entries
+        :param expiretime: seconds after which an entry expires
+        """
+
+        self.max_entries = max_entries
+        self.expiretime = expiretime
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def contains(self, namespace, key):
+        """
+        check if the lookup is known as 'not found'
+
+        :param namespace: the cache namespace like the realm or resolver
+        :param key: the lookup key
+        :return: boolean
+        """
+
+        entry_key = (namespace, key)
+
+        with self._lock:
+
+            expires = self._entries.get(entry_key)
+
+            if expires is None:
+                self.misses += 1
+                return False
+
+            if expires < time.time():
+                del self._entries[entry_key]
+                self.misses += 1
+                return False
+
+            self.hits += 1
+            return True
+
+    def add(self, namespace, key):
+        """
+        remember the lookup as 'not found' - the oldest entries are evicted,
+        if the size bound is exceeded
+        """
+
+        entry_key = (namespace, key)
+
+        with self._lock:
+
+            self._entries.pop(entry_key, None)
+            self._entries[entry_key] = time.time() + self.expiretime
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def remove(self, namespace, key):
+        """
+        forget the 'not found' lookup, eg. if the user has been found
+        """
+
+        with self._lock:
+            self._entries.pop((namespace, key), None)
+
+    def clear(self, namespace):
+        """
+        remove all entries of the namespace, eg. on a realm or resolver
+        change
+        """
+
+        with self._lock:
+            for entry_key in [entry_key for entry_key in self._entries
+                              if entry_key[0] == namespace]:
+                del self._entries[entry_key]
+
+    def get_statistics(self):
+
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'entries': len(self._entries)}
+
+
+_negative_cache = NegativeCache()
+
+
+def get_negative_cache(max_entries, expiretime):
+    """
+    get the process wide negative cache with the current configuration
+    """
+
+    _negative_cache.max_entries = max_entries
+    _negative_cache.expiretime = expiretime
+
+    return _negative_cache
+
+# eof #
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+
+"""
+otp lookahead index -
+  the keyed hashes of the next otp values of the unassigned hmac tokens,
+  which allow to find the token of an otp value by an indexed query instead
+  of calculating the otp window of every unassigned token
+
+  the index is maintained when a token is created, assigned, unassigned or
+  its counter changes and is completely refreshed by the tools
+  refresh_otp_lookahead, which could be run as a background job.
+
+  an index entry is only a hint: the found tokens are always verified with
+  check_otp_exist.
+"""
+
+import logging
+
+from sqlalchemy import and_
+from sqlalchemy import func
+from sqlalchemy import or_
+
+from linotp.lib.HMAC import HmacOtp
+from linotp.lib.config import getFromConfig
+from linotp.lib.context import request_context as context
+from linotp.lib.crypto import SecretObj
+from linotp.lib.crypto import get_hashalgo_from_description
+from linotp.lib.crypto import uencode
+from linotp.lib.type_utils import boolean
+
+from linotp.model import OtpLookahead
+from linotp.model import Token
+
+import linotp.model.meta
+Session = linotp.model.meta.Session
+
+log = logging.getLogger(__name__)
+
+# the token types and otp lengths, which are covered by the index
+
+LOOKAHEAD_TYPES = [u'hmac']
+LOOKAHEAD_OTP_LENGTHS = [6, 8]
+
+
+def is_otp_lookahead_enabled():
+    """
+    :return: boolean, if the otp lookahead index is used
+    """
+
+    return boolean(getFromConfig('otp_lookahead.enabled', False))
+
+
+def get_otp_lookahead_window():
+    """
+    :return: the number of otp values, which are indexed per token
+    """
+
+    return int(getFromConfig('otp_lookahead.window', 20) or 20)
+
+
+def indexed_token_condition():
+    """
+    the sql condition for the tokens, which are covered by the index
+
+    :return: sqlalchemy condition
+    """
+
+    return and_(func.lower(Token.LinOtpTokenType).in_(LOOKAHEAD_TYPES),
+                Token.LinOtpOtpLen.in_(LOOKAHEAD_OTP_LENGTHS),
+                or_(Token.LinOtpUserid == None,
+                    Token.LinOtpUserid == u''))
+
+
+def otp_hash(otp):
+    """
+    the keyed hash of an otp value - the otp values are only preserved as
+    mac of the security module, as the next otp values of a token must not
+    be readable from the database
+
+    :param otp: the otp value
+    :return: the hex mac of the otp value
+    """
+
+    hsm = context['hsm'].get('obj')
+    return unicode(hsm.signMessage('otp_lookahead:%s' % otp))
+
+
+def remove_tokens(serials):
+    """
+    remove the index entries of the tokens
+
+    :param serials: list of token serial numbers
+    """
+
+    if not serials:
+        return
+
+    # the serials are preserved like in the token table - unicode escaped
+
+    serials = [uencode(serial) for serial in serials]
+
+    Session.query(OtpLookahead).filter(
+        OtpLookahead.serial.in_(serials)).delete(synchronize_session=False)
+
+
+def update_token(token):
+    """
+    update the index entries of a token with the otp values of its next
+    counter window - tokens, which are not covered by the index, e.g. as
+    they are assigned, are removed from the index
+
+    :param token: the token class object
+    """
+
+    serial = token.getSerial()
+
+    remove_tokens([serial])
+
+    db_serial = uencode(serial)
+
+    db_token = token.token
+
+    if (db_token.LinOtpTokenType or '').lower() not in LOOKAHEAD_TYPES:
+        return
+
+    if db_token.LinOtpUserid:
+        return
+
+    if not db_token.LinOtpKeyEnc:
+        return
+
+    try:
+        otplen = int(db_token.LinOtpOtpLen)
+        counter = int(db_token.LinOtpCount)
+    except (TypeError, ValueError) as exx:
+        log.warning("Token %r not indexed: %r", serial, exx)
+        return
+
+    if otplen not in LOOKAHEAD_OTP_LENGTHS:
+        return
+
+    # cover at least the otp count window of the token, which is the
+    # window of the auto assignment
+
+    window = max(get_otp_lookahead_window(),
+                 int(db_token.LinOtpCountWindow or 0))
+
+    hash_algo = get_hashalgo_from_description(
+                    token.getFromTokenInfo('hashlib', 'sha1'),
+                    fallback='sha1')
+
+    key, iv = db_token.get_encrypted_seed()
+    sec_obj = SecretObj(key, iv, hsm=context['hsm'])
+
+    hmac_otp = HmacOtp(sec_obj, counter, otplen, hash_algo)
+
+    for otp_counter, otp in hmac_otp.window(counter, counter + window):
+        Session.add(OtpLookahead(otp_hash(otp), db_serial, otp_counter))
+
+
+def lookup_serials(otps):
+    """
+    lookup the serials of the tokens, which might generate one of the otp
+    values
+
+    :param otps: list of otp values
+    :return: set of the unicode escaped token serial numbers, as they are
+             stored in the token table
+    """
+
+    otp_hashes = [otp_hash(otp) for otp in set(otps)]
+
+    rows = Session.query(OtpLookahead.serial).filter(
+        OtpLookahead.otp_hash.in_(otp_hashes)).distinct()
+
+    return set(row.serial for row in rows)
+
+
+def indexed_serials():
+    """
+    the serials of the tokens, which have entries in the index
+
+    :return: sqlalchemy subquery of the unicode escaped token serials
+    """
+
+    return Session.query(OtpLookahead.serial).distinct().subquery()
+
+
+def refresh_otp_lookahead(batch_size=1000):
+    """
+    rebuild the index entries of all unassigned hmac tokens and drop the
+    entries of the tokens, which are not covered by the index anymore
+
+    the tokens are processed in batches, where each batch is committed
+
+    :param batch_size: the number of tokens per batch
+    :return: dict with the number of indexed tokens
+    """
+
+    # import here to prevent a cyclic import with the token classes
+
+    from linotp.lib.token import createTokenClassObject
+
+    indexed = 0
+    last_id = 0
+
+    while True:
+
+        tokens = Session.query(Token).filter(
+            and_(indexed_token_condition(), Token.LinOtpTokenId > last_id)).\
+            order_by(Token.LinOtpTokenId).\
+            limit(batch_size).all()
+
+        if not tokens:
+            break
+
+        for db_token in tokens:
+            last_id = db_token.LinOtpTokenId
+            update_token(createTokenClassObject(db_token))
+            indexed += 1
+
+        Session.commit()
+
+    indexed_serials = Session.query(Token.LinOtpTokenSerialnumber).filter(
+        indexed_token_condition())
+
+    Session.query(OtpLookahead).filter(
+        ~OtpLookahead.serial.in_(indexed_serials.subquery())).\
+        delete(synchronize_session=False)
+
+    Session.commit()
+
+    return {'indexed': indexed}
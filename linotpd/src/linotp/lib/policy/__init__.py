@@ -1440,17 +1440,7 @@ def checkAdminAuthorization(policies, serial, user, fitAllRealms=False):
         log.debug("the token %r is contained in the realms: %r",
                   serial, realms)
 
-        log.debug("the policy contains the realms: %r", policies['realms'])
-
-        for r in realms:
-            if fitAllRealms:
-                if r not in policies['realms']:
-                    return False
-            else:
-                if r in policies['realms']:
-                    return True
-
-        return fitAllRealms
+        return _check_admin_token_realms(policies, realms, fitAllRealms)
 
     # in case of the admin policies - no user name is verified:
     # the username could be empty (not dummy) which prevents an
@@ -1472,6 +1462,54 @@ def checkAdminAuthorization(policies, serial, user, fitAllRealms=False):
     return False
 
 
+def _check_admin_token_realms(policies, realms, fitAllRealms=False):
+    """
+    check if the realms of a token fit to the realms of the admin policies
+
+    :param policies: the admin policies with the lowercase realms
+    :param realms: the realm names of the token
+    :param fitAllRealms: the admin must have rights in all realms
+    :return: boolean - if the admin is allowed
+    """
+
+    log.debug("the policy contains the realms: %r", policies['realms'])
+
+    for r in realms:
+        if fitAllRealms:
+            if r not in policies['realms']:
+                return False
+        else:
+            if r in policies['realms']:
+                return True
+
+    return fitAllRealms
+
+
+def checkAdminTokenRealms(policies, realms, fitAllRealms=False):
+    """
+    This function checks if a token with the given realms is in the
+    corresponding realms, where the admin has access to - like the
+    checkAdminAuthorization for a serial, where the realms of the token are
+    already known, e.g. as the realms of many tokens were read at once.
+
+    :param policies: the result of getAdminPolicies
+    :param realms: the realm names of the token
+    :param fitAllRealms: If set to True, then the administrator must have
+                         rights in all realms of the token.
+    :return: boolean - if the admin is allowed
+    """
+
+    if not policies['active']:
+        return True
+
+    if '*' in policies['realms']:
+        return True
+
+    policies['realms'] = [x.lower() for x in policies['realms']]
+
+    return _check_admin_token_realms(policies, realms, fitAllRealms)
+
+
 def getSelfserviceActions(user):
     '''
     This function returns the allowed actions in the self service portal
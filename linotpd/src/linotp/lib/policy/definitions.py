@@ -371,6 +371,16 @@ def getPolicyDefinitions(scope=""):
                 'type': 'bool',
                 'desc': 'Import users from a file into a new resolver '
             },
+            'update_token_owner': {
+                'type': 'bool',
+                'desc': 'Update the owner login of the assigned tokens, '
+                        'which is used for the token search by user '
+            },
+            'refresh_otp_lookahead': {
+                'type': 'bool',
+                'desc': 'Refresh the otp lookahead index of the unassigned '
+                        'tokens, which is used for the auto assignment '
+            },
         },
         'ocra': {
             'request': {
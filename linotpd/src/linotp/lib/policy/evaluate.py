@@ -26,6 +26,7 @@
 
 """ policy evaluation """
 
+from bisect import bisect_right
 from datetime import datetime
 
 from netaddr import IPAddress
@@ -33,6 +34,9 @@ from netaddr import IPNetwork
 
 from linotp.lib.policy.filter import UserDomainCompare
 from linotp.lib.policy.filter import AttributeCompare
+from linotp.lib.policy.user_match import count_user_lookup
+from linotp.lib.policy.user_match import get_policy_version
+from linotp.lib.policy.user_match import get_request_user_matches
 from linotp.lib.user import User
 from linotp.lib.realm import getRealms
 
@@ -150,10 +154,24 @@ class PolicyEvaluator(object):
         if policy_set:
             all_policies = policy_set
 
+        # the shared policy index provides the pre-selection of the policies
+        # and the prepared policy conditions
+
+        policy_index = None
+        if hasattr(self.all_policies, 'candidates'):
+            policy_index = self.all_policies
+
         if not self.filters:
+            if all_policies is policy_index:
+                return dict(all_policies)
             return all_policies
 
-        for p_name, p_dict in all_policies.items():
+        if all_policies is policy_index:
+            policy_items = policy_index.candidates(self.filters)
+        else:
+            policy_items = all_policies.items()
+
+        for p_name, p_dict in policy_items:
 
             #
             # special case: for filtering of policies by name:
@@ -170,7 +188,18 @@ class PolicyEvaluator(object):
             for (f_key, f_value, f_compare) in self.filters:
 
                 policy_condition = p_dict.get(f_key)
-                matching = f_compare(policy_condition, f_value)
+
+                compiled_compare = Compiled_Compare.get(f_compare)
+
+                if policy_index is not None and compiled_compare:
+
+                    compile_func, match_func = compiled_compare
+                    condition = policy_index.get_compiled(compile_func,
+                                                          policy_condition)
+                    matching = match_func(condition, f_value)
+
+                else:
+                    matching = f_compare(policy_condition, f_value)
 
                 if not matching:
                     break
@@ -486,15 +515,94 @@ def ip_list_compare(policy_conditions, client):
     :return: booleans
     """
 
+    return match_ip_conditions(compile_ip_conditions(policy_conditions),
+                               client)
+
+
+class NetworkRanges(object):
+    """
+    set of ip networks as sorted and merged integer ranges per ip version,
+    so that an ip address is looked up by a binary search instead of
+    comparing it with every network
+    """
+
+    def __init__(self, networks):
+        """
+        :param networks: list of IPNetworks, where None stands for all
+                         addresses
+        """
+
+        self.everything = None in networks
+
+        ranges = {}
+
+        for network in networks:
+            if network is not None:
+                ranges.setdefault(network.version, []).append(
+                                            (network.first, network.last))
+
+        self._ranges = {}
+
+        for version, version_ranges in ranges.items():
+
+            firsts = []
+            lasts = []
+
+            for first, last in sorted(version_ranges):
+
+                # merge overlapping and adjacent networks
+
+                if lasts and first <= lasts[-1] + 1:
+                    lasts[-1] = max(lasts[-1], last)
+                else:
+                    firsts.append(first)
+                    lasts.append(last)
+
+            self._ranges[version] = (firsts, lasts)
+
+    def __nonzero__(self):
+        return self.everything or bool(self._ranges)
+
+    def __contains__(self, ip_address):
+        """
+        :param ip_address: the IPAddress to lookup
+        :return: boolean - if the address is part of one of the networks
+        """
+
+        if self.everything:
+            return True
+
+        if ip_address.version not in self._ranges:
+            return False
+
+        firsts, lasts = self._ranges[ip_address.version]
+
+        value = int(ip_address)
+        pos = bisect_right(firsts, value) - 1
+
+        return pos >= 0 and value <= lasts[pos]
+
+
+def compile_ip_conditions(policy_conditions):
+    """
+    prepare the client conditions of a policy for the comparison
+
+    :param policy_conditions: the client condition described in the policy
+    :return: None for the wildcard, a tuple of the allowed and the denied
+             NetworkRanges or - if one of the conditions is invalid - the
+             list of tuples (not_condition, network), where the network is
+             None for a '*' condition
+    """
+
     conditions = [x.strip() for x in policy_conditions.split(',')]
 
     if '*' in conditions:
-        return True
+        return None
 
-    allowed = False
+    compiled = []
+    invalid = False
 
     for condition in conditions:
-        identified = False
         its_a_not_condition = False
 
         if not condition:
@@ -505,11 +613,76 @@ def ip_list_compare(policy_conditions, client):
             its_a_not_condition = True
 
         if condition == '*':
-            identified = True
+            network = None
+        else:
+            # an invalid condition is reported, when it is evaluated
+            try:
+                network = IPNetwork(condition)
+            except Exception as exx:
+                network = exx
+                invalid = True
+
+        compiled.append((its_a_not_condition, network))
+
+    # the order of the conditions only matters for the reporting of an
+    # invalid condition - otherwise the conditions are looked up as ranges
+
+    if invalid:
+        return compiled
+
+    allowed = NetworkRanges([network for its_a_not_condition, network
+                             in compiled if not its_a_not_condition])
+    denied = NetworkRanges([network for its_a_not_condition, network
+                            in compiled if its_a_not_condition])
+
+    return allowed, denied
+
+
+def match_ip_conditions(compiled_conditions, client):
+    """
+    check if client ip matches the prepared client conditions
+
+    :param compiled_conditions: the result of the compile_ip_conditions
+    :param client: the to be compared client ip
+    :return: booleans
+    """
+
+    if compiled_conditions is None:
+        return True
+
+    if isinstance(compiled_conditions, tuple):
+
+        allowed, denied = compiled_conditions
+
+        if denied.everything:
+            return False
 
-        elif IPAddress(client) in IPNetwork(condition):
+        if not allowed and not denied:
+            return False
+
+        client_ip = IPAddress(client)
+
+        if client_ip in denied:
+            return False
+
+        return client_ip in allowed
+
+    allowed = False
+    client_ip = None
+
+    for its_a_not_condition, network in compiled_conditions:
+
+        if network is None:
             identified = True
 
+        elif isinstance(network, Exception):
+            raise network
+
+        else:
+            if client_ip is None:
+                client_ip = IPAddress(client)
+            identified = client_ip in network
+
         if identified:
             if its_a_not_condition:
                 return False
@@ -522,6 +695,46 @@ def user_list_compare(policy_conditions, login):
     """
     check if login name matches list of user policy conditions
 
+    as the user conditions might require user lookups, the match results
+    are cached for the request and optionally across the requests
+
+    :param policy_condition: the condition described in the policy
+    :param login: the to be compared user - either User obj or string
+    :return: booleans
+    """
+
+    user_matches = get_request_user_matches()
+    if user_matches is None:
+        return _user_list_compare(policy_conditions, login)
+
+    version = get_policy_version()
+    if version is None:
+        return _user_list_compare(policy_conditions, login)
+
+    if isinstance(login, User):
+        user_key = (login.login, login.realm,
+                    login.resolver_config_identifier)
+    elif isinstance(login, str) or isinstance(login, unicode):
+        user_key = (login,)
+    else:
+        raise Exception("unsupported type of login")
+
+    key = (user_key, policy_conditions, version)
+
+    found, matched = user_matches.get(key)
+
+    if not found:
+        matched = _user_list_compare(policy_conditions, login)
+        user_matches.add(key, matched)
+
+    return matched
+
+
+def _user_list_compare(policy_conditions, login):
+    """
+    check if login name matches list of user policy conditions - the user
+    lookups of the evaluation are counted
+
     :param policy_condition: the condition described in the policy
     :param login: the to be compared user - either User obj or string
     :return: booleans
@@ -574,6 +787,7 @@ def user_list_compare(policy_conditions, login):
             else:
                 c_user = user
 
+            count_user_lookup()
             identified = attr_comp.compare(c_user, condition)
 
         elif '@' in condition:  # domain condition requires a domain compare
@@ -611,6 +825,7 @@ def user_list_compare(policy_conditions, login):
             else:
                 c_user = user
 
+            count_user_lookup()
             identified = domain_comp.exists(c_user, condition)
 
         else:  # simple user condition with string compare and wild cards
@@ -701,6 +916,74 @@ def cron_compare(condition, now):
     :return: boolean - is allowed or not
     """
 
+    return match_cron(compile_cron(condition), now)
+
+
+# the target ranges of the cron members - minute, hour, day of the month,
+# month, day of the week and year - for which a cron value is compiled into
+# a bitset. targets outside of the range are compared with the cron value
+
+CRON_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6), (1970, 2100)]
+
+
+def _compile_cron_value(value, target_range):
+    """
+    compile a cron value into the bitset of the matching targets
+
+    :param value: one cron entry
+    :param target_range: tuple of the lowest and the highest target
+    :return: None for the wildcard or tuple of (value, lowest target,
+             highest target, bitset) where the bitset is None, if the value
+             could not be compiled
+    """
+
+    if value.strip() == '*':
+        return None
+
+    low, high = target_range
+
+    try:
+        bitset = 0
+        for target in range(low, high + 1):
+            if _compare_cron_value(value, target):
+                bitset |= 1 << (target - low)
+
+    except Exception:
+        # an invalid value is reported, when it is evaluated
+        bitset = None
+
+    return value, low, high, bitset
+
+
+def _match_cron_value(compiled_value, target):
+    """
+    compare the target with a compiled cron value
+
+    :param compiled_value: the result of _compile_cron_value
+    :param target: the matching value
+    :return: boolean - if target matches the cron entry
+    """
+
+    if compiled_value is None:
+        return True
+
+    value, low, high, bitset = compiled_value
+
+    if bitset is None or not low <= target <= high:
+        return _compare_cron_value(value, target)
+
+    return bool((bitset >> (target - low)) & 1)
+
+
+def compile_cron(condition):
+    """
+    split a cron condition into its members and compile them into bitsets
+    of the matching targets
+
+    :param condition: a cron condition
+    :return: tuple of the six compiled cron members
+    """
+
     condition_parts = []
     parts = condition.split(' ')
     for part in parts:
@@ -710,24 +993,33 @@ def cron_compare(condition, now):
     if len(condition_parts) != 6:
         raise Exception("Error in Time Condition format")
 
+    return tuple(_compile_cron_value(part, target_range)
+                 for part, target_range in zip(condition_parts, CRON_RANGES))
+
+
+def match_cron(cron_parts, now):
+    """
+    compare the members of a cron condition with a given datetime
+
+    :param cron_parts: the result of compile_cron
+    :param now: the datetime to compare with
+
+    :return: boolean - is allowed or not
+    """
+
     #
     # extract the members of the cron condition
 
-    minute = condition_parts[0]
-    hour = condition_parts[1]
-    dom = condition_parts[2]
-    month = condition_parts[3]
-    dow = condition_parts[4]
-    year = condition_parts[5]
+    (minute, hour, dom, month, dow, year) = cron_parts
 
     weekday = now.isoweekday()
 
-    return (_compare_cron_value(minute, now.minute) and
-            _compare_cron_value(hour, now.hour) and
-            _compare_cron_value(dom, now.day) and
-            _compare_cron_value(month, now.month) and
-            _compare_cron_value(dow, 0 if weekday == 7 else weekday) and
-            _compare_cron_value(year, now.year))
+    return (_match_cron_value(minute, now.minute) and
+            _match_cron_value(hour, now.hour) and
+            _match_cron_value(dom, now.day) and
+            _match_cron_value(month, now.month) and
+            _match_cron_value(dow, 0 if weekday == 7 else weekday) and
+            _match_cron_value(year, now.year))
 
 
 def time_list_compare(policy_conditions, now):
@@ -752,12 +1044,22 @@ def time_list_compare(policy_conditions, now):
             the cron expression
 
     """
-    conditions = [x.strip() for x in policy_conditions.split(';')]
+    return match_time_conditions(compile_time_conditions(policy_conditions),
+                                 now)
 
-    matched = False
 
-    if now is None:
-        now = datetime.now()
+def compile_time_conditions(policy_conditions):
+    """
+    prepare the time conditions of a policy for the comparison
+
+    :param policy_conditions: the time condition described in the policy
+    :return: None for the wildcard or list of tuples
+             (not_condition, cron members)
+    """
+
+    conditions = [x.strip() for x in policy_conditions.split(';')]
+
+    compiled = []
 
     for condition in conditions:
 
@@ -767,10 +1069,12 @@ def time_list_compare(policy_conditions, now):
         if not condition:
             continue
 
-        # if in the conditions one is with wildcard we grant access
+        # if in the conditions one is with wildcard we grant access - as
+        # long as no former not condition matches
 
         if condition == '*':
-            return True
+            compiled.append((False, None))
+            break
 
         #
         # support excluding conditions which start with [-,!]
@@ -781,10 +1085,43 @@ def time_list_compare(policy_conditions, now):
             its_a_not_condition = True
             condition = condition[1:]
 
+        # an invalid condition is reported, when it is evaluated
+        try:
+            cron_parts = compile_cron(condition)
+        except Exception as exx:
+            cron_parts = exx
+
+        compiled.append((its_a_not_condition, cron_parts))
+
+    return compiled
+
+
+def match_time_conditions(compiled_conditions, now):
+    """
+    compare a given time with the prepared time conditions
+
+    :param compiled_conditions: the result of compile_time_conditions
+    :param now: the datetime to compare with
+    :return: booleans
+    """
+
+    matched = False
+
+    if now is None:
+        now = datetime.now()
+
+    for its_a_not_condition, cron_parts in compiled_conditions:
+
+        if cron_parts is None:
+            return True
+
+        if isinstance(cron_parts, Exception):
+            raise cron_parts
+
         #
         # compare the cron condition
 
-        if cron_compare(condition, now):
+        if match_cron(cron_parts, now):
             if its_a_not_condition:
                 return False
             else:
@@ -792,4 +1129,13 @@ def time_list_compare(policy_conditions, now):
 
     return matched
 
+#
+# the comparing functions, which could work on prepared policy conditions
+# as tuple of (compile function, match function)
+
+Compiled_Compare = {
+    ip_list_compare: (compile_ip_conditions, match_ip_conditions),
+    time_list_compare: (compile_time_conditions, match_time_conditions),
+}
+
 # eof
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+policy index - the parsed policies of a config version with lookup tables
+for the policy evaluation, which is shared among the requests
+"""
+
+import logging
+import threading
+
+from copy import deepcopy
+
+from linotp.lib.policy.util import parse_policies
+
+log = logging.getLogger(__name__)
+
+
+class PolicyIndex(dict):
+    """
+    the dict of all policies - as returned by parse_policies - extended by
+    lookup tables for the filter attributes scope, name, active, action
+    and realm.
+
+    The index is built once per config version and shared among all
+    requests, thus neither the index nor the policy dicts must be modified.
+    """
+
+    def __init__(self, policies, version=None):
+
+        super(PolicyIndex, self).__init__(policies)
+
+        self.version = version
+
+        # the prepared policy conditions like client networks or time
+        # conditions, cached by (compile function, condition)
+
+        self._compiled = {}
+
+        self._by_scope = {}
+        self._by_active = {True: set(), False: set()}
+        self._by_action = {}
+        self._wildcard_action = set()
+        self._by_realm = {}
+        self._wildcard_realm = set()
+
+        for name, policy in self.items():
+
+            # the evaluation adds the name to the policy description
+            # for the name filter - we do this once up front
+
+            if 'name' not in policy:
+                policy['name'] = name
+
+            self._index_policy(name, policy)
+
+    def _index_policy(self, name, policy):
+
+        scope = policy.get('scope')
+        self._by_scope.setdefault(scope, set()).add(name)
+
+        active = str(policy.get('active')).lower() == 'true'
+        self._by_active[active].add(name)
+
+        action = policy.get('action') or ''
+
+        for condition in [x.strip() for x in action.split(',')]:
+            if condition == '*':
+                self._wildcard_action.add(name)
+                continue
+
+            cond_name, _sep, _cond_value = condition.partition('=')
+            self._by_action.setdefault(condition, set()).add(name)
+            self._by_action.setdefault(cond_name.strip(), set()).add(name)
+
+        realm = policy.get('realm') or ''
+
+        for condition in [x.strip() for x in realm.split(',')]:
+            if condition == '*':
+                self._wildcard_realm.add(name)
+            elif condition and condition[0] not in ['-', '!']:
+                self._by_realm.setdefault(condition.lower(), set()).add(name)
+
+    def _lookup(self, key, value):
+        """
+        lookup the names of the policies which might match the filter
+
+        :param key: the filter attribute
+        :param value: the filter value
+        :return: set of policy names or None, if the filter could not be
+                 answered by the index
+        """
+
+        if key == 'scope' and isinstance(value, basestring):
+            return self._by_scope.get(value, set())
+
+        if key == 'name' and isinstance(value, basestring):
+            return set([value]) if value in self else set()
+
+        if key == 'active' and isinstance(value, bool):
+            return self._by_active[value]
+
+        if key == 'action' and isinstance(value, basestring):
+            return self._wildcard_action | self._by_action.get(value, set())
+
+        if key == 'realm' and isinstance(value, basestring):
+            return (self._wildcard_realm |
+                    self._by_realm.get(value.lower(), set()))
+
+        return None
+
+    def candidates(self, filters):
+        """
+        get the policies, which might match the given filters
+
+        the returned policies are only pre-selected - all filters have to be
+        evaluated against them in the end
+
+        :param filters: list of (key, value, compare function) tuples
+        :return: list of (name, policy) tuples
+        """
+
+        selected = None
+
+        for (f_key, f_value, _f_compare) in filters:
+
+            names = self._lookup(f_key, f_value)
+            if names is None:
+                continue
+
+            if selected is None:
+                selected = set(names)
+            else:
+                selected &= names
+
+            if not selected:
+                return []
+
+        if selected is None:
+            return self.items()
+
+        return [(name, self[name]) for name in selected]
+
+    def get_compiled(self, compile_function, condition):
+        """
+        get the prepared policy condition
+
+        :param compile_function: the function to prepare the condition
+        :param condition: the policy condition
+        :return: the prepared condition
+        """
+
+        key = (compile_function, condition)
+
+        if key not in self._compiled:
+            self._compiled[key] = compile_function(condition)
+
+        return self._compiled[key]
+
+    def __deepcopy__(self, memo):
+        """
+        a copy of the index is a plain, modifiable policy dict
+        """
+        return deepcopy(dict(self), memo)
+
+
+# -------------------------------------------------------------------------- --
+
+_policy_index = None
+_policy_index_lock = threading.Lock()
+
+
+def get_policy_index(config):
+    """
+    get the policy index of the given config
+
+    the index is shared as long as the config version does not change
+
+    :param config: the request config (LinOtpConfig)
+    :return: PolicyIndex
+    """
+
+    global _policy_index
+
+    version = getattr(config, 'snapshot_version', None)
+
+    if version is None:
+        return PolicyIndex(parse_policies(config))
+
+    policy_index = _policy_index
+    if policy_index is not None and policy_index.version == version:
+        return policy_index
+
+    with _policy_index_lock:
+
+        policy_index = _policy_index
+        if policy_index is None or policy_index.version != version:
+
+            log.debug("building policy index for config version %r",
+                      version)
+
+            policy_index = PolicyIndex(parse_policies(config), version)
+
+            # don't replace the index of a newer config version
+
+            if _policy_index is None or _policy_index.version < version:
+                _policy_index = policy_index
+
+    return policy_index
+
+# eof #
@@ -165,8 +165,9 @@ def deletePolicy(name, enforce=False):
 
     policies = get_policies()
 
-    # check if due to delete of the policy a lockout could happen
-    param = policies.get(name)
+    # check if due to delete of the policy a lockout could happen - the
+    # policies are shared, so we work on a copy of the policy
+    param = dict(policies.get(name) or {})
     # delete is same as inactive ;-)
     if param:
         param['active'] = "False"
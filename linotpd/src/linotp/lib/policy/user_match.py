@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+policy user match cache -
+
+the user conditions of the policies like 'resolver:', 'user@realm' or
+'#attribute' require user lookups in the resolvers and the policies are
+evaluated many times per request. Thus the results of matching a user
+against the user conditions of a policy are remembered for the request and
+optionally across the requests with an expiration.
+
+the results are keyed by the user, the user conditions and the version of
+the policy config, so that a policy change never uses former results.
+"""
+
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+
+from linotp.lib.context import is_on_context_stack
+from linotp.lib.context import request_context
+from linotp.lib.type_utils import get_duration
+
+log = logging.getLogger(__name__)
+
+
+class UserMatchCache(object):
+    """
+    process wide, size bounded cache of the user match results
+    """
+
+    def __init__(self, max_entries=10000, expiretime=60):
+        """
+        :param max_entries: the maximum number of entries
+        :param expiretime: seconds after which an entry expires
+        """
+
+        self.max_entries = max_entries
+        self.expiretime = expiretime
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :return: tuple of found and the match result
+        """
+
+        with self._lock:
+
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return False, None
+
+            expires, matched = entry
+
+            if expires < time.time():
+                del self._entries[key]
+                return False, None
+
+            return True, matched
+
+    def add(self, key, matched):
+        """
+        remember the match result - the oldest entries are evicted, if the
+        size bound is exceeded
+        """
+
+        with self._lock:
+
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + self.expiretime, matched)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+
+        with self._lock:
+            self._entries.clear()
+
+
+_user_match_cache = UserMatchCache()
+
+
+class RequestUserMatches(object):
+    """
+    the user match results and the counters of a request
+    """
+
+    def __init__(self, shared_cache=None):
+        """
+        :param shared_cache: the UserMatchCache across the requests or None
+        """
+
+        self.shared_cache = shared_cache
+
+        self.results = {}
+
+        # the number of user lookups, which were required for the
+        # evaluation of the user conditions
+
+        self.lookups = 0
+
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        :return: tuple of found and the match result
+        """
+
+        if key in self.results:
+            self.hits += 1
+            return True, self.results[key]
+
+        if self.shared_cache is not None:
+            found, matched = self.shared_cache.get(key)
+            if found:
+                self.shared_hits += 1
+                self.results[key] = matched
+                return True, matched
+
+        self.misses += 1
+        return False, None
+
+    def add(self, key, matched):
+
+        self.results[key] = matched
+
+        if self.shared_cache is not None:
+            self.shared_cache.add(key, matched)
+
+    def get_statistics(self):
+
+        return {'lookups': self.lookups,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses}
+
+
+def _get_shared_cache(config):
+    """
+    helper - get the user match cache across the requests
+
+    :return: the UserMatchCache or None, if not enabled
+    """
+
+    enabled = config.get('linotp.policy_user_match_cache.enabled',
+                         'False') == 'True'
+    if not enabled:
+        return None
+
+    try:
+        expiration = get_duration(config.get(
+                        'linotp.policy_user_match_cache.expiration', 60))
+        max_entries = int(config.get(
+                        'linotp.policy_user_match_cache.size', 10000))
+
+    except ValueError:
+        log.info("policy user match caching is disabled due to a value "
+                 "error in the policy_user_match_cache config")
+        return None
+
+    _user_match_cache.max_entries = max_entries
+    _user_match_cache.expiretime = expiration
+
+    return _user_match_cache
+
+
+def get_request_user_matches():
+    """
+    get the user match results of the request
+
+    :return: RequestUserMatches or None, if not called within a request
+    """
+
+    if not is_on_context_stack('request_context_safety'):
+        return None
+
+    user_matches = request_context.get('PolicyUserMatches')
+
+    if user_matches is None:
+
+        config = request_context.get('Config') or {}
+
+        user_matches = RequestUserMatches(_get_shared_cache(config))
+        request_context['PolicyUserMatches'] = user_matches
+
+    return user_matches
+
+
+def get_policy_version():
+    """
+    :return: the version of the policy config of the request or None
+    """
+
+    return getattr(request_context.get('Policies'), 'version', None)
+
+
+def count_user_lookup():
+    """
+    count a user lookup of the user condition evaluation
+    """
+
+    user_matches = get_request_user_matches()
+
+    if user_matches is not None:
+        user_matches.lookups += 1
+
+
+def log_user_match_statistics(logger):
+    """
+    log the user lookups and the cache usage of the policy evaluation of
+    the request - should be called at the end of the request
+
+    :param logger: The logger that should be used
+    """
+
+    user_matches = request_context.get('PolicyUserMatches')
+
+    if user_matches is None:
+        return
+
+    extra = user_matches.get_statistics()
+    extra['type'] = 'policy_user_matches'
+
+    logger.debug('Policy evaluation required %d user lookups (cache hits: '
+                 '%d, shared cache hits: %d, misses: %d)' % (
+                     extra['lookups'], extra['hits'],
+                     extra['shared_hits'], extra['misses']),
+                 extra=extra)
+
+# eof #
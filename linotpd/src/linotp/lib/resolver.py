@@ -28,8 +28,10 @@
 
 import logging
 
+import hashlib
 import json
 import re
+import threading
 
 from functools import partial
 
@@ -107,6 +109,17 @@ __all__ = ['defineResolver', 'parse_resolver_spec',
 
 resolver_name_pattern = re.compile('^[a-zA-Z0-9_\-]{4,}$')
 
+# the process wide cache of the idle resolver instances, which are reused
+# across the requests:
+#     resolver_spec -> list of (config version, resolver instance)
+# a resolver instance is only used by one request at a time - it is taken
+# out of the cache when loaded and returned at the end of the request
+
+_resolver_instances = {}
+_resolver_instances_lock = threading.Lock()
+
+MAX_IDLE_RESOLVER_INSTANCES = 20
+
 
 log = logging.getLogger(__name__)
 
@@ -217,6 +230,7 @@ def defineResolver(params):
                                   conf)
 
     _flush_user_resolver_cache(resolver_spec)
+    _evict_resolver_instances(resolver_spec)
 
     return resolver
 
@@ -476,6 +490,8 @@ def deleteResolver(resolvername):
         for resolver_spec in resolver_specs:
             _flush_user_resolver_cache(resolver_spec)
             _delete_from_resolver_config_cache(resolver_spec)
+            _flush_resolver_connections(resolver_spec)
+            _evict_resolver_instances(resolver_spec)
 
     return res
 
@@ -487,6 +503,9 @@ def getResolverObject(resolver_spec, config=None, load_config=True):
     get the resolver instance from a resolver specification.
 
     :remark: internally this function uses the request context for caching.
+             The loaded resolvers are returned to the process wide
+             resolver instance cache at the end of the request and
+             are reused, as long as their config version is unchanged.
 
     :param resolver_spec: the resolver string as from the token including
                           the config identifier.
@@ -533,9 +552,22 @@ def getResolverObject(resolver_spec, config=None, load_config=True):
             log.error('Unknown resolver class: %s' % cls_identifier)
             return None
 
-        resolver = resolver_cls()
+        if not load_config:
+            return resolver_cls()
+
+        # try to reuse an idle resolver instance with the same config
+
+        config_version = None
+        resolver = None
+
+        if _resolver_instance_cache_enabled(config):
+            config_version = _get_resolver_config_version(
+                                    resolver_cls, config, config_identifier)
+            resolver = _checkout_resolver(resolver_spec, config_version)
+
+        if resolver is None:
 
-        if load_config:
+            resolver = resolver_cls()
 
             try:
                 resolver.loadConfig(config, config_identifier)
@@ -549,15 +581,155 @@ def getResolverObject(resolver_spec, config=None, load_config=True):
 
                 return None
 
-            # in case of the replication there might by difference
-            # in the used resolver config and the config from the LinOTP config
-            _check_for_resolver_cache_flush(resolver_spec, config_identifier)
+        # in case of the replication there might by difference
+        # in the used resolver config and the config from the LinOTP config
+        _check_for_resolver_cache_flush(resolver_spec, config_identifier)
 
-            resolvers_loaded[resolver_spec] = resolver
+        resolvers_loaded[resolver_spec] = resolver
+
+        if config_version:
+            resolver_versions = context.setdefault('resolver_versions', {})
+            resolver_versions[resolver_spec] = config_version
 
         return resolver
 
 
+def _resolver_instance_cache_enabled(config):
+    """
+    check if the resolver instances should be reused across the requests
+
+    :param config: the linotp config
+    :return: boolean
+    """
+
+    try:
+        return boolean(config.get('linotp.resolver_instance_cache.enabled',
+                                  True))
+    except ValueError:
+        log.warning("resolver instance caching is disabled due to a value "
+                    "error in resolver_instance_cache.enabled config")
+        return False
+
+
+def _get_resolver_config_version(resolver_cls, config, config_identifier):
+    """
+    get the version of the resolver config - the version changes with any
+    change of the resolver definition or of the global config entries the
+    resolver depends on
+
+    :param resolver_cls: the resolver class
+    :param config: the linotp config
+    :param config_identifier: the resolver config identifier
+
+    :return: the config version as hex digest
+    """
+
+    prefix = 'linotp.%s.' % resolver_cls.getResolverClassType()
+    suffix = '.%s' % config_identifier
+
+    global_keys = set(key for key in resolver_cls.resolver_parameters
+                      if key.startswith('linotp.'))
+
+    resolver_config = {}
+
+    for key, value in config.items():
+        if ((key.startswith(prefix) and key.endswith(suffix)) or
+           key in global_keys):
+            resolver_config[key] = value
+
+    resolver_config_dump = json.dumps(resolver_config, sort_keys=True,
+                                      default=unicode)
+
+    return hashlib.sha256(resolver_config_dump.encode('utf-8')).hexdigest()
+
+
+def _checkout_resolver(resolver_spec, config_version):
+    """
+    take an idle resolver instance out of the resolver instance cache
+
+    instances of a former config version are dropped
+
+    :param resolver_spec: resolver spec - fully qualified resolver
+    :param config_version: the version of the current resolver config
+    :return: resolver instance or None
+    """
+
+    outdated = []
+    resolver = None
+
+    with _resolver_instances_lock:
+
+        idle_resolvers = _resolver_instances.get(resolver_spec, [])
+
+        while idle_resolvers:
+            version, idle_resolver = idle_resolvers.pop()
+            if version == config_version:
+                resolver = idle_resolver
+                break
+            outdated.append(idle_resolver)
+
+    _close_resolver_instances(resolver_spec, outdated)
+
+    return resolver
+
+
+def _checkin_resolver(resolver_spec, config_version, resolver):
+    """
+    return a resolver instance into the resolver instance cache for reuse
+
+    :param resolver_spec: resolver spec - fully qualified resolver
+    :param config_version: the version of the resolver config
+    :param resolver: the resolver instance
+    """
+
+    with _resolver_instances_lock:
+
+        idle_resolvers = _resolver_instances.setdefault(resolver_spec, [])
+
+        # an outdated instance is not returned - the config has been
+        # changed in between and the newer instances are kept
+
+        if idle_resolvers and idle_resolvers[-1][0] != config_version:
+            return
+
+        if len(idle_resolvers) < MAX_IDLE_RESOLVER_INSTANCES:
+            idle_resolvers.append((config_version, resolver))
+
+
+def _evict_resolver_instances(resolver_spec):
+    """
+    drop all idle instances of a resolver from the resolver instance cache
+        in case of a change or deletion of the resolver
+
+    :param resolver_spec: the resolver which has been updated or deleted
+    :return: - nothing -
+    """
+
+    with _resolver_instances_lock:
+        idle_resolvers = _resolver_instances.pop(resolver_spec, [])
+
+    _close_resolver_instances(
+        resolver_spec, [resolver for _version, resolver in idle_resolvers])
+
+
+def _close_resolver_instances(resolver_spec, resolvers):
+    """
+    helper - close the dropped resolver instances
+
+    :param resolver_spec: resolver spec - fully qualified resolver
+    :param resolvers: list of resolver instances
+    """
+
+    for resolver in resolvers:
+        if not hasattr(resolver, 'close'):
+            continue
+        try:
+            resolver.close()
+        except Exception as exx:
+            log.exception("Failed to close resolver %r. Exception was %r",
+                          resolver_spec, exx)
+
+
 def _check_for_resolver_cache_flush(resolver_spec, config_identifier):
     """
     check if the current resolver config is still the current one
@@ -580,6 +752,11 @@ def _check_for_resolver_cache_flush(resolver_spec, config_identifier):
         # now we delete the user_resolver cache
         _flush_user_resolver_cache(resolver_spec)
 
+        # and drop the pooled connections and the idle instances
+        # of the former resolver config
+        _flush_resolver_connections(resolver_spec)
+        _evict_resolver_instances(resolver_spec)
+
         # and establish the new config in the resolver config cache
         # by deleting the reference key and adding the entry
 
@@ -614,6 +791,32 @@ def _flush_user_resolver_cache(resolver_spec):
             delete_realm_resolver_cache(realm_name)
 
 
+def _flush_resolver_connections(resolver_spec):
+    """
+    drop the process wide pooled connections of a resolver
+
+        in case of a change of the resolver config, the pooled connections,
+        which are shared across the requests, might refer to the former
+        resolver config and must be released
+
+    :param resolver_spec: the resolver which has been updated or deleted
+    :return: - nothing -
+    """
+
+    cls_identifier, config_identifier = parse_resolver_spec(resolver_spec)
+
+    resolver_cls = get_resolver_class(cls_identifier)
+
+    if resolver_cls is None or not hasattr(resolver_cls, 'flush_connections'):
+        return
+
+    try:
+        resolver_cls.flush_connections(config_identifier)
+    except Exception as exx:
+        log.exception("Failed to flush the connections of resolver %r. "
+                      "Exception was %r", resolver_spec, exx)
+
+
 def _get_resolver_config(resolver_config_identifier):
     """
     get the resolver config of a resolver identified by its config identifier
@@ -781,6 +984,9 @@ def initResolvers():
         # dict of all resolvers, which are instantiated during the request
         context['resolvers_loaded'] = {}
 
+        # and the config versions of the resolvers for the reuse
+        context['resolver_versions'] = {}
+
     except Exception as exx:
         log.exception("Failed to initialize resolver for context. "
                       "Exception was  %r" % exx)
@@ -791,11 +997,25 @@ def initResolvers():
 def closeResolvers():
     """
     hook to close the resolvers at the end of the request
+
+    the closed resolvers are returned to the resolver instance cache for
+    the reuse in the next requests
     """
+    resolver_versions = context.get('resolver_versions') or {}
+
     try:
-        for resolver in context.get('resolvers_loaded', {}).values():
+        resolvers_loaded = context.get('resolvers_loaded', {})
+
+        for resolver_spec, resolver in resolvers_loaded.items():
             if hasattr(resolver, 'close'):
                 resolver.close()
+
+            # a returned resolver must not be used by this request anymore
+            config_version = resolver_versions.pop(resolver_spec, None)
+            if config_version:
+                del resolvers_loaded[resolver_spec]
+                _checkin_resolver(resolver_spec, config_version, resolver)
+
     except Exception as exx:
             log.exception("Failed to close resolver in context. "
                           "Exception was %r" % exx)
@@ -26,9 +26,15 @@
 """default SecurityModules which takes the enc keys from a file"""
 
 
+import atexit
+import ctypes
+import ctypes.util
+import io
 import logging
 import binascii
 import os
+import threading
+import time
 
 from Cryptodome.Cipher import AES
 
@@ -44,10 +50,244 @@ CONFIG_KEY = 1
 VALUE_KEY = 2
 DEFAULT_KEY = 2
 
+KEY_SIZE = 32
+
+# the key file is checked for modifications at most every n seconds
+KEY_FILE_CHECK_INTERVAL = 10
+
 
 log = logging.getLogger(__name__)
 
 
+def _get_libc():
+    """
+    helper - load the libc, which provides the mlock and munlock calls
+
+    :return: the libc or None if not available
+    """
+    try:
+        libc_name = ctypes.util.find_library('c')
+        if libc_name:
+            return ctypes.CDLL(libc_name, use_errno=True)
+    except Exception as exx:
+        log.info("libc not available - keys could not be locked: %r", exx)
+    return None
+
+
+_libc = _get_libc()
+
+
+def _buffer_address(buf):
+    """
+    helper - get the memory address and size of a bytearray
+
+    :param buf: the bytearray
+    :return: tuple of address and size
+    """
+    c_buf = (ctypes.c_char * len(buf)).from_buffer(buf)
+    return ctypes.addressof(c_buf), len(buf)
+
+
+def _mlock(buf):
+    """
+    lock the memory of the key buffer, so that it will not be swapped
+
+    :param buf: the bytearray with the key material
+    :return: boolean - True if the memory could be locked
+    """
+    if _libc is None or not buf:
+        return False
+
+    address, size = _buffer_address(buf)
+    if _libc.mlock(ctypes.c_void_p(address), ctypes.c_size_t(size)) != 0:
+        log.info("failed to lock the key memory: errno %d",
+                 ctypes.get_errno())
+        return False
+
+    return True
+
+
+def _wipe(buf, locked=False):
+    """
+    zero the key buffer and release the memory lock
+
+    :param buf: the bytearray with the key material
+    :param locked: if the buffer memory was locked before
+    """
+    if not buf:
+        return
+
+    buf[:] = b'\0' * len(buf)
+
+    if locked and _libc is not None:
+        address, size = _buffer_address(buf)
+        _libc.munlock(ctypes.c_void_p(address), ctypes.c_size_t(size))
+
+
+class KeyFileCache(object):
+    """
+    process wide in-memory cache of the key material of one secret file
+
+    the key file is read once and its content is kept in a bytearray, which
+    is locked in memory where possible. The file is checked at most every
+    check interval for modifications (inode, size or mtime) and reloaded if
+    required - the former key material is zeroed then.
+
+    all security module instances of the hsm pool, which refer to the same
+    key file, share one cache. In crypted mode the keys are loaded once and
+    the key file is not checked anymore, so that it could be removed after
+    the startup.
+    """
+
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    @classmethod
+    def get_cache(cls, sec_file, check_interval=KEY_FILE_CHECK_INTERVAL,
+                  reload_keys=True):
+        """
+        get the shared key cache of a key file
+
+        :param sec_file: the name of the key file
+        :param check_interval: the max seconds between the file checks
+        :param reload_keys: check the key file for modifications
+        :return: the key cache
+        """
+        with cls._registry_lock:
+            cache = cls._registry.get(sec_file)
+            if cache is None:
+                cache = cls(sec_file, check_interval, reload_keys)
+                cls._registry[sec_file] = cache
+            elif not reload_keys:
+                cache.reload_keys = False
+            return cache
+
+    @classmethod
+    def clear_all(cls):
+        """
+        zero the key material of all caches - called on shutdown
+        """
+        with cls._registry_lock:
+            for cache in cls._registry.values():
+                cache.clear()
+            cls._registry.clear()
+
+    def __init__(self, sec_file, check_interval=KEY_FILE_CHECK_INTERVAL,
+                 reload_keys=True):
+
+        self.sec_file = sec_file
+        self.check_interval = check_interval
+        self.reload_keys = reload_keys
+
+        self._lock = threading.Lock()
+        self._keys = None
+        self._locked = False
+        self._file_id = None
+        self._last_check = 0
+
+    def get_secret(self, slot_id):
+        """
+        get the key of a slot - the key is returned as a new string, so that
+        the caller could zero it after usage without touching the cache
+
+        :param slot_id: the slot of the key array
+        :return: the key
+        """
+
+        with self._lock:
+            self._check_for_reload()
+
+            start = slot_id * KEY_SIZE
+            buf = self._keys[start:start + KEY_SIZE]
+
+        try:
+            secret = bytes(buf)
+        finally:
+            _wipe(buf)
+
+        if not secret:
+            raise Exception("No secret key defined for index: %r !\n"
+                            "Please extend your %s"" !",
+                            slot_id, self.sec_file)
+
+        return secret
+
+    def clear(self):
+        """
+        zero the cached key material
+        """
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+
+        if self._keys is not None:
+            _wipe(self._keys, self._locked)
+
+        self._keys = None
+        self._locked = False
+        self._file_id = None
+
+    def _check_for_reload(self):
+        """
+        reload the key file, if it has not been loaded yet or if it has been
+        modified since the last load
+        """
+
+        if self._keys is not None and not self.reload_keys:
+            return
+
+        now = time.time()
+
+        if (self._keys is not None and
+           now - self._last_check < self.check_interval):
+            return
+
+        self._last_check = now
+
+        try:
+            stat = os.stat(self.sec_file)
+
+        except OSError as exx:
+            if self._keys is None:
+                raise
+
+            # the loaded keys stay valid, if the key file is not accessible
+            log.warning("key file %r could not be checked: %r",
+                        self.sec_file, exx)
+            return
+
+        file_id = (stat.st_ino, stat.st_size, stat.st_mtime)
+
+        if self._keys is not None and file_id == self._file_id:
+            return
+
+        if self._keys is not None:
+            log.info("key file %r has been modified - reloading",
+                     self.sec_file)
+
+        # read the file directly into the bytearray without buffering,
+        # so that there is no other copy of the key material left
+
+        keys = bytearray(stat.st_size)
+        with io.open(self.sec_file, 'rb', buffering=0) as key_file:
+            read = key_file.readinto(keys)
+
+        if read < len(keys):
+            read_keys = keys[:read]
+            _wipe(keys)
+            keys = read_keys
+
+        self._clear()
+
+        self._locked = _mlock(keys)
+        self._keys = keys
+        self._file_id = file_id
+
+
+atexit.register(KeyFileCache.clear_all)
+
+
 class DefaultSecurityModule(SecurityModule):
     """
     the default security provider
@@ -83,7 +323,12 @@ class DefaultSecurityModule(SecurityModule):
             raise Exception("no secret file defined: linotpSecretFile!")
 
         self.secFile = config.get('file')
-        self.secrets = {}
+
+        check_interval = int(config.get('key_check_interval',
+                                        KEY_FILE_CHECK_INTERVAL))
+        self.key_cache = KeyFileCache.get_cache(
+                                    self.secFile, check_interval,
+                                    reload_keys=not self.crypted)
 
         return
 
@@ -111,27 +356,11 @@ class DefaultSecurityModule(SecurityModule):
         '''
         id = int(id)
 
-        if self.crypted:
-            if id in self.secrets:
-                return self.secrets.get(id)
-
-        secret = ''
         try:
-                f = open(self.secFile)
-                for _i in range(0, id + 1):
-                    secret = f.read(32)
-                f.close()
-                if not secret:
-                    # secret = setupKeyFile(secFile, id+1)
-                    raise Exception("No secret key defined for index: %r !\n"
-                                    "Please extend your %s"" !",
-                                    id, self.secFile)
+            secret = self.key_cache.get_secret(id)
         except Exception as exx:
             raise Exception("Exception: %r" % exx)
 
-        if self.crypted:
-            self.secrets[id] = secret
-
         return secret
 
     def setup_module(self, param):
@@ -151,13 +380,13 @@ class DefaultSecurityModule(SecurityModule):
             raise Exception("missing password")
 
         # if we have a crypted file and a password, we take all keys
-        # from the file and put them in a hash
+        # from the file and put them in the key cache
         # #
         # After this we do not require the password anymore
 
         handles = ['pinHandle', 'passHandle', 'valueHandle', 'defaultHandle']
         for handle in handles:
-            self.getSecret(self.config.get(handle, '0'))
+            zerome(self.getSecret(self.config.get(handle, '0')))
 
         self.is_ready = True
         return
@@ -207,9 +436,8 @@ class DefaultSecurityModule(SecurityModule):
 
         res = aes.encrypt(input)
 
-        if self.crypted is False:
-            zerome(key)
-            del key
+        zerome(key)
+        del key
         return res
 
     def decrypt(self, input, iv=None, id=0):
@@ -250,9 +478,8 @@ class DefaultSecurityModule(SecurityModule):
         # convert output from ascii, back to bin data
         data = binascii.a2b_hex(output[:eof-1])
 
-        if self.crypted is False:
-            zerome(key)
-            del key
+        zerome(key)
+        del key
 
         return data
 
@@ -450,6 +677,29 @@ class DefaultSecurityModule(SecurityModule):
 
         return digest
 
+    def hmac_digests(self, bkey, data_inputs, hash_algo):
+        """
+        hmac of a list of data with the same key
+
+        the key is only fed into a single keyed hmac state, which is copied
+        for every data input - used for the evaluation of an otp window
+
+        :param bkey: the private shared secret
+        :param data_inputs: list of data
+        :param hash_algo: one of the hashing algorithms
+        :return: list of digests in the order of the data inputs
+        """
+
+        keyed_hmac = hmac.new(bkey, digestmod=hash_algo)
+
+        digests = []
+        for data_input in data_inputs:
+            h_mac = keyed_hmac.copy()
+            h_mac.update(data_input)
+            digests.append(h_mac.digest())
+
+        return digests
+
     def hash_digest(self, val, seed, hash_algo=None):
         """
         simple hash with implicit digest
@@ -106,4 +106,21 @@ class FipsSecurityModule(DefaultSecurityModule):
 
         return digest
 
+    def hmac_digests(self, bkey, data_inputs, hash_algo):
+        """
+        call the fips hmac function for a list of data inputs
+
+        the fips hmac functions do not provide a reusable keyed state, so
+        each data input is processed on its own
+
+        :param bkey: the secret key of the hmac token
+        :param data_inputs: list of input data like counter or time
+        :param: the hashing algorithm
+
+        :return: list of hmac digests
+        """
+
+        return [self.hmac_digest(bkey, data_input, hash_algo)
+                for data_input in data_inputs]
+
 # eof #########################################################################
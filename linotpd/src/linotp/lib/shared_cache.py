@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+host wide shared, size bounded lookup cache
+
+the cache entries are stored in a sqlite file, which is shared by all
+worker processes of a host. The size of the cache is bounded by the number
+of entries - the least recently used entries are evicted.
+
+the cache namespaces provide the beaker cache interface, which is used for
+the user and resolver lookup caches: get_value(key, createfunc) and clear()
+
+as the cached user data is trusted, the cache file must be in a directory of
+the service user, which is not writable by others. The file is created with
+mode 0600 and the values are stored as json.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import stat
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS ix_entries_accessed ON entries (accessed);
+"""
+
+# the access time of an entry is only updated, if it is older than this
+# number of seconds - so that not every cache hit results in a write
+TOUCH_INTERVAL = 60
+
+# the size bound is verified after this number of inserts
+EVICT_INTERVAL = 100
+
+
+class SharedCacheError(Exception):
+    pass
+
+
+def secure_cache_file(path):
+    """
+    verify the location of the cache file and create it with mode 0600 -
+    the directory and the file must be owned by the service user and the
+    directory must not be writable by others
+
+    :param path: the file name of the sqlite cache
+    :raises SharedCacheError: if the cache file could not be used
+    """
+
+    uid = os.geteuid()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    dir_stat = os.stat(directory)
+
+    if dir_stat.st_uid != uid:
+        raise SharedCacheError("cache directory %r is not owned by the "
+                               "service user" % directory)
+
+    if dir_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise SharedCacheError("cache directory %r is writable by others"
+                               % directory)
+
+    flags = os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0)
+    fd = os.open(path, flags, 0o600)
+
+    try:
+        file_stat = os.fstat(fd)
+
+        if file_stat.st_uid != uid:
+            raise SharedCacheError("cache file %r is not owned by the "
+                                   "service user" % path)
+
+        if stat.S_IMODE(file_stat.st_mode) != 0o600:
+            os.fchmod(fd, 0o600)
+
+    finally:
+        os.close(fd)
+
+
+class SharedCache(object):
+    """
+    the sqlite based cache file with its namespaces
+    """
+
+    def __init__(self, path, max_entries=100000, timeout=5.0):
+        """
+        :param path: the file name of the sqlite cache
+        :param max_entries: the maximum number of entries of all namespaces
+        :param timeout: seconds to wait for a lock of another process
+        """
+
+        self.path = path
+        self.max_entries = max_entries
+        self.timeout = timeout
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inserts = 0
+
+        self.hits = {}
+        self.misses = {}
+
+    def _connection(self):
+        """
+        get the connection of the current thread - as the connection could
+        not be shared with a forked process, the process id is verified
+        """
+
+        conn = getattr(self._local, 'conn', None)
+
+        if conn is None or self._local.pid != os.getpid():
+            secure_cache_file(self.path)
+            conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+
+        return conn
+
+    def namespace(self, name, expiretime=None):
+        """
+        get the cache namespace, which provides the beaker cache interface
+
+        :param name: the namespace name
+        :param expiretime: seconds after which the entries expire
+        """
+        return SharedCacheNamespace(self, name, expiretime)
+
+    def _count(self, counter, namespace):
+        with self._lock:
+            counter[namespace] = counter.get(namespace, 0) + 1
+
+    def get(self, namespace, key, expiretime=None):
+        """
+        lookup the cache entry
+
+        :return: tuple of boolean, if found and the value
+        """
+
+        now = time.time()
+
+        row = self._connection().execute(
+                'SELECT value, created, accessed FROM entries '
+                'WHERE namespace = ? AND key = ?', (namespace, key)).fetchone()
+
+        if row is None:
+            self._count(self.misses, namespace)
+            return False, None
+
+        value, created, accessed = row
+
+        if expiretime and created + expiretime < now:
+            self._count(self.misses, namespace)
+            return False, None
+
+        if accessed + TOUCH_INTERVAL < now:
+            self._connection().execute(
+                'UPDATE entries SET accessed = ? '
+                'WHERE namespace = ? AND key = ?', (now, namespace, key))
+
+        self._count(self.hits, namespace)
+        return True, json.loads(value)
+
+    def set(self, namespace, key, value):
+        """
+        store the cache entry
+        """
+
+        try:
+            data = json.dumps(value)
+        except (TypeError, ValueError) as exx:
+            log.warning("value of %r could not be cached: %r", key, exx)
+            return
+
+        now = time.time()
+
+        self._connection().execute(
+                'INSERT OR REPLACE INTO entries '
+                '(namespace, key, value, created, accessed) '
+                'VALUES (?, ?, ?, ?, ?)', (namespace, key, data, now, now))
+
+        with self._lock:
+            self._inserts += 1
+            evict = self._inserts % EVICT_INTERVAL == 0
+
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """
+        remove the least recently used entries, if the size bound is
+        exceeded - we remove 10% more, to not evict on every insert
+        """
+
+        conn = self._connection()
+
+        count = conn.execute('SELECT count(*) FROM entries').fetchone()[0]
+        if count <= self.max_entries:
+            return 0
+
+        excess = count - self.max_entries + self.max_entries // 10
+
+        conn.execute(
+            'DELETE FROM entries WHERE rowid IN ('
+            'SELECT rowid FROM entries ORDER BY accessed LIMIT ?)', (excess,))
+
+        log.info("evicted %d entries from the shared cache %r",
+                 excess, self.path)
+
+        return excess
+
+    def clear(self, namespace):
+        """
+        remove all entries of a namespace - for all processes
+        """
+        self._connection().execute(
+                'DELETE FROM entries WHERE namespace = ?', (namespace,))
+
+    def get_statistics(self):
+        """
+        the hit and miss counters of this process per namespace
+        """
+
+        with self._lock:
+            return {'hits': dict(self.hits), 'misses': dict(self.misses)}
+
+
+class SharedCacheNamespace(object):
+    """
+    a namespace of the shared cache with the beaker cache interface
+    """
+
+    def __init__(self, cache, name, expiretime=None):
+        self.cache = cache
+        self.name = name
+        self.expiretime = expiretime
+
+    def get_value(self, key, createfunc):
+        """
+        get the cached value or create and store it by the createfunc
+        """
+
+        found, value = self.cache.get(self.name, key, self.expiretime)
+        if found:
+            return value
+
+        value = createfunc()
+        self.cache.set(self.name, key, value)
+
+        return value
+
+    def clear(self):
+        self.cache.clear(self.name)
+
+
+_shared_caches = {}
+_shared_caches_lock = threading.Lock()
+
+
+def get_shared_cache(path, max_entries=100000):
+    """
+    get the process wide shared cache of the cache file
+
+    :param path: the file name of the sqlite cache
+    :param max_entries: the maximum number of entries
+    :raises SharedCacheError: if the cache file could not be used
+    """
+
+    with _shared_caches_lock:
+
+        cache = _shared_caches.get(path)
+        if cache is None:
+            secure_cache_file(path)
+            cache = SharedCache(path, max_entries=max_entries)
+            _shared_caches[path] = cache
+
+        cache.max_entries = max_entries
+
+    return cache
+
+# eof #
@@ -40,6 +40,12 @@ except ImportError:
 from sqlalchemy import or_, and_
 from sqlalchemy import func
 
+try:
+    # the eager loading by an IN query is available since SQLAlchemy 1.2
+    from sqlalchemy.orm import selectinload
+except ImportError:
+    from sqlalchemy.orm import subqueryload as selectinload
+
 from linotp.lib.challenges import Challenges
 
 from linotp.lib.error import TokenAdminError
@@ -53,6 +59,8 @@ from linotp.lib.util import generate_password
 
 from linotp.lib.realm import realm2Objects
 
+from linotp.lib import otp_lookahead
+
 import linotp
 import linotp.lib.policy
 
@@ -190,6 +198,9 @@ class TokenHandler(object):
             log.error('Could not create token')
             raise TokenAdminError("token create failed %r" % exx, id=1112)
 
+        if otp_lookahead.is_otp_lookahead_enabled():
+            otp_lookahead.update_token(tokenObj)
+
         log.debug("Token object %r was created", tokenObj)
         return (True, tokenObj)
 
@@ -653,9 +664,25 @@ class TokenHandler(object):
         # List of (token, pin) pairs
         matching_pairs = []
 
-        # get all tokens of the users realm, which are not assigned
+        # get all tokens of the users realm, which are not assigned - or
+        # with the otp lookahead index only the ones, which might match
+
+        tokens = None
 
-        tokens = self.getTokensOfType(typ=None, realm=user.realm, assigned="0")
+        if otp_lookahead.is_otp_lookahead_enabled():
+
+            if getFromConfig("PrependPin") == "True":
+                otps = [passw[-otplen:]
+                        for otplen in otp_lookahead.LOOKAHEAD_OTP_LENGTHS]
+            else:
+                otps = [passw[:otplen]
+                        for otplen in otp_lookahead.LOOKAHEAD_OTP_LENGTHS]
+
+            tokens = self._get_indexed_tokens(otps, realm=user.realm)
+
+        if tokens is None:
+            tokens = self.getTokensOfType(typ=None, realm=user.realm,
+                                          assigned="0")
         for token in tokens:
 
             token_exists = -1
@@ -747,6 +774,9 @@ class TokenHandler(object):
             raise TokenAdminError("Token assign failed for %s/%s : %r"
                                   % (user.login, serial, exx), id=1105)
 
+        if otp_lookahead.is_otp_lookahead_enabled():
+            otp_lookahead.update_token(token)
+
         log.debug("[assignToken] successfully assigned token with serial "
                   "%r to user %r" % (serial, user.login))
         return True
@@ -779,6 +809,9 @@ class TokenHandler(object):
             raise TokenAdminError("Token unassign failed for %r/%r: %r"
                                   % (user, serial, exx), id=1105)
 
+        if otp_lookahead.is_otp_lookahead_enabled():
+            otp_lookahead.update_token(token)
+
         log.debug("[unassignToken] successfully unassigned token with serial"
                   " %r" % serial)
         return True
@@ -832,6 +865,11 @@ class TokenHandler(object):
         validation_results = []
         log.debug("Searching appropriate token for otp %r" % otp)
 
+        if (token_list is None and "0" == unicode(assigned) and
+                otp_lookahead.is_otp_lookahead_enabled()):
+            token_list = self._get_indexed_tokens([otp], typ=typ,
+                                                  realm=realm, window=window)
+
         if token_list is None:
             token_list = self.getTokensOfType(typ, realm, assigned)
 
@@ -860,6 +898,19 @@ class TokenHandler(object):
         TODO: rename function to "getTokens"
         '''
         tokenList = []
+
+        for token in self._get_tokens_query(typ, realm, assigned):
+            # the token is the database object, but we want
+            # an instance of the tokenclass!
+            tokenList.append(createTokenClassObject(token))
+
+        log.debug("[getTokensOfType] retrieved matching tokens: %r" % tokenList)
+        return tokenList
+
+    def _get_tokens_query(self, typ=None, realm=None, assigned=None):
+        '''
+        the query for the tokens of getTokensOfType
+        '''
         sqlQuery = Session.query(Token)
         if typ is not None:
             # filter for type
@@ -883,13 +934,52 @@ class TokenHandler(object):
                         TokenRealm.realm_id == Realm.id,
                         TokenRealm.token_id == Token.LinOtpTokenId)).distinct()
 
-        for token in sqlQuery:
-            # the token is the database object, but we want
-            # an instance of the tokenclass!
-            tokenList.append(createTokenClassObject(token))
+        return sqlQuery
 
-        log.debug("[getTokensOfType] retrieved matching tokens: %r" % tokenList)
-        return tokenList
+    def _get_indexed_tokens(self, otps, typ=None, realm=None, window=None):
+        '''
+        get the unassigned tokens, which might generate one of the otp
+        values, by the otp lookahead index: the indexed tokens are only
+        returned if they are found in the index, the tokens, which are not
+        covered by the index or have no index entries yet, are all returned
+
+        :param otps: list of the otp values
+        :param typ: the token type
+        :param realm: the realm in which to search for the tokens
+        :param window: the otp window, which should be searched
+
+        :return: list of token objects or None, if the index could not be
+                 used for the search
+        '''
+
+        if (typ is not None and
+                typ.lower() not in otp_lookahead.LOOKAHEAD_TYPES):
+            return None
+
+        # the index must cover the otp window of the search
+
+        if (window is not None and
+                window > otp_lookahead.get_otp_lookahead_window()):
+            return None
+
+        serials = otp_lookahead.lookup_serials(otps)
+
+        indexed = otp_lookahead.indexed_token_condition()
+
+        # the tokens without index entries are not covered by the index,
+        # e.g. as the index has not been refreshed since the tokens import
+
+        not_covered = or_(~indexed, ~Token.LinOtpTokenSerialnumber.in_(
+                                        otp_lookahead.indexed_serials()))
+
+        condition = not_covered
+        if serials:
+            condition = or_(not_covered,
+                            Token.LinOtpTokenSerialnumber.in_(serials))
+
+        sqlQuery = self._get_tokens_query(typ, realm, "0").filter(condition)
+
+        return [createTokenClassObject(token) for token in sqlQuery]
 
     def removeToken(self, user=None, serial=None):
         """
@@ -925,6 +1015,8 @@ class TokenHandler(object):
             for chall in challenges:
                 Session.delete(chall)
 
+            otp_lookahead.remove_tokens(serials)
+
             #  due to legacy SQLAlchemy it could happen that the
             #  foreign key relation could not be deleted
             #  so we do this manualy
@@ -1098,7 +1190,8 @@ class TokenHandler(object):
             log.error("[copyTokenUser] not a unique token to copy to found")
             return -2
         uid, ures, resclass = tokens_from[0].getUser()
-        tokens_to[0].setUid(uid, ures, resclass)
+        tokens_to[0].setUid(uid, ures, resclass,
+                            login=tokens_from[0].token.LinOtpOwnerLogin)
 
         self.copyTokenRealms(serial_from, serial_to)
         return 1
@@ -1474,13 +1567,20 @@ def getTokenNumResolver(resolver=None, active=True):
                 Token.LinOtpIdResClass.like(resolver)).count()
         return sqlQuery
 
-def token_owner_iterator():
+def token_owner_iterator(unresolved=False):
     '''
         iterate all tokens for serial and users
+
+        :param unresolved: only iterate the tokens, where the owner login
+                           is not resolved yet
     '''
 
-    sqlQuery = Session.query(Token).filter(
-        model.Token.LinOtpUserid != '').all()
+    condition = model.Token.LinOtpUserid != ''
+
+    if unresolved:
+        condition = and_(condition, model.Token.LinOtpOwnerLogin == None)
+
+    sqlQuery = Session.query(Token).filter(condition).all()
 
     for token in sqlQuery:
         userInfo = {}
@@ -1499,6 +1599,22 @@ def token_owner_iterator():
         yield serial, userInfo['username']
 
 
+def has_unresolved_token_owners():
+    '''
+        check if there are assigned tokens, where the owner login is not
+        resolved yet - the owner login is filled by the token owner update
+        of the tools controller
+
+    :return: boolean
+    '''
+
+    token = Session.query(Token.LinOtpTokenId).filter(
+        and_(model.Token.LinOtpUserid != '',
+             model.Token.LinOtpOwnerLogin == None)).first()
+
+    return token is not None
+
+
 def getTokens4UserOrSerial(user=None, serial=None, token_type=None,
                            _class=True, read_for_update=False,
                            active=None):
@@ -1550,35 +1666,26 @@ def getTokens4UserOrSerial(user=None, serial=None, token_type=None,
 
         if not user.is_empty and user.login:
 
-            for user_definition in user.get_uid_resolver():
-                uid, resolverClass = user_definition
-                # in the database could be tokens of ResolverClass:
-                #    useridresolver. or useridresolveree.
-                # so we have to make sure
-                # - there is no 'useridresolveree' in the searchterm and
-                # - there is a wildcard search: second replace
-                # Remark: when the token is loaded the response to the
-                # resolver class is adjusted
-
-                uconditions = (sconditions)
-
-                resolverClass = resolverClass.replace('useridresolveree.',
-                                                      'useridresolver.')
-                resolverClass = resolverClass.replace('useridresolver.',
-                                                      'useridresolver%.')
-
-                if isinstance(uid, (int, long)):
-                    uconditions += ((model.Token.LinOtpUserid == "%d" % uid),)
-                else:
-                    uconditions += ((model.Token.LinOtpUserid == uid),)
+            # all tokens of the user are fetched in one query with the
+            # (uid, resolver class) pairs of the user
 
-                uconditions += ((model.Token.LinOtpIdResClass.like(resolverClass)),)
+            user_keys = _get_user_token_keys(user)
+
+            if user_keys:
+
+                uconditions = sconditions + (_user_token_condition(user_keys),)
 
                 condition = and_(*uconditions)
                 sqlQuery = Session.query(Token).filter(condition)
 
                 # ---------------------------------------------------------- --
 
+                # the realms of all tokens are loaded eagerly by one
+                # additional query - a joined load would multiply the wide
+                # token rows and could not be combined with the update lock
+
+                sqlQuery = sqlQuery.options(selectinload(Token.realms))
+
                 # for the validation we require an read for update lock
 
                 if read_for_update:
@@ -1586,14 +1693,8 @@ def getTokens4UserOrSerial(user=None, serial=None, token_type=None,
 
                 for token in sqlQuery:
                     # we have to check that the token is in the same realm as the user
-                    t_realms = token.getRealmNames()
-                    u_realm = user.realm
-                    if u_realm != '*':
-                        if len(t_realms) > 0 and len(u_realm) > 0:
-                            if u_realm.lower() not in t_realms:
-                                log.debug("user realm and token realm missmatch %r::%r"
-                                      % (u_realm, t_realms))
-                                continue
+                    if not _token_in_user_realm(token, user):
+                        continue
 
                     log.debug("[getTokens4UserOrSerial] user serial (user): %r"
                               % token.LinOtpTokenSerialnumber)
@@ -1607,6 +1708,125 @@ def getTokens4UserOrSerial(user=None, serial=None, token_type=None,
         log.debug('Retrieved token list %r' % tokenList)
         return tokenList
 
+
+def _get_user_token_keys(user):
+    '''
+    get the (uid, resolver class) pairs of the user, which are preserved in
+    the tokens of the user. The legacy resolver class prefix
+    'useridresolveree.' has been normalized in the database by the data
+    model migration, so the resolver class can be compared exactly
+
+    :param user: the user object
+    :return: set of (uid, resolver class) tuples
+    '''
+
+    user_keys = set()
+
+    for uid, resolverClass in user.get_uid_resolver():
+
+        resolverClass = resolverClass.replace('useridresolveree.',
+                                              'useridresolver.')
+
+        if isinstance(uid, (int, long)):
+            uid = "%d" % uid
+
+        user_keys.add((uid, resolverClass))
+
+    return user_keys
+
+
+def _user_token_condition(user_keys):
+    '''
+    :param user_keys: set of (uid, resolver class) tuples
+    :return: sql condition for the tokens of the user keys
+    '''
+
+    return or_(*[and_(model.Token.LinOtpUserid == uid,
+                      model.Token.LinOtpIdResClass == resolverClass)
+                 for uid, resolverClass in user_keys])
+
+
+def _token_in_user_realm(token, user):
+    '''
+    check that the token is in the same realm as the user
+
+    :param token: the token db object
+    :param user: the user object
+    :return: boolean
+    '''
+
+    t_realms = token.getRealmNames()
+    u_realm = user.realm
+    if u_realm != '*':
+        if len(t_realms) > 0 and len(u_realm) > 0:
+            if u_realm.lower() not in t_realms:
+                log.debug("user realm and token realm missmatch %r::%r"
+                          % (u_realm, t_realms))
+                return False
+
+    return True
+
+
+def get_token_ids_of_batch(users, serials):
+    '''
+    get the ids of the tokens of many users and serials, e.g. of the items
+    of validate/check_batch, with one query. The tokens are not locked, as
+    every item of a batch is committed on its own - they are locked by
+    lock_tokens when they are verified.
+
+    :param users: list of user objects
+    :param serials: list of token serial numbers
+    :return: tuple of the list of the token id lists of the users and of
+             the dict of the token id lists of the serials
+    '''
+
+    user_keys = [_get_user_token_keys(user) for user in users]
+
+    conditions = [_user_token_condition(keys) for keys in user_keys if keys]
+
+    db_serials = set(linotp.lib.crypto.uencode(serial) for serial in serials)
+    if db_serials:
+        conditions.append(Token.LinOtpTokenSerialnumber.in_(db_serials))
+
+    tokens = []
+    if conditions:
+        tokens = Session.query(Token).filter(or_(*conditions)).options(
+                                    selectinload(Token.realms)).all()
+
+    user_token_ids = []
+    for user, keys in zip(users, user_keys):
+        user_token_ids.append([
+            token.LinOtpTokenId for token in tokens
+            if (token.LinOtpUserid, token.LinOtpIdResClass) in keys and
+            _token_in_user_realm(token, user)])
+
+    serial_token_ids = {}
+    for serial in serials:
+        db_serial = linotp.lib.crypto.uencode(serial)
+        serial_token_ids[serial] = [
+            token.LinOtpTokenId for token in tokens
+            if token.LinOtpTokenSerialnumber == db_serial]
+
+    return user_token_ids, serial_token_ids
+
+
+def lock_tokens(token_ids):
+    '''
+    read the tokens with an read for update lock for the validation
+
+    :param token_ids: list of token ids
+    :return: list of token class objects
+    '''
+
+    if not token_ids:
+        return []
+
+    tokens = Session.query(Token).filter(
+        Token.LinOtpTokenId.in_(token_ids)).populate_existing().options(
+            selectinload(Token.realms)).with_lockmode('update').all()
+
+    return [createTokenClassObject(token) for token in tokens]
+
 def setDefaults(token):
     #  set the defaults
     token.LinOtpOtpLen = int(getFromConfig("DefaultOtpLen", 6))
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+
+"""
+bulk token administration -
+  enable, disable, remove, unassign, reset or set the realms of many tokens
+  with one request.
+
+  the admin policies are evaluated once for all tokens, the realms of the
+  tokens are read together with the tokens and the changes are committed in
+  chunks, so that a bulk operation does not hold one large transaction.
+"""
+
+import logging
+
+from sqlalchemy import orm
+
+from linotp.lib import otp_lookahead
+from linotp.lib.crypto import uencode
+from linotp.lib.error import ParameterError
+from linotp.lib.policy import PolicyException
+from linotp.lib.policy import checkAdminAuthorization
+from linotp.lib.policy import checkAdminTokenRealms
+from linotp.lib.policy import getAdminPolicies
+from linotp.lib.policy import getPolicy
+from linotp.lib.policy import getPolicyActionValue
+from linotp.lib.realm import realm2Objects
+from linotp.lib.tokeniterator import TokenIterator
+from linotp.lib.user import User
+
+from linotp.model import Challenge
+from linotp.model import Token
+from linotp.model import TokenRealm
+
+import linotp.model.meta
+Session = linotp.model.meta.Session
+
+log = logging.getLogger(__name__)
+
+# the bulk operations and the admin policy actions, which are required
+
+BULK_OPERATIONS = {
+    'enable': 'enable',
+    'disable': 'disable',
+    'remove': 'remove',
+    'unassign': 'unassign',
+    'reset': 'reset',
+    'tokenrealm': 'manageToken',
+}
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def get_filtered_serials(token_filter, realms):
+    """
+    get the serials of the tokens, which match the filter expression of the
+    admin/show token search
+
+    :param token_filter: the filter expression of the TokenIterator
+    :param realms: the realms, the tokens are searched in
+    :return: list of the token serial numbers
+    """
+
+    tokens = TokenIterator(User('', '', ''), None, filter=token_filter,
+                           filterRealm=realms)
+
+    # only the serials are required - not the complete, sorted tokens
+
+    query = tokens.toks.order_by(None).with_entities(
+                                            Token.LinOtpTokenSerialnumber)
+
+    return [row.LinOtpTokenSerialnumber for row in query]
+
+
+def _check_target_realms(policies, realms):
+    """
+    check that the admin may manage the new token realms
+    """
+
+    for realm in realms:
+
+        if (policies['active'] and not
+                checkAdminAuthorization(policies, None,
+                                        User("dummy", realm, None))):
+
+            raise PolicyException("You do not have the administrative "
+                                  "right to add tokens to realm %s. "
+                                  "Check the policies." % realm)
+
+
+class _RealmTokenCount(object):
+    """
+    the number of active tokens per realm, which is limited by the
+    enrollment policy 'tokencount' - the tokens, which the realms gain by
+    the bulk operation, are counted, so that the limit holds for all tokens
+    of the operation and not only for the first one
+    """
+
+    def __init__(self):
+        self.limits = {}
+        self.token_counts = {}
+
+    def _get_limit(self, realm):
+
+        if realm not in self.limits:
+
+            # import here to prevent a cyclic import with the token classes
+
+            from linotp.lib.token import getTokenInRealm
+
+            pol = getPolicy({'scope': 'enrollment', 'realm': realm,
+                             'action': 'tokencount'})
+
+            limit = getPolicyActionValue(pol, 'tokencount')
+
+            self.limits[realm] = None
+            if limit > -1:
+                self.limits[realm] = int(limit)
+                self.token_counts[realm] = getTokenInRealm(realm)
+
+        return self.limits[realm]
+
+    def add_token(self, realms):
+        """
+        count one more active token in the realms, if none of the realms
+        exceeds its token count limit
+
+        :param realms: the realm names, which gain the token
+        :return: boolean - if the token was counted
+        """
+
+        for realm in realms:
+            limit = self._get_limit(realm)
+            if limit is not None and self.token_counts[realm] >= limit:
+                return False
+
+        for realm in realms:
+            if self.limits[realm] is not None:
+                self.token_counts[realm] += 1
+
+        return True
+
+
+def _remove_tokens(db_tokens):
+    """
+    remove the tokens of a chunk together with their challenges, realm
+    relations and otp lookahead entries
+    """
+
+    serials = [db_token.LinOtpTokenSerialnumber for db_token in db_tokens]
+    token_ids = [db_token.LinOtpTokenId for db_token in db_tokens]
+
+    Session.query(Challenge).filter(
+        Challenge.tokenserial.in_(serials)).delete(synchronize_session=False)
+
+    otp_lookahead.remove_tokens(serials)
+
+    # the realm relations and the tokens are deleted by one statement each
+    # instead of one statement per token of the orm relation
+
+    for db_token in db_tokens:
+        Session.expunge(db_token)
+
+    Session.query(TokenRealm).filter(
+        TokenRealm.token_id.in_(token_ids)).delete(synchronize_session=False)
+
+    Session.query(Token).filter(
+        Token.LinOtpTokenId.in_(token_ids)).delete(synchronize_session=False)
+
+
+def _apply_operation(operation, db_tokens, realm_objects):
+    """
+    apply the operation on the tokens of a chunk
+    """
+
+    # import here to prevent a cyclic import with the token classes
+
+    from linotp.lib.token import createTokenClassObject
+
+    if operation == 'remove':
+        _remove_tokens(db_tokens)
+        return
+
+    no_user = User('', '', '')
+
+    for db_token in db_tokens:
+
+        token = createTokenClassObject(db_token)
+
+        if operation == 'enable':
+            token.enable(True)
+
+        elif operation == 'disable':
+            token.enable(False)
+
+        elif operation == 'reset':
+            token.reset()
+
+        elif operation == 'unassign':
+            token.setUser(no_user, True)
+            token.setFailCount(0)
+
+            if otp_lookahead.is_otp_lookahead_enabled():
+                otp_lookahead.update_token(token)
+
+        elif operation == 'tokenrealm':
+            token.setRealms(realm_objects)
+
+
+def bulk_token_operation(operation, serials, realms=None,
+                         chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    run an admin operation on many tokens
+
+    the tokens, which the admin is not allowed to manage, are skipped and
+    reported in the result, as well as the unknown serials.
+
+    :param operation: one of the BULK_OPERATIONS
+    :param serials: list of token serial numbers
+    :param realms: list of the new token realms for the tokenrealm operation
+    :param chunk_size: number of tokens, which are changed per transaction
+    :return: dict with the number of changed tokens, the denied and unknown
+             serials and the source realms of the changed tokens - the
+             tokens, which would exceed the token count of a realm, are
+             denied as well
+    """
+
+    if operation not in BULK_OPERATIONS:
+        raise ParameterError("Unsupported bulk operation: %r" % operation)
+
+    if operation == 'tokenrealm' and realms is None:
+        raise ParameterError("Missing parameter: %r" % 'realms')
+
+    # evaluate the admin policies once for all tokens
+
+    policies = getAdminPolicies(BULK_OPERATIONS[operation])
+
+    realm_objects = None
+    target_realms = []
+
+    if operation == 'tokenrealm':
+        _check_target_realms(policies, realms)
+        realm_objects = realm2Objects(realms)
+        target_realms = [realm.name for realm in realm_objects]
+
+    token_count = _RealmTokenCount()
+
+    serials = list(set(uencode(serial) for serial in serials if serial))
+
+    processed = 0
+    denied = []
+    exceeded = []
+    source_realms = set()
+    found = set()
+
+    for start in range(0, len(serials), chunk_size):
+
+        chunk = serials[start:start + chunk_size]
+
+        # read the tokens of the chunk with their realms at once
+
+        db_tokens = Session.query(Token).filter(
+            Token.LinOtpTokenSerialnumber.in_(chunk)).options(
+                orm.subqueryload(Token.realms)).all()
+
+        allowed_tokens = []
+
+        for db_token in db_tokens:
+
+            serial = db_token.LinOtpTokenSerialnumber
+            found.add(serial)
+
+            token_realms = db_token.getRealmNames()
+
+            # the realms of the token are replaced by the tokenrealm
+            # operation, so the admin must manage all of them
+
+            if not checkAdminTokenRealms(
+                        policies, token_realms,
+                        fitAllRealms=(operation == 'tokenrealm')):
+                denied.append(serial)
+                continue
+
+            # the realms count the active tokens, which are enabled or
+            # moved into them
+
+            gained_realms = []
+
+            if operation == 'enable' and not db_token.LinOtpIsactive:
+                gained_realms = token_realms
+
+            elif operation == 'tokenrealm' and db_token.LinOtpIsactive:
+                gained_realms = [realm for realm in target_realms
+                                 if realm not in token_realms]
+
+            if gained_realms and not token_count.add_token(gained_realms):
+                exceeded.append(serial)
+                continue
+
+            source_realms.update(token_realms)
+            allowed_tokens.append(db_token)
+
+        _apply_operation(operation, allowed_tokens, realm_objects)
+
+        Session.commit()
+
+        processed += len(allowed_tokens)
+
+        log.info("bulk %s: changed %d tokens in chunk %d", operation,
+                 len(allowed_tokens), start // chunk_size + 1)
+
+    if denied:
+        log.warning("the admin >%s< is not allowed to %s the tokens %r",
+                    policies['admin'], operation, denied)
+
+    if exceeded:
+        log.warning("the tokens %r exceed the policy 'tokencount' of their "
+                    "realms and are not changed by %s", exceeded, operation)
+
+    return {'processed': processed,
+            'denied': sorted(denied + exceeded),
+            'not_found': sorted(set(serials) - found),
+            'realms': sorted(source_realms)}
@@ -43,6 +43,7 @@ from linotp.lib.error import UserError
 
 from linotp.lib.token import (getTokenRealms,
                               getTokens4UserOrSerial,
+                              has_unresolved_token_owners,
                               token_owner_iterator
                               )
 from linotp.lib.user import getUserId, getUserInfo
@@ -118,6 +119,20 @@ def _user_expression_match(login_user, token_owner_iterator):
     return serials
 
 
+def _owner_login_pattern(login_user):
+    """
+    :param login_user: the user search expression with '*' wildcards
+    :return: the sql like pattern for the owner login
+    """
+
+    pattern = linotp.lib.crypto.uencode(login_user)
+
+    pattern = pattern.replace('\\', '\\\\')
+    pattern = pattern.replace('%', '\\%').replace('_', '\\_')
+
+    return pattern.replace('*', '%')
+
+
 class TokenIterator(object):
     '''
     TokenIterator class - support a smooth iterating through the tokens
@@ -177,7 +192,7 @@ class TokenIterator(object):
         elif loginUser == "/:no user:/" or loginUser == "/:none:/":
             searchType = "blank"
         elif loginUser == "/:no user info:/":
-            searchType = "wildcard"
+            searchType = "no user info"
         elif "*" in loginUser:
             searchType = "wildcard"
         else:
@@ -188,86 +203,150 @@ class TokenIterator(object):
             ucondition = and_(or_(Token.LinOtpUserid == u'',
                                   Token.LinOtpUserid is None))
 
+        # the tokens are searched by the owner login, which is preserved
+        # in the token. Only if there are assigned tokens, where the owner
+        # login is not resolved yet, the former lookup of the token owners
+        # in the resolvers is used in addition
+
+        unresolved = False
+        if searchType in ["exact", "wildcard"]:
+            unresolved = has_unresolved_token_owners()
+
         if searchType == "exact":
-            serials = []
-            users = []
 
             # if search for a realmuser 'user@realm' we can take the
-            # realm from the argument
-            if len(user.realm) > 0:
-                users.append(user)
+            # realm from the argument, otherwise all valid realms are
+            # searched
+
+            search_realms = valid_realms
+            if user.realm and user.realm != '*':
+                search_realms = [user.realm.lower()]
+
+            resolvers = self._convert_realms_to_resolvers(search_realms)
+
+            if resolvers:
+                ucondition = and_(
+                    Token.LinOtpOwnerLogin ==
+                    linotp.lib.crypto.uencode(loginUser),
+                    Token.LinOtpIdResClass.in_(resolvers))
             else:
-                # otherwise we add all users which are possible combinations
-                # from loginname and entry of the valid realms.
-                # In case of a '*' wildcard in the list, we take all available
-                # realms
-                if '*' in valid_realms:
-                    valid_realm_list = getRealms().keys()
-                else:
-                    valid_realm_list = valid_realms
-
-                for realm in valid_realm_list:
-                    users.append(User(user.login, realm))
-
-            # resolve the realm with wildcard:
-            # identify all users and add these to the userlist
-            userlist = []
-            for usr in users:
-                urealm = usr.realm
-                if urealm == '*':
-                    # if the realm is set to *, the getUserId
-                    # triggers the identification of all resolvers, where the
-                    # user might reside: trigger the user resolver lookup
-                    for realm in getRealms().keys():
-                        if realm in valid_realms or '*' in valid_realms:
-                            usr.realm = realm
-                            try:
-                                (_uid, _resolver, _resolverClass) = getUserId(usr)
-                            except UserError as exx:
-                                log.info('User %r not found in realm %r',
-                                         usr, realm)
-                                continue
-                            userlist.extend(usr.getUserPerConf())
-                else:
-                    userlist.append(usr)
-
-            for usr in userlist:
-                try:
-                    tokens = getTokens4UserOrSerial(user=usr, _class=False)
-                    for tok in tokens:
-                        serials.append(tok.LinOtpTokenSerialnumber)
-                except UserError as ex:
-                    ## we get an exception if the user is not found
-                    log.debug('[TokenIterator::init] no exact user: %r'
-                              % (user))
-                    log.debug('[TokenIterator::init] %r' % ex)
-
-            if len(serials) > 0:
-                # if tokens found, search for their serials
+                ucondition = and_(Token.LinOtpTokenSerialnumber == u'')
+
+            if unresolved:
+                serials = self._get_user_serials(user, valid_realms)
+                if serials:
+                    ucondition = or_(
+                        ucondition,
+                        Token.LinOtpTokenSerialnumber.in_(serials))
+
+        # the owner login of a token is preserved, even if the owner has
+        # been deleted in the resolver after the assignment - so the tokens
+        # without user info are searched by the lookup of all token owners
+        # in the resolvers, which does not depend on the refresh of the
+        # owner logins by tools/update_token_owner
+
+        if searchType == "no user info":
+
+            serials = _user_expression_match(loginUser,
+                                             token_owner_iterator())
+
+            if serials:
                 ucondition = and_(Token.LinOtpTokenSerialnumber.in_(serials))
             else:
-                # if no token is found, block search for user
-                # and return nothing
                 ucondition = and_(Token.LinOtpTokenSerialnumber == u'')
 
         ## handle case, when nothing found in former cases
         if searchType == "wildcard":
 
-            serials = _user_expression_match(loginUser, token_owner_iterator())
+            ucondition = and_(Token.LinOtpUserid != u'',
+                              Token.LinOtpOwnerLogin.like(
+                                    _owner_login_pattern(loginUser),
+                                    escape='\\'))
 
-            # to prevent warning, we check is serials are found
-            # SAWarning: The IN-predicate on
-            # "Token.LinOtpTokenSerialnumber" was invoked with an
-            # empty sequence. This results in a contradiction, which
-            # nonetheless can be expensive to evaluate.  Consider
-            # alternative strategies for improved performance.
+            if unresolved:
+                serials = _user_expression_match(
+                                loginUser,
+                                token_owner_iterator(unresolved=True))
+
+                # to prevent warning, we check is serials are found
+                # SAWarning: The IN-predicate on
+                # "Token.LinOtpTokenSerialnumber" was invoked with an
+                # empty sequence. This results in a contradiction, which
+                # nonetheless can be expensive to evaluate.  Consider
+                # alternative strategies for improved performance.
+
+                if serials:
+                    ucondition = or_(
+                        ucondition,
+                        Token.LinOtpTokenSerialnumber.in_(serials))
 
-            if len(serials) > 0:
-                ucondition = and_(Token.LinOtpTokenSerialnumber.in_(serials))
-            else:
-                ucondition = and_(Token.LinOtpTokenSerialnumber == u'')
         return ucondition
 
+    def _get_user_serials(self, user, valid_realms):
+        """
+        get the serials of the tokens of the user by the lookup of the user
+        in the resolvers of the realms
+
+        :param user: the searched user
+        :param valid_realms: the realms of the search
+        :return: list of token serials
+        """
+
+        serials = []
+        users = []
+
+        # if search for a realmuser 'user@realm' we can take the
+        # realm from the argument
+        if len(user.realm) > 0:
+            users.append(user)
+        else:
+            # otherwise we add all users which are possible combinations
+            # from loginname and entry of the valid realms.
+            # In case of a '*' wildcard in the list, we take all available
+            # realms
+            if '*' in valid_realms:
+                valid_realm_list = getRealms().keys()
+            else:
+                valid_realm_list = valid_realms
+
+            for realm in valid_realm_list:
+                users.append(User(user.login, realm))
+
+        # resolve the realm with wildcard:
+        # identify all users and add these to the userlist
+        userlist = []
+        for usr in users:
+            urealm = usr.realm
+            if urealm == '*':
+                # if the realm is set to *, the getUserId
+                # triggers the identification of all resolvers, where the
+                # user might reside: trigger the user resolver lookup
+                for realm in getRealms().keys():
+                    if realm in valid_realms or '*' in valid_realms:
+                        usr.realm = realm
+                        try:
+                            (_uid, _resolver, _resolverClass) = getUserId(usr)
+                        except UserError as exx:
+                            log.info('User %r not found in realm %r',
+                                     usr, realm)
+                            continue
+                        userlist.extend(usr.getUserPerConf())
+            else:
+                userlist.append(usr)
+
+        for usr in userlist:
+            try:
+                tokens = getTokens4UserOrSerial(user=usr, _class=False)
+                for tok in tokens:
+                    serials.append(tok.LinOtpTokenSerialnumber)
+            except UserError as ex:
+                ## we get an exception if the user is not found
+                log.debug('[TokenIterator::init] no exact user: %r'
+                          % (user))
+                log.debug('[TokenIterator::init] %r' % ex)
+
+        return serials
+
     def _get_filter_confition(self, filter):
         conditon = None
 
@@ -113,6 +113,7 @@ class MigrateResolverHandler(ToolsHandler):
 
                 token.LinOtpIdResClass = target_resolver
                 token.LinOtpUserid = uid
+                token.LinOtpOwnerLogin = login.lower()
                 # TODO: adjust
                 token.LinOtpIdResolver = target['type']
                 Session.add(token)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+
+"""
+token owner update -
+  fill the owner login of the assigned tokens, which is used for the
+  token search by user
+"""
+
+from linotp.lib.tools import ToolsHandler
+from linotp.lib.user import getUserInfo
+
+import linotp.model as model
+
+import linotp.model.meta
+Session = linotp.model.meta.Session
+
+from sqlalchemy import and_
+
+import logging
+log = logging.getLogger(__name__)
+
+# the owner login of tokens, where the owner could not be resolved
+NO_USER_INFO = u'/:no user info:/'
+
+
+class UpdateTokenOwnerHandler(ToolsHandler):
+
+    def update_token_owners(self, refresh=False, batch_size=1000):
+        """
+        lookup the login of the token owners in the resolvers and preserve
+        it in the token
+
+        the tokens are processed in batches, where each batch is committed,
+        so that an interrupted update could be continued
+
+        :param refresh: if True, the owner login of all assigned tokens is
+                        updated, otherwise only of the not resolved ones
+        :param batch_size: the number of tokens per batch
+        :return: dict with the number of updated and of unknown owners
+        """
+
+        condition = model.Token.LinOtpUserid != u''
+
+        if not refresh:
+            condition = and_(condition,
+                             model.Token.LinOtpOwnerLogin == None)
+
+        updated = 0
+        unknown = 0
+        last_id = 0
+
+        while True:
+
+            tokens = Session.query(model.Token).filter(
+                and_(condition, model.Token.LinOtpTokenId > last_id)).\
+                order_by(model.Token.LinOtpTokenId).\
+                limit(batch_size).all()
+
+            if not tokens:
+                break
+
+            for token in tokens:
+
+                last_id = token.LinOtpTokenId
+
+                user_info = getUserInfo(token.LinOtpUserid,
+                                        token.LinOtpIdResolver,
+                                        token.LinOtpIdResClass)
+
+                login = user_info.get('username')
+
+                if not login:
+                    log.warning("Owner of token %r could not be resolved",
+                                token.LinOtpTokenSerialnumber)
+                    login = NO_USER_INFO
+                    unknown += 1
+
+                token.LinOtpOwnerLogin = login.lower()
+                updated += 1
+
+            Session.commit()
+
+        return {'updated': updated, 'unknown': unknown}
+
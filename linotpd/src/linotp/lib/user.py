@@ -26,6 +26,7 @@
 """ contains user - related functions """
 
 import logging
+import os
 import re
 import json
 from base64 import b64decode
@@ -33,6 +34,9 @@ from base64 import b64decode
 from linotp.lib.error import UserError
 
 from linotp.lib.context import request_context
+from linotp.lib.negative_cache import get_negative_cache
+from linotp.lib.shared_cache import SharedCacheError
+from linotp.lib.shared_cache import get_shared_cache
 
 from linotp.lib.config import getFromConfig, storeConfig
 from linotp.lib.config import getLinotpConfig
@@ -56,6 +60,8 @@ from linotp.lib.util import get_request_param
 
 from functools import partial
 
+from pylons import config as env
+
 from linotp.lib._compat import str_
 
 ENCODING = 'utf-8'
@@ -881,29 +887,114 @@ def get_resolvers_of_user(login, realm):
 
         return Resolvers
 
+    negative_cache = _get_negative_cache()
+    negative_namespace = 'resolvers_lookup::%s' % realm
+
+    if negative_cache and negative_cache.contains(negative_namespace, login):
+        log.info("negative cache hit %r@%r", login, realm)
+        return []
+
     resolvers_lookup_cache = _get_resolver_lookup_cache(realm)
 
     # if no caching is enabled, we just return the result of the inner func
     if not resolvers_lookup_cache:
-        return _get_resolvers_of_user(login=login, realm=realm)
+        Resolvers = _get_resolvers_of_user(login=login, realm=realm)
+
+        if negative_cache and login and not Resolvers:
+            negative_cache.add(negative_namespace, login)
+
+        return Resolvers
 
     p_get_resolvers_of_user = partial(_get_resolvers_of_user,
                                       login=login, realm=realm)
 
+    # with the negative cache, the unknown users are not kept in the
+    # lookup cache but in the negative cache with its short expiration
+    if negative_cache:
+        p_get_resolvers_of_user = partial(_positive_only,
+                                          p_get_resolvers_of_user, bool)
+
     key = {'login': login, 'realm': realm}
     p_key = json.dumps(key)
 
     resolvers_lookup_cache = _get_resolver_lookup_cache(realm)
 
-    Resolvers = resolvers_lookup_cache.get_value(key=p_key,
+    try:
+        Resolvers = resolvers_lookup_cache.get_value(key=p_key,
                                   createfunc=p_get_resolvers_of_user,
                                   )
+    except _UserNotFound as exx:
+        Resolvers = exx.result
+
+        if login:
+            negative_cache.add(negative_namespace, login)
 
     log.info("cache hit %r", p_key)
     log.debug("Found the user %r in %r", login, Resolvers)
     return Resolvers
 
 
+class _UserNotFound(Exception):
+    """
+    helper - raised by the cache createfunc to not store the 'not found'
+    result in the lookup cache
+    """
+
+    def __init__(self, result):
+        Exception.__init__(self, 'user not found')
+        self.result = result
+
+
+def _positive_only(createfunc, is_found):
+    """
+    helper - call the cache createfunc and raise _UserNotFound, if the
+    user was not found
+
+    :param createfunc: the cache createfunc
+    :param is_found: function, which verifies the result
+    """
+
+    result = createfunc()
+    if not is_found(result):
+        raise _UserNotFound(result)
+
+    return result
+
+
+def _user_found(result):
+    """
+    helper - verify the result of the user lookup in a resolver
+    """
+    return bool(result and result[0] and result[1])
+
+
+def _get_negative_cache():
+    """
+    helper - common getter to access the negative cache of the user lookups
+
+    :return: the negative cache or None, if not enabled
+    """
+    config = request_context.get('Config') or {}
+
+    enabled = config.get('linotp.negative_user_cache.enabled',
+                         'False') == 'True'
+    if not enabled:
+        return None
+
+    try:
+        expiration = get_duration(config.get(
+                            'linotp.negative_user_cache.expiration', 60))
+        max_entries = int(config.get(
+                            'linotp.negative_user_cache.size', 10000))
+
+    except ValueError:
+        log.info("negative user caching is disabled due to a value error in "
+                 "the negative_user_cache config")
+        return None
+
+    return get_negative_cache(max_entries, expiration)
+
+
 def _get_resolver_lookup_cache(realm):
     """
     helper - common getter to access the resolver_lookup cache
@@ -928,14 +1019,67 @@ def _get_resolver_lookup_cache(realm):
                  "resolver_lookup_cache.expiration config")
         return None
 
-    cache_manager = request_context['CacheManager']
     cache_name = 'resolvers_lookup::%s' % realm
-    resolvers_lookup_cache = cache_manager.get_cache(cache_name,
-                                                     type="memory",
-                                                     expiretime=expiration)
+    backend = config.get('linotp.resolver_lookup_cache.backend', 'memory')
+
+    resolvers_lookup_cache = _get_lookup_cache(cache_name, backend,
+                                               expiration)
     return resolvers_lookup_cache
 
 
+def _get_lookup_cache(cache_name, backend, expiration):
+    """
+    helper - get the lookup cache from the configured cache backend
+
+    :param cache_name: the name of the cache
+    :param backend: 'memory' for the beaker cache of the process or
+                    'shared' for the cache file shared by all processes
+    :param expiration: the expiration of the cache entries in seconds
+    :return: cache with the beaker cache interface
+    """
+
+    if backend == 'shared':
+        shared_cache = _get_shared_cache()
+        if shared_cache is not None:
+            return shared_cache.namespace(cache_name, expiretime=expiration)
+
+    cache_manager = request_context['CacheManager']
+    return cache_manager.get_cache(cache_name, type="memory",
+                                   expiretime=expiration)
+
+
+def _get_shared_cache():
+    """
+    helper - get the shared lookup cache, which is by default located in
+    the cache_dir of the linotp.ini
+
+    :return: the shared cache or None, if there is no usable cache file
+    """
+
+    config = request_context['Config']
+
+    max_entries = int(config.get('linotp.shared_cache.max_entries', 100000))
+
+    cache_file = config.get('linotp.shared_cache.file')
+    if not cache_file:
+        cache_dir = env.get('app_conf', {}).get('cache_dir')
+
+        if not cache_dir:
+            log.warning("no cache_dir defined - using the memory lookup "
+                        "cache instead of the shared cache")
+            return None
+
+        cache_file = os.path.join(cache_dir, 'lookup_cache.sqlite')
+
+    try:
+        return get_shared_cache(cache_file, max_entries=max_entries)
+
+    except (SharedCacheError, OSError) as exx:
+        log.error("the shared cache %r could not be used - using the "
+                  "memory lookup cache instead: %r", cache_file, exx)
+        return None
+
+
 def delete_realm_resolver_cache(realmname):
     """
     in case of a resolver change / delete, we have to dump the cache
@@ -945,6 +1089,11 @@ def delete_realm_resolver_cache(realmname):
     if resolvers_lookup_cache:
         resolvers_lookup_cache.clear()
 
+    negative_cache = _get_negative_cache()
+
+    if negative_cache:
+        negative_cache.clear('resolvers_lookup::%s' % realmname)
+
 
 def lookup_user_in_resolver(login, user_id, resolver_spec, user_info=None):
     """
@@ -1012,6 +1161,18 @@ def lookup_user_in_resolver(login, user_id, resolver_spec, user_info=None):
         result = request_context['UserLookup'][p_key]
         return result
 
+    negative_cache = _get_negative_cache()
+    negative_namespace = 'user_lookup::%s' % resolver_spec
+
+    if negative_cache:
+        if user_info:
+            # the user exists, as we got the user info
+            negative_cache.remove(negative_namespace, p_key)
+
+        elif negative_cache.contains(negative_namespace, p_key):
+            log.info("negative cache hit %r", p_key)
+            return None, None, None
+
     user_lookup_cache = _get_user_lookup_cache(resolver_spec)
     if not user_lookup_cache:
             result = _lookup_user_in_resolver(login, user_id,
@@ -1023,8 +1184,21 @@ def lookup_user_in_resolver(login, user_id, resolver_spec, user_info=None):
                                             login, user_id, resolver_spec,
                                             user_info)
 
-        result = user_lookup_cache.get_value(key=p_key,
+        # with the negative cache, the unknown users are not kept in the
+        # lookup cache but in the negative cache with its short expiration
+        if negative_cache:
+            p_lookup_user_in_resolver = partial(_positive_only,
+                                                p_lookup_user_in_resolver,
+                                                _user_found)
+
+        try:
+            result = user_lookup_cache.get_value(key=p_key,
                                         createfunc=p_lookup_user_in_resolver)
+        except _UserNotFound as exx:
+            result = exx.result
+
+    if negative_cache and not _user_found(result) and (login or user_id):
+        negative_cache.add(negative_namespace, p_key)
 
     request_context['UserLookup'][p_key] = result
 
@@ -1077,11 +1251,10 @@ def _get_user_lookup_cache(resolver_spec):
         log.info("user caching is disabled due to a value error in user_lookup_cache.expiration config")
         return None
 
-    cache_manager = request_context['CacheManager']
     cache_name = 'user_lookup::%s' % resolver_spec
-    user_lookup_cache = cache_manager.get_cache(cache_name,
-                                                type="memory",
-                                                expiretime=expiration)
+    backend = config.get('linotp.user_lookup_cache.backend', 'memory')
+
+    user_lookup_cache = _get_lookup_cache(cache_name, backend, expiration)
 
     return user_lookup_cache
 
@@ -1095,6 +1268,11 @@ def delete_resolver_user_cache(resolver_spec):
     if user_lookup_cache:
         user_lookup_cache.clear()
 
+    negative_cache = _get_negative_cache()
+
+    if negative_cache:
+        negative_cache.clear('user_lookup::%s' % resolver_spec)
+
 
 def getUserId(user, check_existance=False):
     """
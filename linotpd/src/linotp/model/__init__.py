@@ -60,6 +60,8 @@ import sqlalchemy as sa
 from sqlalchemy import orm
 from sqlalchemy import ForeignKey
 from sqlalchemy.orm import relation
+from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy.exc import InvalidRequestError
 
 import linotp
 
@@ -135,6 +137,10 @@ token_table = sa.Table('Token', meta.metadata,
                            'LinOtpIdResClass', sa.types.Unicode(120), default=u''),
                        sa.Column(
                            'LinOtpUserid', sa.types.Unicode(320), default=u'', index=True),
+                       # # the lower case login of the token owner for the
+                       # # user search - None if not resolved yet
+                       sa.Column(
+                           'LinOtpOwnerLogin', sa.types.Unicode(320), default=None, index=True),
 
 
                        sa.Column(
@@ -166,7 +172,7 @@ token_table = sa.Table('Token', meta.metadata,
 
 TOKEN_ENCODE = ["LinOtpTokenDesc", "LinOtpTokenSerialnumber",
                 "LinOtpTokenInfo", "LinOtpUserid", "LinOtpIdResClass",
-                "LinOtpIdResolver"]
+                "LinOtpIdResolver", "LinOtpOwnerLogin"]
 
 
 class Token(object):
@@ -190,6 +196,7 @@ class Token(object):
         self.LinOtpIdResolver = None
         self.LinOtpIdResClass = None
         self.LinOtpUserid = None
+        self.LinOtpOwnerLogin = None
 
         # will be assigned automaticaly
         # self.LinOtpTokenId      = 0
@@ -208,6 +215,13 @@ class Token(object):
             # # encode data
             if value:
                 value = linotp.lib.crypto.uencode(value)
+
+            # a directly set token info replaces the parsed token info
+            if name == 'LinOtpTokenInfo':
+                self.__dict__.pop('_info_raw', None)
+                self.__dict__.pop('_info_dict', None)
+                self.__dict__.pop('_info_modified', None)
+
         super(Token, self).__setattr__(name, value)
 
     def __getattribute__(self, name):
@@ -219,6 +233,10 @@ class Token(object):
 
         :return: the corresponding value
         """
+        # the modified parsed token info is serialized before it is read
+        if name == 'LinOtpTokenInfo':
+            object.__getattribute__(self, '_store_info')()
+
         # Default behaviour
         value = object.__getattribute__(self, name)
         if name in TOKEN_ENCODE:
@@ -437,6 +455,9 @@ class Token(object):
         :return: token state as string representation
         :rtype:  string
         '''
+        # serialize the token info first, as this updates the token entries
+        self._store_info()
+
         ldict = {}
         for attr in self.__dict__:
             key = "%r" % attr
@@ -463,6 +484,77 @@ class Token(object):
     def setInfo(self, info):
         self.LinOtpTokenInfo = info
 
+    def getInfoDict(self):
+        """
+        get the parsed token info
+
+        the token info is only parsed again, if the stored token info has
+        been changed - the returned dict is shared, so changes must be
+        announced by setInfoDict()
+
+        :return: dict with the token info
+        """
+
+        raw_info = object.__getattribute__(self, 'LinOtpTokenInfo')
+
+        info = self.__dict__.get('_info_dict')
+        if info is not None and self.__dict__.get('_info_raw') == raw_info:
+            return info
+
+        info = {}
+
+        tokeninfo = self.getInfo()
+        if tokeninfo is not None and len(tokeninfo.strip()) > 0:
+            try:
+                info = json.loads(tokeninfo)
+            except Exception as exx:
+                log.exception('JSON loading error in token info: %r' % exx)
+
+        self.__dict__['_info_raw'] = raw_info
+        self.__dict__['_info_dict'] = info
+        self.__dict__['_info_modified'] = False
+
+        return info
+
+    def setInfoDict(self, info):
+        """
+        set the parsed token info, which is serialized not before the token
+        is flushed or the stored token info is read
+
+        :param info: dict with the token info
+        """
+
+        raw_info = object.__getattribute__(self, 'LinOtpTokenInfo')
+
+        self.__dict__['_info_raw'] = raw_info
+        self.__dict__['_info_dict'] = info
+        self.__dict__['_info_modified'] = True
+
+        # mark the token info column as modified for the flush
+        try:
+            flag_modified(self, 'LinOtpTokenInfo')
+        except InvalidRequestError:
+            # a new token without token info is inserted anyway
+            pass
+
+    def _store_info(self):
+        """
+        serialize the modified parsed token info into the token info column
+        """
+
+        if not self.__dict__.get('_info_modified'):
+            return
+
+        info = self.__dict__['_info_dict']
+
+        self.setInfo(u'' + json.dumps(info, indent=0))
+
+        # keep the parsed token info, which is dropped by setInfo()
+
+        self.__dict__['_info_raw'] = object.__getattribute__(
+                                            self, 'LinOtpTokenInfo')
+        self.__dict__['_info_dict'] = info
+
     def storeToken(self):
         if self.LinOtpUserid is None:
             self.LinOtpUserid = u''
@@ -837,11 +929,14 @@ challenges_table = sa.Table('challenges', meta.metadata,
                                       sa.types.Unicode(2000), default=u''),
                             sa.Column(session_column,
                                       sa.types.Unicode(512), default=u''),
+                            sa.Column('status',
+                                      sa.types.Unicode(16), default=u'open',
+                                      index=True),
                             sa.Column('tokenserial',
                                       sa.types.Unicode(64), default=u'',
                                       index=True),
                             sa.Column(timestamp_column, sa.types.DateTime,
-                                      default=datetime.now()),
+                                      default=datetime.now(), index=True),
                             sa.Column('received_count',
                                       sa.types.Integer(), default=0),
                             sa.Column('received_tan',
@@ -854,6 +949,21 @@ challenges_table = sa.Table('challenges', meta.metadata,
 CHALLENGE_ENCODE = ["data", "challenge", 'tokenserial']
 
 
+def _get_session_status(session):
+    """
+    get the status of a challenge from the session info
+
+    :param session: the json encoded session info
+    :return: the session status - 'open' if not defined
+    """
+
+    try:
+        session_info = json.loads(session or '{}') or {}
+        return unicode(session_info.get('status', 'open'))
+    except (ValueError, AttributeError):
+        return u'open'
+
+
 class Challenge(object):
     '''
     the generic challange handling
@@ -898,6 +1008,12 @@ class Challenge(object):
             # # encode data
             if value:
                 value = linotp.lib.crypto.uencode(value)
+
+        if name == 'session':
+            # the status of the session is kept in its own, indexed column
+            super(Challenge, self).__setattr__('status',
+                                               _get_session_status(value))
+
         super(Challenge, self).__setattr__(name, value)
 
     def __getattribute__(self, name):
@@ -1271,6 +1387,33 @@ orm.mapper(LoggingConfig,
 
 #############################################################################
 
+# otp lookahead index: the keyed hashes of the next otp values of the
+# unassigned tokens
+
+otp_lookahead_table =\
+    sa.Table('otp_lookahead', meta.metadata,
+             sa.Column('id', sa.types.Integer(),
+                       sa.Sequence('otp_lookahead_seq_id', optional=True),
+                       primary_key=True, nullable=False),
+             sa.Column('otp_hash', sa.types.Unicode(64),
+                       index=True, nullable=False),
+             sa.Column('serial', sa.types.Unicode(40),
+                       index=True, nullable=False),
+             sa.Column('counter', sa.types.Integer(), default=0),
+             implicit_returning=implicit_returning,)
+
+
+class OtpLookahead(object):
+
+    def __init__(self, otp_hash, serial, counter):
+        self.otp_hash = unicode(otp_hash)
+        self.serial = unicode(serial)
+        self.counter = counter
+
+orm.mapper(OtpLookahead, otp_lookahead_table)
+
+#############################################################################
+
 # config_table.append_column( sa.Column('IV', sa.types.Unicode(2000), default=u''),)
 # see: http://www.sqlalchemy.org/docs/orm/relationships.html#sqlalchemy.orm.relationship
 #      http://www.sqlalchemy.org/docs/05/reference/orm/mapping.html
@@ -1287,6 +1430,37 @@ orm.mapper(Token, token_table, properties={
                        secondaryjoin=tokenrealm_table.c.realm_id == realm_table.c.id)
 })
 orm.mapper(Realm, realm_table)
+
+# the parsed token info is serialized once, when the token is flushed
+
+
+def _store_token_info(mapper, connection, token):
+    token._store_info()
+
+sa.event.listen(Token, 'before_insert', _store_token_info)
+sa.event.listen(Token, 'before_update', _store_token_info)
+
+# the parsed token info is dropped, when the token is expired or refreshed
+# e.g. by a rollback, as it might contain changes which are not stored
+
+
+def _drop_token_info(token, attrs):
+    if attrs is None or 'LinOtpTokenInfo' in attrs:
+        token.__dict__.pop('_info_raw', None)
+        token.__dict__.pop('_info_dict', None)
+        token.__dict__.pop('_info_modified', None)
+
+
+def _expire_token_info(token, attrs):
+    _drop_token_info(token, attrs)
+
+
+def _refresh_token_info(token, context, attrs):
+    _drop_token_info(token, attrs)
+
+sa.event.listen(Token, 'expire', _expire_token_info)
+sa.event.listen(Token, 'refresh', _refresh_token_info)
+
 orm.mapper(TokenRealm, tokenrealm_table)
 orm.mapper(Config, config_table)
 
@@ -35,6 +35,9 @@ from sqlalchemy.exc import OperationalError
 
 from sqlalchemy import inspect
 
+from linotp.model import session_column
+from linotp.model import timestamp_column
+
 import logging
 
 log = logging.getLogger(__name__)
@@ -67,6 +70,29 @@ def has_column(meta, table_name, column):
     return False
 
 
+def has_index(meta, table_name, column):
+    """
+    check if there is already an index for the column
+
+    :param meta: the meta context with engine++
+    :param table_name: the name of the table with the column
+    :param column: the instantiated column defintion
+
+    :return: boolean
+
+    """
+
+    insp = inspect(meta.engine)
+    tables = insp.get_table_names()
+    if table_name not in tables:
+        return False
+
+    for index in insp.get_indexes(table_name):
+        if column.name in index.get('column_names', []):
+            return True
+    return False
+
+
 def add_column(engine, table_name, column):
     """
     create an index based on the column index definition
@@ -82,10 +108,12 @@ def add_column(engine, table_name, column):
     :return: - nothing -
 
     """
+    preparer = engine.dialect.identifier_preparer
+
     column_name = column.compile(dialect=engine.dialect)
     column_type = column.type.compile(engine.dialect)
     engine.execute('ALTER TABLE %s ADD COLUMN %s %s' %
-                   (table_name, column_name, column_type))
+                   (preparer.quote(table_name), column_name, column_type))
 
 
 def add_index(engine, index, table_name, column):
@@ -106,10 +134,12 @@ def add_index(engine, index, table_name, column):
 
     """
 
+    preparer = engine.dialect.identifier_preparer
+
     column_name = column.compile(dialect=engine.dialect)
-    column_index = "ix_%s_%s" % (table_name, column_name)
+    column_index = preparer.quote("ix_%s_%s" % (table_name, column.name))
     engine.execute('CREATE INDEX %s ON %s ( %s )' %
-                   (column_index, table_name, column_name))
+                   (column_index, preparer.quote(table_name), column_name))
 
 
 def drop_column(engine, table_name, column):
@@ -132,35 +162,146 @@ def drop_column(engine, table_name, column):
                    (table_name, column_name))
 
 
+def migrate_2_9_1_0(meta):
+    """
+    add the bigger sized challenge and the parent transaction column
+    """
+
+    # add new bigger sized challenge column
+    column = sa.Column('lchallenge', sa.types.Unicode(2000))
+
+    if not has_column(meta, 'challenges', column):
+        add_column(meta.engine, 'challenges', column)
+
+    # add column to refer to the parent transaction
+    column = sa.Column('ptransid', sa.types.Unicode(64), index=True)
+
+    if not has_column(meta, 'challenges', column):
+        add_column(meta.engine, 'challenges', column)
+        add_index(meta.engine, 'ptransid', 'challenges', column)
+
+
+def migrate_2_10_1_0(meta):
+    """
+    add the indexed challenge status column, which is filled from the
+    json session info and add an index for the challenge timestamp
+    """
+
+    column = sa.Column('status', sa.types.Unicode(16), index=True)
+
+    if not has_column(meta, 'challenges', column):
+        add_column(meta.engine, 'challenges', column)
+        add_index(meta.engine, 'status', 'challenges', column)
+
+        # the json session info contains the status - challenges without
+        # status info are treated as open ones
+
+        challenges = sa.table('challenges', sa.column('status'),
+                              sa.column(session_column))
+
+        meta.engine.execute(
+            challenges.update().
+            where(challenges.c[session_column].like('%"status": "closed"%')).
+            values(status=u'closed'))
+
+        meta.engine.execute(
+            challenges.update().
+            where(challenges.c.status == None).
+            values(status=u'open'))
+
+    column = sa.Column(timestamp_column, sa.types.DateTime, index=True)
+
+    if not has_index(meta, 'challenges', column):
+        add_index(meta.engine, 'timestamp', 'challenges', column)
+
+
+def migrate_2_10_1_1(meta):
+    """
+    normalize the legacy resolver class prefix 'useridresolveree.' of the
+    token owners, so that the tokens of a user could be looked up by an
+    exact match of the resolver class
+    """
+
+    if 'Token' not in inspect(meta.engine).get_table_names():
+        return
+
+    legacy_prefix = u'useridresolveree.'
+
+    tokens = sa.table('Token', sa.column('LinOtpIdResClass',
+                                         sa.types.Unicode))
+
+    # one statement for all tokens: the prefix is replaced by the
+    # concatenation with the remainder of the resolver class
+
+    new_resolver_class = (
+        sa.literal(u'useridresolver.', type_=sa.types.Unicode) +
+        sa.func.substr(tokens.c.LinOtpIdResClass, len(legacy_prefix) + 1))
+
+    meta.engine.execute(
+        tokens.update().
+        where(tokens.c.LinOtpIdResClass.like(legacy_prefix + u'%')).
+        values(LinOtpIdResClass=new_resolver_class))
+
+
+def migrate_2_10_1_2(meta):
+    """
+    add the indexed owner login column to the token table, which is used
+    for the token search by user
+
+    the owner login of the already assigned tokens is filled by the token
+    owner update of the tools controller, as this requires the lookup of
+    the users in the resolvers
+    """
+
+    if 'Token' not in inspect(meta.engine).get_table_names():
+        return
+
+    column = sa.Column('LinOtpOwnerLogin', sa.types.Unicode(320), index=True)
+
+    if not has_column(meta, 'Token', column):
+        add_column(meta.engine, 'Token', column)
+        add_index(meta.engine, 'LinOtpOwnerLogin', 'Token', column)
+
+
+# the data model migration steps in the order of their versions
+
+Migrations = [
+    ("2.9.1.0", migrate_2_9_1_0),
+    ("2.10.1.0", migrate_2_10_1_0),
+    ("2.10.1.1", migrate_2_10_1_1),
+    ("2.10.1.2", migrate_2_10_1_2),
+]
+
+
 def run_data_model_migration(meta, target_version=None):
     """
     hook for database schema upgrade
+
+    all migration steps up to the target version are run - as each step
+    checks if it is already applied, an already migrated database is not
+    touched
     """
 
-    if target_version and target_version == "2.9.1.0":
-        try:
+    if not target_version:
+        return
 
-            # add new bigger sized challenge column
-            column = sa.Column('lchallenge', sa.types.Unicode(2000))
+    try:
 
-            if not has_column(meta, 'challenges', column):
-                add_column(meta.engine, 'challenges', column)
+        for version, migration in Migrations:
 
-            # add column to refer to the parent transaction
-            column = sa.Column('ptransid', sa.types.Unicode(64), index=True)
+            migration(meta)
 
-            if not has_column(meta, 'challenges', column):
-                add_column(meta.engine, 'challenges', column)
-                add_index(meta.engine, 'ptransid', 'challenges', column)
+            if version == target_version:
+                break
 
-        except ProgrammingError as exx:
-            log.exception('Failed to upgrade database! %r', exx)
+    except ProgrammingError as exx:
+        log.exception('Failed to upgrade database! %r', exx)
 
-        except OperationalError as exx:
-            log.exception('Failed to upgrade database! %r', exx)
+    except OperationalError as exx:
+        log.exception('Failed to upgrade database! %r', exx)
 
-        except Exception as exx:
-            log.exception('Failed to upgrade database! %r', exx)
-            raise exx
+    except Exception as exx:
+        log.exception('Failed to upgrade database! %r', exx)
+        raise exx
 
     return
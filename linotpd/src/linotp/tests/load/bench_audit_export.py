@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+benchmark for the audit export in rows per second
+
+compares the export with the signature verification per row, the parallel
+batch verification by the verify pool and the export without verification:
+
+    python linotp/tests/load/bench_audit_export.py [rows]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from M2Crypto import RSA
+
+from linotp.lib.audit.SQLAudit import Audit
+from linotp.lib.audit.iterator import AuditQuery
+from linotp.lib.audit.iterator import CSVAuditIterator
+
+
+def create_audit(directory, rows):
+    """
+    create the sqlite audit db with the given number of signed rows
+    """
+
+    private = os.path.join(directory, 'private.pem')
+    public = os.path.join(directory, 'public.pem')
+
+    rsa_key = RSA.gen_key(2048, 65537, lambda *args: None)
+    rsa_key.save_key(private, cipher=None)
+    rsa_key.save_pub_key(public)
+
+    config = {
+        'linotpAudit.sql.url': 'sqlite:///%s' % os.path.join(directory,
+                                                            'audit.sqlite'),
+        'linotpAudit.key.private': private,
+        'linotpAudit.key.public': public,
+        'linotpAudit.sql.verify_processes': '4',
+        }
+
+    audit = Audit(config)
+
+    for i in range(rows):
+        audit.log({'serial': 'LSSP%08d' % i,
+                   'action': 'validate/check',
+                   'success': i % 2,
+                   'user': 'user_%d' % (i % 100),
+                   'realm': 'realm',
+                   'info': 'benchmark entry %d' % i,
+                   'linotp_server': 'bench',
+                   'client': '10.0.0.1',
+                   })
+
+    return audit
+
+
+def export(audit, verify):
+    """
+    :return: rows per second
+    """
+
+    param = {'verify': verify, 'stream': 'true'}
+
+    start = time.time()
+
+    rows = 0
+    for _line in CSVAuditIterator(AuditQuery(param, audit), ','):
+        rows += 1
+
+    return rows / (time.time() - start)
+
+
+def main():
+
+    rows = 10000
+    if len(sys.argv) > 1:
+        rows = int(sys.argv[1])
+
+    directory = tempfile.mkdtemp()
+    try:
+        audit = create_audit(directory, rows)
+
+        for verify in ['true', 'parallel', 'false']:
+            print "verify=%-10s %10.1f rows/s" % (verify,
+                                                  export(audit, verify))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
+
+# eof #
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+benchmark for the client and time conditions of policies with large client
+allow lists - 100 policies with 50 networks each
+
+compares the former evaluation - comparing the client with every network
+and the time with the cron values of a condition - with the conditions,
+which are compiled into network ranges and cron bitsets:
+
+    python linotp/tests/load/bench_policy_conditions.py [lookups]
+"""
+
+import sys
+import time
+
+from datetime import datetime
+
+from netaddr import IPNetwork
+
+from linotp.lib.policy.evaluate import _compare_cron_value
+from linotp.lib.policy.evaluate import compile_ip_conditions
+from linotp.lib.policy.evaluate import compile_time_conditions
+from linotp.lib.policy.evaluate import match_ip_conditions
+from linotp.lib.policy.evaluate import match_time_conditions
+
+CLIENTS = ['10.%d.%d.1' % (i % 256, i % 199) for i in range(100)]
+
+NOW = datetime(2016, 12, 14, 15, 30)
+
+
+def create_conditions(policies=100, networks=50):
+    """
+    create the client and time conditions of the policies
+
+    :return: list of tuples (client condition, time condition)
+    """
+
+    conditions = []
+
+    for i in range(policies):
+
+        client = ', '.join('10.%d.%d.0/24' % ((i + j) % 256, (i * j) % 256)
+                           for j in range(networks))
+        client += ', -10.%d.0.1' % i
+
+        conditions.append((client, '* 7-17 * * 1-5 *; -*/15 12 * * * *'))
+
+    return conditions
+
+
+def former_compile_ip(condition):
+
+    compiled = []
+
+    for entry in [x.strip() for x in condition.split(',')]:
+        if entry[0] in ['-', '!']:
+            compiled.append((True, IPNetwork(entry[1:])))
+        else:
+            compiled.append((False, IPNetwork(entry)))
+
+    return compiled
+
+
+def former_compile_time(condition):
+
+    compiled = []
+
+    for entry in [x.strip() for x in condition.split(';')]:
+        its_a_not_condition = entry[0] in ['-', '!']
+        if its_a_not_condition:
+            entry = entry[1:]
+        compiled.append((its_a_not_condition, entry.split()))
+
+    return compiled
+
+
+def former_match_time(compiled_conditions, now):
+
+    weekday = now.isoweekday() % 7
+    targets = [now.minute, now.hour, now.day, now.month, weekday, now.year]
+
+    matched = False
+
+    for its_a_not_condition, cron_parts in compiled_conditions:
+        if all(_compare_cron_value(value, target)
+               for value, target in zip(cron_parts, targets)):
+            if its_a_not_condition:
+                return False
+            matched = True
+
+    return matched
+
+
+def run(compiled, match_func, values, lookups):
+    """
+    :return: lookups per second, each lookup evaluating all policies
+    """
+
+    start = time.time()
+
+    for i in range(lookups):
+        value = values[i % len(values)]
+        for condition in compiled:
+            match_func(condition, value)
+
+    return lookups / (time.time() - start)
+
+
+def main():
+
+    lookups = 200
+    if len(sys.argv) > 1:
+        lookups = int(sys.argv[1])
+
+    conditions = create_conditions()
+
+    client_conditions = [client for client, _time in conditions]
+    time_conditions = [time_cond for _client, time_cond in conditions]
+
+    former_ip = run([former_compile_ip(c) for c in client_conditions],
+                    match_ip_conditions, CLIENTS, lookups)
+    compiled_ip = run([compile_ip_conditions(c) for c in client_conditions],
+                      match_ip_conditions, CLIENTS, lookups)
+
+    former_time = run([former_compile_time(c) for c in time_conditions],
+                      former_match_time, [NOW], lookups)
+    compiled_time = run([compile_time_conditions(c) for c in time_conditions],
+                        match_time_conditions, [NOW], lookups)
+
+    print "client - compare with every network: %10.1f lookups/s" % former_ip
+    print "client - network ranges:             %10.1f lookups/s" % compiled_ip
+    print "time - compare the cron values:      %10.1f lookups/s" % former_time
+    print "time - cron bitsets:                 %10.1f lookups/s" % (
+                                                                compiled_time)
+
+
+if __name__ == '__main__':
+    main()
+
+# eof #
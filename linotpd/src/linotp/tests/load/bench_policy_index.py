@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+benchmark for the policy lookup with 1000 policies
+
+compares the former policy handling - parsing the policies from the config
+for every request and evaluating all policies for every lookup - with the
+shared policy index:
+
+    python linotp/tests/load/bench_policy_index.py [requests]
+"""
+
+import sys
+import time
+
+from linotp.lib.policy.evaluate import PolicyEvaluator
+from linotp.lib.policy.index import get_policy_index
+from linotp.lib.policy.util import parse_policies
+
+SCOPES = ['admin', 'authentication', 'authorization', 'selfservice',
+          'enrollment', 'system']
+
+# the client policy lookups, which are made for one request
+
+LOOKUPS = [
+    {'scope': 'authentication', 'action': 'otppin', 'realm': 'realm_7'},
+    {'scope': 'authentication', 'action': 'passthru', 'realm': 'realm_7'},
+    {'scope': 'authentication', 'action': 'passOnNoToken',
+     'realm': 'realm_7'},
+    {'scope': 'authorization', 'action': 'authorize', 'realm': 'realm_7'},
+    {'scope': 'authentication', 'action': 'challenge_response',
+     'realm': 'realm_7'},
+]
+
+
+class BenchConfig(dict):
+    snapshot_version = 1
+
+
+def create_config(count=1000):
+    """
+    create the config with the given number of policies
+    """
+
+    config = BenchConfig()
+
+    for i in range(count):
+        prefix = 'linotp.Policy.policy_%d.' % i
+        config[prefix + 'scope'] = SCOPES[i % len(SCOPES)]
+        config[prefix + 'action'] = 'action_%d=%d, otppin=%d' % (i, i, i % 3)
+        config[prefix + 'realm'] = 'realm_%d' % (i % 50)
+        config[prefix + 'user'] = '*'
+        config[prefix + 'client'] = '10.%d.0.0/16' % (i % 250)
+        config[prefix + 'time'] = '* 0-23 * * * *;'
+        config[prefix + 'active'] = 'True'
+
+    return config
+
+
+def lookup(policies):
+
+    for params in LOOKUPS:
+        policy_eval = PolicyEvaluator(policies)
+        policy_eval.set_filters(params)
+        policy_eval.filter_for_client('10.7.1.1')
+        policy_eval.filter_for_time()
+        policy_eval.filter_for_active(state=True)
+        policy_eval.evaluate()
+
+
+def run(get_policies, config, requests):
+    """
+    :return: requests per second
+    """
+
+    start = time.time()
+
+    for _i in range(requests):
+        lookup(get_policies(config))
+
+    return requests / (time.time() - start)
+
+
+def main():
+
+    requests = 200
+    if len(sys.argv) > 1:
+        requests = int(sys.argv[1])
+
+    config = create_config()
+
+    parsed = run(parse_policies, config, requests)
+    indexed = run(get_policy_index, config, requests)
+
+    print "parse and evaluate per request: %10.1f requests/s" % parsed
+    print "shared policy index:            %10.1f requests/s" % indexed
+
+
+if __name__ == '__main__':
+    main()
+
+# eof #
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+benchmark for the crypto operations of the default security module
+
+compares the former key access, which read the key file on every operation,
+with the in-memory key cache:
+
+    python linotp/tests/load/bench_security_module.py [iterations]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from linotp.lib.security.default import DefaultSecurityModule
+from linotp.lib.security.default import KeyFileCache
+
+
+class FileReadingSecurityModule(DefaultSecurityModule):
+    """
+    security module with the former key access: read the key file for
+    every crypto operation
+    """
+
+    def getSecret(self, id=0):
+        secret = ''
+        with open(self.secFile) as f:
+            for _i in range(0, int(id) + 1):
+                secret = f.read(32)
+        return secret
+
+
+def run(module, iterations):
+    """
+    run the crypto operations of one validation: decrypt the pin and
+    the token seed and compute an hmac
+
+    :return: operations per second
+    """
+
+    iv = module.random(16)
+    crypted_pin = module.encryptPin('1234')
+    crypted_seed = module.encrypt('3132333435363738393031323334353637383930',
+                                  iv, 0)
+
+    start = time.time()
+    for _i in range(iterations):
+        module.decryptPin(crypted_pin)
+        module.decrypt(crypted_seed, iv, 0)
+        module.signMessage('the message')
+
+    duration = time.time() - start
+
+    return (3 * iterations) / duration
+
+
+def main():
+
+    iterations = 20000
+    if len(sys.argv) > 1:
+        iterations = int(sys.argv[1])
+
+    key_file = tempfile.NamedTemporaryFile(delete=False)
+    try:
+        key_file.write(os.urandom(32 * 4))
+        key_file.close()
+
+        config = {'file': key_file.name}
+
+        file_reading = run(FileReadingSecurityModule(config), iterations)
+        cached = run(DefaultSecurityModule(config), iterations)
+
+        print "key file read per operation: %10.0f ops/s" % file_reading
+        print "in-memory key cache:         %10.0f ops/s" % cached
+
+    finally:
+        KeyFileCache.clear_all()
+        os.unlink(key_file.name)
+
+
+if __name__ == '__main__':
+    main()
+
+# eof #
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+benchmark for the token part of check_token on HOTP and TOTP tokens
+
+each check runs the validity checks, the otp check and the counter updates
+of a successful validation and flushes the token, which is what a
+validation request does with the token info of the token.
+
+compares the former token info access, which parsed the token info on every
+read and serialized it on every write, with the parsed token info cache:
+
+    python linotp/tests/load/bench_token_check.py [checks]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+
+from mock import patch
+
+import sqlalchemy as sa
+
+from linotp.lib.HMAC import HmacOtp
+from linotp.lib.context import request_context
+from linotp.lib.context import request_context_safety
+from linotp.lib.security.default import DefaultSecurityModule
+from linotp.lib.security.default import KeyFileCache
+from linotp.model import Token
+from linotp.model import init_model
+from linotp.model.meta import Session
+from linotp.model.meta import metadata
+from linotp.tokens.hmactoken import HmacTokenClass
+from linotp.tokens.totptoken import TimeHmacTokenClass
+
+SEED = '3132333435363738393031323334353637383930'
+
+
+class SerializedTokenInfo(object):
+    """
+    the former token info access: parse the token info on every read and
+    serialize it on every write
+    """
+
+    def _get_info_dict(self):
+        tokeninfo = self.token.getInfo()
+        if tokeninfo:
+            return json.loads(tokeninfo)
+        return {}
+
+    def _set_info_dict(self, info):
+        self.token.setInfo(u'' + json.dumps(info, indent=0))
+
+
+class FormerHmacTokenClass(SerializedTokenInfo, HmacTokenClass):
+    pass
+
+
+class FormerTimeHmacTokenClass(SerializedTokenInfo, TimeHmacTokenClass):
+    pass
+
+
+def create_token(token_class, serial):
+    """
+    create a token with a token info as it is written by the enrollment
+    """
+
+    token = token_class(Token(serial))
+    token.setOtpKey(SEED)
+    token.setOtpLen(6)
+    token.setOtpCount(0)
+
+    token.addToTokenInfo('hashlib', 'sha1')
+    token.addToTokenInfo('timeStep', 30)
+    token.addToTokenInfo('timeWindow', 180)
+    token.addToTokenInfo('timeShift', 0)
+    token.addToTokenInfo('count_auth_max', 1000000)
+    token.addToTokenInfo('count_auth_success_max', 1000000)
+    token.validity_period_end = '31/12/29 23:59'
+
+    Session.add(token.token)
+    Session.flush()
+
+    return token
+
+
+def check_token(token, otp, options=None):
+    """
+    the token part of a validation with the given otp
+    """
+
+    # the token validity checks of the validation
+
+    now = datetime.now()
+
+    assert not (token.validity_period_start and
+                now < token.validity_period_start)
+    assert not (token.count_auth_success_max > 0 and
+                token.count_auth_success >= token.count_auth_success_max)
+    assert not (token.count_auth_max > 0 and
+                token.count_auth >= token.count_auth_max)
+    assert not (token.validity_period_end and
+                now >= token.validity_period_end)
+
+    res = token.checkOtp(otp, token.getOtpCount(), 10, options=options)
+    assert res >= 0
+
+    token.setOtpCount(res + 1)
+    token.inc_count_auth_success()
+    token.inc_count_auth()
+
+    Session.flush()
+
+
+def run_hotp(token_class, checks):
+    """
+    :return: checks per second
+    """
+
+    token = create_token(token_class, u'HOTP_%s' % token_class.__name__)
+
+    hmac_otp = HmacOtp(token._get_secret_object(), digits=6)
+    otps = [hmac_otp.generate(counter=i, inc_counter=False)
+            for i in range(checks)]
+
+    start = time.time()
+
+    for otp in otps:
+        check_token(token, otp)
+
+    return checks / (time.time() - start)
+
+
+def run_totp(token_class, checks):
+    """
+    :return: checks per second
+    """
+
+    token = create_token(token_class, u'TOTP_%s' % token_class.__name__)
+
+    # the checks are made for consecutive time steps, starting now
+
+    now = int(time.time()) // 30 * 30
+
+    hmac_otp = HmacOtp(token._get_secret_object(), digits=6)
+    otps = [(now + 30 * i,
+             hmac_otp.generate(counter=now // 30 + i, inc_counter=False))
+            for i in range(checks)]
+
+    start = time.time()
+
+    for init_time, otp in otps:
+        check_token(token, otp, options={'initTime': init_time})
+
+    return checks / (time.time() - start)
+
+
+def main():
+
+    checks = 2000
+    if len(sys.argv) > 1:
+        checks = int(sys.argv[1])
+
+    engine = sa.create_engine('sqlite://')
+    init_model(engine)
+    metadata.create_all(engine)
+
+    key_file = tempfile.NamedTemporaryFile(delete=False)
+    try:
+        key_file.write(os.urandom(32 * 4))
+        key_file.close()
+
+        hsm = DefaultSecurityModule({'file': key_file.name})
+
+        # no linotp config: the tokens run with the default settings
+
+        with request_context_safety(), \
+                patch('linotp.lib.config.getLinotpConfig', return_value={}):
+
+            request_context['hsm'] = {'obj': hsm}
+
+            for name, run, token_class in [
+                    ('hotp, parse per access:', run_hotp,
+                     FormerHmacTokenClass),
+                    ('hotp, parsed info cache:', run_hotp,
+                     HmacTokenClass),
+                    ('totp, parse per access:', run_totp,
+                     FormerTimeHmacTokenClass),
+                    ('totp, parsed info cache:', run_totp,
+                     TimeHmacTokenClass)]:
+
+                rate = run(token_class, checks)
+                print "%-25s %10.1f checks/s" % (name, rate)
+
+    finally:
+        Session.remove()
+        KeyFileCache.clear_all()
+        os.unlink(key_file.name)
+
+
+if __name__ == '__main__':
+    main()
+
+# eof #
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+benchmark for the lookup of the tokens of a user owning 10 tokens across
+3 resolvers
+
+compares the former lookup - one query per resolver with a resolver class
+pattern and the lazy loading of the token realms - with the single token
+query and the eager realm loading of getTokens4UserOrSerial:
+
+    python linotp/tests/load/bench_tokens_of_user.py [lookups] [tokens]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import sqlalchemy as sa
+from sqlalchemy import and_
+
+from linotp.lib.token import getTokens4UserOrSerial
+from linotp.model import Realm
+from linotp.model import Token
+from linotp.model import init_model
+from linotp.model.meta import Session
+from linotp.model.meta import metadata
+
+RESOLVERS = [u'useridresolver.PasswdIdResolver.IdResolver.res_%d' % i
+             for i in range(3)]
+
+
+class BenchUser(object):
+
+    is_empty = False
+    login = u'hans'
+    realm = u'myrealm'
+
+    def get_uid_resolver(self):
+        for resolver_spec in RESOLVERS:
+            yield u'1000', resolver_spec
+
+
+def create_tokens(directory, count):
+    """
+    create the token db with the 10 tokens of the user and the given number
+    of tokens of other users
+    """
+
+    engine = sa.create_engine(
+        'sqlite:///%s' % os.path.join(directory, 'token.sqlite'))
+
+    init_model(engine)
+    metadata.create_all(engine)
+
+    realm = Realm(u'myrealm')
+    Session.add(realm)
+
+    for i in range(count + 10):
+        token = Token(u'BENCH%08d' % i)
+        token.LinOtpUserid = u'1000' if i < 10 else u'%d' % (2000 + i)
+        token.LinOtpIdResClass = RESOLVERS[i % 3]
+        token.LinOtpIdResolver = u'/etc/passwd'
+        token.realms.append(realm)
+        Session.add(token)
+
+    Session.commit()
+
+    return engine
+
+
+def former_lookup(user):
+    """
+    the former token lookup with one query per resolver
+    """
+
+    tokens = []
+
+    for uid, resolver_class in user.get_uid_resolver():
+
+        resolver_class = resolver_class.replace('useridresolver.',
+                                                'useridresolver%.')
+
+        query = Session.query(Token).filter(
+            and_(Token.LinOtpUserid == uid,
+                 Token.LinOtpIdResClass.like(resolver_class)))
+
+        for token in query:
+            if user.realm.lower() in token.getRealmNames():
+                tokens.append(token)
+
+    return tokens
+
+
+def token_lookup(user):
+
+    return getTokens4UserOrSerial(user, _class=False)
+
+
+def run(engine, lookup, lookups):
+    """
+    :return: tuple of lookups per second and queries per lookup
+    """
+
+    statements = []
+
+    def count_statement(*args):
+        statements.append(args[2])
+
+    sa.event.listen(engine, 'before_cursor_execute', count_statement)
+
+    user = BenchUser()
+
+    start = time.time()
+
+    for _i in range(lookups):
+        tokens = lookup(user)
+        assert len(tokens) == 10
+        Session.expunge_all()
+
+    duration = time.time() - start
+
+    sa.event.remove(engine, 'before_cursor_execute', count_statement)
+
+    return lookups / duration, len(statements) / float(lookups)
+
+
+def main():
+
+    lookups = 1000
+    if len(sys.argv) > 1:
+        lookups = int(sys.argv[1])
+
+    count = 10000
+    if len(sys.argv) > 2:
+        count = int(sys.argv[2])
+
+    directory = tempfile.mkdtemp()
+    try:
+        engine = create_tokens(directory, count)
+
+        for name, lookup in [('query per resolver:', former_lookup),
+                             ('single token query:', token_lookup)]:
+            rate, queries = run(engine, lookup, lookups)
+            print "%-20s %10.1f lookups/s %5.1f queries/lookup" % (
+                name, rate, queries)
+    finally:
+        Session.remove()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
+
+# eof #
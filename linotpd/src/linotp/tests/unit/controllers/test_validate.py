@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+
+"""
+unit test for the validate/check_batch
+"""
+
+import unittest
+
+from mock import mock
+
+from linotp.controllers.validate import ValidateController
+from linotp.lib.policy import AuthorizeException
+from linotp.lib.user import User
+
+
+class TestCheckBatch(unittest.TestCase):
+
+    def setUp(self):
+
+        patches = {
+            'c': mock.patch('linotp.controllers.validate.c'),
+            'Session': mock.patch('linotp.controllers.validate.Session'),
+            'audit': mock.patch('linotp.controllers.validate.audit'),
+            'sendResult': mock.patch(
+                'linotp.controllers.validate.sendResult'),
+            'sendError': mock.patch('linotp.controllers.validate.sendError'),
+            'getFromConfig': mock.patch(
+                'linotp.controllers.validate.getFromConfig',
+                return_value='3'),
+            'request_context': mock.patch(
+                'linotp.controllers.validate.request_context', {}),
+            'init': mock.patch(
+                'linotp.controllers.validate.BaseController.__init__',
+                return_value=None),
+            'is_auth_return': mock.patch(
+                'linotp.controllers.validate.is_auth_return',
+                return_value=False),
+            'getUserFromParam': mock.patch(
+                'linotp.controllers.validate.getUserFromParam',
+                side_effect=lambda param: User(param.get('user', ''),
+                                               param.get('realm', ''))),
+            'set_realm': mock.patch(
+                'linotp.controllers.validate.set_realm',
+                side_effect=lambda login, realm: realm),
+            'getDefaultRealm': mock.patch(
+                'linotp.controllers.validate.getDefaultRealm',
+                return_value='mydefrealm'),
+            'get_token_ids_of_batch': mock.patch(
+                'linotp.controllers.validate.get_token_ids_of_batch',
+                return_value=([], {})),
+            'lock_tokens': mock.patch(
+                'linotp.controllers.validate.lock_tokens',
+                side_effect=lambda token_ids: ['token_%d' % token_id
+                                               for token_id in token_ids]),
+        }
+
+        self.mocks = {}
+        for name, patch in patches.items():
+            self.mocks[name] = patch.start()
+            self.addCleanup(patch.stop)
+
+        self.mocks['c'].audit = {'action': 'validate/check_batch',
+                                 'success': False}
+
+        self.controller = ValidateController()
+
+    def run_batch(self, items):
+        self.controller.request_params = {'items': items}
+        return self.controller.check_batch()
+
+    @mock.patch('linotp.controllers.validate.ValidateController._check_serial')
+    @mock.patch('linotp.controllers.validate.ValidateController._check')
+    def test_items(self, mock_check, mock_check_serial):
+        """
+        every item is checked and audited on its own
+        """
+
+        def check(param, tokens=None):
+            if param['user'] == 'emma':
+                raise AuthorizeException('not allowed')
+            return param['pass'] == 'good', None
+
+        mock_check.side_effect = check
+        mock_check_serial.return_value = (True, {'serial': 'S1'})
+
+        self.run_batch([{'id': 1, 'user': 'hans', 'pass': 'good'},
+                        {'id': 2, 'user': 'hans', 'pass': 'bad'},
+                        {'id': 3, 'serial': 'S1', 'pass': 'good'}])
+
+        results = self.mocks['sendResult'].call_args[0][1]
+
+        self.assertEqual(results, [
+            {'id': 1, 'status': True, 'value': True},
+            {'id': 2, 'status': True, 'value': False},
+            {'id': 3, 'status': True, 'value': True,
+             'detail': {'serial': 'S1'}}])
+
+        self.assertEqual(self.mocks['audit'].log.call_count, 3)
+
+        # the request is audited with the summary
+
+        request_audit = self.mocks['c'].audit
+        self.assertEqual(request_audit['action_detail'], '3 items, 2 valid')
+        self.assertFalse(request_audit['success'])
+
+        # a failing item does not fail the batch
+
+        self.run_batch([{'user': 'emma', 'pass': 'good'},
+                        {'user': 'hans', 'pass': 'good'}])
+
+        results = self.mocks['sendResult'].call_args[0][1]
+        self.assertEqual([r['value'] for r in results], [False, True])
+
+        item_audit = self.mocks['audit'].log.call_args_list[3][0][0]
+        self.assertIn('not allowed', item_audit['info'])
+        self.assertEqual(item_audit['action'], 'validate/check_batch')
+
+    @mock.patch('linotp.controllers.validate.ValidateController._check_serial')
+    @mock.patch('linotp.controllers.validate.ValidateController._check')
+    def test_item_tokens(self, mock_check, mock_check_serial):
+        """
+        the tokens of all items are read at once and locked per item
+        """
+
+        mock_check.return_value = (True, None)
+        mock_check_serial.return_value = (True, None)
+
+        self.mocks['get_token_ids_of_batch'].return_value = (
+            [[1, 2], []], {u'S1': [3]})
+
+        self.run_batch([{'user': 'hans', 'pass': 'good'},
+                        {'user': 'emma', 'realm': 'myrealm',
+                         'pass': 'good'},
+                        {'serial': 'S1', 'pass': 'good'}])
+
+        self.assertEqual(self.mocks['get_token_ids_of_batch'].call_count, 1)
+
+        users, serials = self.mocks['get_token_ids_of_batch'].call_args[0]
+        self.assertEqual([(user.login, user.realm) for user in users],
+                         [(u'hans', 'mydefrealm'), (u'emma', u'myrealm')])
+        self.assertEqual(serials, [u'S1'])
+
+        self.assertEqual(
+            [call[1]['tokens'] for call in mock_check.call_args_list],
+            [['token_1', 'token_2'], []])
+        self.assertEqual(mock_check_serial.call_args[1]['tokens'],
+                         ['token_3'])
+
+        # without the prefetched tokens, they are read by the validation
+
+        self.mocks['get_token_ids_of_batch'].side_effect = Exception('db')
+
+        self.run_batch([{'user': 'hans', 'pass': 'good'}])
+
+        self.assertIsNone(mock_check.call_args[1]['tokens'])
+
+    @mock.patch('linotp.controllers.validate.ValidateController._check')
+    def test_item_request_user(self, mock_check):
+        """
+        the policies of an item are evaluated for the user of the item
+        """
+
+        request_context = self.mocks['request_context']
+        request_context['RequestUser'] = User()
+
+        request_users = []
+
+        def check(param, tokens=None):
+            request_users.append(request_context['RequestUser'].login)
+            if param['user'] == 'emma':
+                raise AuthorizeException('not allowed')
+            return True, None
+
+        mock_check.side_effect = check
+
+        self.run_batch([{'user': 'hans', 'pass': 'good'},
+                        {'user': 'emma', 'pass': 'good'}])
+
+        self.assertEqual(request_users, [u'hans', u'emma'])
+
+        auth_user = self.mocks['is_auth_return'].call_args[1]['user']
+        self.assertEqual(auth_user.login, u'emma')
+
+        # the user of the request is restored
+
+        self.assertEqual(request_context['RequestUser'].login, '')
+
+    def test_batch_limit(self):
+        """
+        the number of items is limited
+        """
+
+        self.run_batch([{'user': 'hans', 'pass': 'pin'}] * 4)
+
+        self.assertEqual(self.mocks['sendError'].call_count, 1)
+        self.assertEqual(self.mocks['sendResult'].call_count, 0)
+
+# eof #
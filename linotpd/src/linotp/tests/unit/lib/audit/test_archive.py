@@ -0,0 +1,153 @@
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+unit test for the audit archive segments
+"""
+
+import gzip
+import shutil
+import tempfile
+import unittest
+
+import sqlalchemy as sa
+
+from linotp.lib.audit.archive import AuditArchive
+from linotp.lib.audit.archive import delete_chunks
+
+
+class TestAuditArchive(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+
+        self.engine = sa.create_engine('sqlite://')
+        metadata = sa.MetaData()
+
+        self.table = sa.Table(
+            'audit', metadata,
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('timestamp', sa.Unicode(30)),
+            sa.Column('created', sa.DateTime),
+            sa.Column('serial', sa.Unicode(30)),
+            sa.Column('signature', sa.Unicode(512)))
+
+        metadata.create_all(self.engine)
+
+        self.connection = self.engine.connect()
+
+        rows = []
+        for i in range(1, 26):
+            rows.append({
+                'id': i,
+                'timestamp': u'2018-01-%02d 10:00:00.000000' % i,
+                'serial': u'LSSP%d' % (i % 3),
+                'signature': u'sig_%d' % i,
+                })
+        self.connection.execute(self.table.insert(), rows)
+
+    def tearDown(self):
+        self.connection.close()
+        shutil.rmtree(self.directory)
+
+    def remaining_ids(self):
+        query = sa.select([self.table.c.id]).order_by(self.table.c.id)
+        return [row[0] for row in self.connection.execute(query)]
+
+    def test_rollover(self):
+        """ the entries are moved into segments and deleted in chunks """
+
+        archive = AuditArchive(self.directory)
+
+        segments = archive.rollover(self.connection, self.table, 20,
+                                    segment_size=8, chunk_size=3)
+
+        self.assertEqual([(s['first_id'], s['last_id'], s['rows'])
+                          for s in segments],
+                         [(1, 8, 8), (9, 16, 8), (17, 20, 4)])
+
+        self.assertEqual(self.remaining_ids(), range(21, 26))
+
+        # the manifest is reloaded by a new archive instance
+        archive = AuditArchive(self.directory)
+        self.assertEqual(len(archive.get_segments()), 3)
+
+        for segment in archive.get_segments():
+            self.assertTrue(archive.verify_segment(segment))
+
+        # the rows contain the complete entries including the signature
+        rows = list(archive.read_segment(segments[0]))
+        self.assertEqual([row.id for row in rows], range(1, 9))
+        self.assertEqual(rows[0].signature, u'sig_1')
+        self.assertEqual(rows[0].timestamp, u'2018-01-01 10:00:00.000000')
+
+        # a further rollover starts with the remaining entries
+        segments = archive.rollover(self.connection, self.table, 22)
+        self.assertEqual([(s['first_id'], s['last_id']) for s in segments],
+                         [(21, 22)])
+        self.assertEqual(len(archive.get_segments()), 4)
+
+    def test_search_segments(self):
+        """ the segments are selected by id and date range """
+
+        archive = AuditArchive(self.directory)
+        archive.rollover(self.connection, self.table, 20, segment_size=10)
+
+        segments = archive.find_segments(min_id=12, max_id=12)
+        self.assertEqual([s['first_id'] for s in segments], [11])
+
+        segments = archive.find_segments(
+                            start=u'2018-01-05 00:00:00.000000',
+                            end=u'2018-01-15 00:00:00.000000')
+        self.assertEqual([s['first_id'] for s in segments], [1, 11])
+
+        segments = archive.find_segments(start=u'2018-01-21 00:00:00.000000')
+        self.assertEqual(segments, [])
+
+        match = lambda row: row.serial == u'LSSP1'
+        rows = archive.rows(archive.get_segments(), match, descending=True)
+        self.assertEqual([row.id for row in rows], [19, 16, 13, 10, 7, 4, 1])
+
+    def test_modified_segment(self):
+        """ a modified segment is detected by its hash """
+
+        archive = AuditArchive(self.directory)
+        segment, = archive.rollover(self.connection, self.table, 5)
+
+        with gzip.open(archive._path(segment['name']), 'ab') as segment_file:
+            segment_file.write('{"id": 6}\n')
+
+        self.assertFalse(archive.verify_segment(segment))
+
+    def test_delete_chunks(self):
+        """ the entries of an id range are deleted in chunks """
+
+        deleted = delete_chunks(self.connection, self.table, 3, 17,
+                                chunk_size=4)
+
+        self.assertEqual(deleted, 15)
+        self.assertEqual(self.remaining_ids(), [1, 2] + range(18, 26))
+
+# eof #
@@ -0,0 +1,87 @@
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+unit test for the date range search of the sql audit
+"""
+
+import datetime
+import unittest
+
+import sqlalchemy as sa
+
+from linotp.lib.audit.SQLAudit import Audit
+from linotp.lib.audit.SQLAudit import AuditTable
+from linotp.lib.audit.SQLAudit import TIMESTAMP_FORMAT
+from linotp.lib.audit.SQLAudit import audit_table
+from linotp.lib.audit.SQLAudit import metadata
+
+DATES = [datetime.datetime(2018, 6, day, 12, 0) for day in [10, 11, 12]]
+
+
+class TestDateRangeSearch(unittest.TestCase):
+
+    def setUp(self):
+
+        self.engine = sa.create_engine('sqlite://')
+        metadata.create_all(self.engine)
+
+        # the first entries are not backfilled, like after an offline upgrade
+
+        for i, date in enumerate(DATES):
+            self.engine.execute(audit_table.insert().values(
+                id=i + 1,
+                timestamp=u"%s" % date.strftime(TIMESTAMP_FORMAT),
+                created=date if i == 2 else None))
+
+        self.session = sa.orm.sessionmaker(bind=self.engine)()
+
+        # the audit is not initialized, as no keys are required
+
+        self.audit = Audit.__new__(Audit)
+
+    def tearDown(self):
+
+        self.session.close()
+
+    def search(self, param):
+
+        condition = self.audit._buildCondition(param, True)
+
+        return sorted(entry.id for entry in
+                      self.session.query(AuditTable).filter(condition))
+
+    def test_entries_without_created(self):
+        """
+        the entries without created datetime are found by their timestamp
+        """
+
+        self.assertEqual(self.search({'from': '2018-06-11'}), [2, 3])
+        self.assertEqual(self.search({'to': '2018-06-11'}), [1, 2])
+        self.assertEqual(self.search({'from': '2018-06-11 12:00:00',
+                                      'to': '2018-06-12 11:59:59'}), [2])
+        self.assertEqual(self.search({'from': '2018-06-12',
+                                      'to': '2018-06-12'}), [3])
+
+# eof #
@@ -402,3 +402,123 @@ u""""number", "date", "sig_check", "missing_line", "action", "success", "serial"
                          "%r \n\n%r" % (expected_csv, result_csv))
 
         return
+
+    def test_keyset_search(self):
+        """
+        Verify the keyset paging and date range parameters are passed to
+        the searchQuery and the cursor of the next page is returned
+        """
+        from linotp.lib.audit.iterator import (AuditQuery, JSONAuditIterator)
+
+        param = {
+            'rp': u'2',
+            'sortorder': u'desc',
+            'cursor': u'770',
+            'count': u'estimate',
+            'from': u'2014-04-25',
+            'to': u'2014-04-25 12:00:00',
+            'serial': u'LSSP000120D8',
+            }
+
+        rows = [{'number': 768L, 'date': '2014-04-25 11:52:54.243084'},
+                {'number': 764L, 'date': '2014-04-25 11:52:24.937293'}]
+
+        audit = MagicMock(spec=["searchQuery", "getTotal"])
+        audit.searchQuery.return_value = iter(rows)
+        audit.getTotal.return_value = 1000
+
+        audit_query = AuditQuery(param, audit, columns=['number', 'date'])
+        result_json = "".join(JSONAuditIterator(audit_query))
+
+        audit.searchQuery.assert_called_once_with(
+            {u'from': u'2014-04-25',
+             u'to': u'2014-04-25 12:00:00',
+             u'serial': u'LSSP000120D8',
+             u'rp': u'2',
+             u'sortorder': u'desc'},
+            rp_dict={
+                'sortorder': u'desc',
+                'rp': '2',
+                'cursor': u'770',
+                'sortname': None
+                }
+            )
+
+        audit.getTotal.assert_called_once_with(
+            {u'from': u'2014-04-25',
+             u'to': u'2014-04-25 12:00:00',
+             u'serial': u'LSSP000120D8',
+             u'rp': u'2',
+             u'sortorder': u'desc'},
+            estimate=True)
+
+        result = json.loads(result_json)
+        self.assertEqual(result['cursor'], 764)
+        self.assertEqual(result['total'], 1000)
+        self.assertEqual([row['id'] for row in result['rows']], [768, 764])
+
+    def test_parallel_verify(self):
+        """
+        Verify that in the parallel verify mode the rows are verified in
+        batches and the server side cursor is requested
+        """
+        from linotp.lib.audit import iterator
+        from linotp.lib.audit.iterator import (AuditQuery, CSVAuditIterator)
+
+        rows = ['row_%d' % i for i in range(5)]
+
+        def verify_rows(batch):
+            return [{'number': int(row[4:]), 'sig_check': 'OK'}
+                    for row in batch]
+
+        audit = MagicMock(spec=["searchQuery", "getTotal", "verifyRows"])
+        audit.searchQuery.return_value = iter(rows)
+        audit.verifyRows.side_effect = verify_rows
+
+        param = {'verify': u'parallel', 'stream': u'true'}
+
+        batch_size = iterator.VERIFY_BATCH_SIZE
+        iterator.VERIFY_BATCH_SIZE = 2
+        try:
+            audit_query = AuditQuery(param, audit,
+                                     columns=['number', 'sig_check'])
+            result_csv = "".join(CSVAuditIterator(audit_query, ','))
+        finally:
+            iterator.VERIFY_BATCH_SIZE = batch_size
+
+        self.assertEqual(result_csv,
+                         '0, "OK"\n1, "OK"\n2, "OK"\n3, "OK"\n4, "OK"\n\n')
+
+        self.assertEqual(audit.verifyRows.call_count, 3)
+        self.assertTrue(audit.searchQuery.call_args[1]['rp_dict']['stream'])
+
+    def test_deferred_verify(self):
+        """
+        Verify that without verification the signature is exported
+        """
+        from linotp.lib.audit.iterator import AuditQuery
+
+        audit = MagicMock(spec=["searchQuery", "getTotal", "row2dict"])
+        audit.row2dict.return_value = {'number': 1, 'sig_check': '',
+                                       'signature': 'abcd'}
+
+        audit_query = AuditQuery({'verify': u'false'}, audit)
+        self.assertEqual(audit_query.get_headers()[-1], 'signature')
+
+        entry = audit_query.get_entry('row')
+        audit.row2dict.assert_called_once_with('row', verify=False)
+        self.assertEqual(entry['cell'][-1], 'abcd')
+
+        with self.assertRaises(ValueError):
+            AuditQuery({'verify': u'later'}, audit)
+
+    def test_invalid_cursor(self):
+        """
+        Verify that a non numeric cursor is rejected
+        """
+        from linotp.lib.audit.iterator import AuditQuery
+
+        audit = MagicMock(spec=["searchQuery", "getTotal"])
+
+        with self.assertRaises(ValueError):
+            AuditQuery({'cursor': u'1 or 1=1'}, audit)
@@ -0,0 +1,104 @@
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+unit test for the batch signature verification of the sql audit
+"""
+
+import multiprocessing
+import unittest
+
+from mock import MagicMock
+from mock import patch
+
+from linotp.lib.audit.SQLAudit import Audit
+
+
+class TestVerifyRows(unittest.TestCase):
+
+    def setUp(self):
+
+        # the audit is not initialized, as no db and no keys are required
+
+        self.audit = Audit.__new__(Audit)
+        self.audit.verify_pool = None
+        self.audit.verify_processes = 2
+        self.audit.verify_timeout = 1.0
+
+        self.rows = [{'id': i, 'signature': 'sig%d' % i} for i in range(5)]
+
+        patches = [
+            patch.object(Audit, 'row2dict',
+                         side_effect=lambda row, verify: dict(row)),
+            patch.object(Audit, '_verify', return_value=1),
+        ]
+
+        for _patch in patches:
+            _patch.start()
+            self.addCleanup(_patch.stop)
+
+    def sig_checks(self):
+        return [line['sig_check'] for line in self.audit.verifyRows(self.rows)]
+
+    def test_parallel(self):
+        """
+        the signatures are verified by the verify pool
+        """
+
+        pool = MagicMock()
+        pool.map_async.return_value.get.return_value = [
+            [True, False], [True, True], [True]]
+        self.audit.verify_pool = pool
+
+        self.assertEqual(self.sig_checks(),
+                         ['OK', 'FAIL', 'OK', 'OK', 'OK'])
+
+        pool.map_async.return_value.get.assert_called_with(1.0)
+        self.assertFalse(Audit._verify.called)
+
+    def test_serial_without_pool(self):
+        """
+        without verify pool the signatures are verified serially
+        """
+
+        self.assertEqual(self.sig_checks(), ['OK'] * 5)
+        self.assertEqual(Audit._verify.call_count, 5)
+
+    def test_stuck_pool(self):
+        """
+        if the pool does not answer in time, the signatures are verified
+        serially and the pool is not used anymore
+        """
+
+        pool = MagicMock()
+        pool.map_async.return_value.get.side_effect = \
+            multiprocessing.TimeoutError()
+        self.audit.verify_pool = pool
+
+        self.assertEqual(self.sig_checks(), ['OK'] * 5)
+
+        self.assertTrue(pool.terminate.called)
+        self.assertIsNone(self.audit.verify_pool)
+
+# eof #
@@ -0,0 +1,127 @@
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+unit test for the batched background audit writer
+"""
+
+import threading
+import unittest
+
+from linotp.lib.audit.writer import AuditQueueFull
+from linotp.lib.audit.writer import BatchWriter
+
+
+class TestBatchWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.batches = []
+
+    def write_batch(self, batch):
+        self.batches.append(list(batch))
+
+    def test_batching(self):
+        """ entries are written in batches of at most the batch size """
+
+        writer = BatchWriter(self.write_batch, batch_size=10,
+                             flush_interval=0.05)
+        writer.start()
+
+        for i in range(25):
+            writer.put(i)
+
+        writer.flush()
+        writer.stop()
+
+        written = [entry for batch in self.batches for entry in batch]
+        self.assertEqual(written, range(25))
+        self.assertTrue(all(len(batch) <= 10 for batch in self.batches))
+
+    def test_stop_writes_queued_entries(self):
+        """ on stop all queued entries are written """
+
+        writer = BatchWriter(self.write_batch, batch_size=100,
+                             flush_interval=0.5)
+
+        # queue the entries before the writer is running
+        for i in range(5):
+            writer.put(i)
+
+        writer.start()
+        writer.stop(timeout=10)
+
+        written = [entry for batch in self.batches for entry in batch]
+        self.assertEqual(written, range(5))
+
+        with self.assertRaises(AuditQueueFull):
+            writer.put(6)
+
+    def test_queue_full(self):
+        """ a full queue blocks the put for the timeout and then raises """
+
+        release = threading.Event()
+
+        def blocking_write(batch):
+            release.wait()
+            self.batches.append(batch)
+
+        writer = BatchWriter(blocking_write, queue_size=2, batch_size=1,
+                             flush_interval=0.01, put_timeout=0.05)
+        writer.start()
+
+        # the first entry is taken by the blocked writer
+        writer.put(1)
+        writer.put(2)
+        writer.put(3)
+
+        with self.assertRaises(AuditQueueFull):
+            writer.put(4)
+
+        release.set()
+        writer.flush()
+        writer.stop()
+
+        written = [entry for batch in self.batches for entry in batch]
+        self.assertEqual(sorted(written), [1, 2, 3])
+
+    def test_write_failure(self):
+        """ a failing batch write does not stop the writer """
+
+        def failing_write(batch):
+            if 1 in batch:
+                raise Exception('database gone')
+            self.batches.append(batch)
+
+        writer = BatchWriter(failing_write, batch_size=1,
+                             flush_interval=0.01)
+        writer.start()
+
+        writer.put(1)
+        writer.put(2)
+        writer.flush()
+        writer.stop()
+
+        self.assertEqual(self.batches, [[2]])
+
+# eof #
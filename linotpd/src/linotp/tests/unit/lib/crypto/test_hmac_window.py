@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+"""
+unit test for the decrypt once evaluation of an otp window
+"""
+
+import binascii
+import os
+import tempfile
+import unittest
+
+from mock import patch
+
+from linotp.lib.crypto import SecretObj
+from linotp.lib.HMAC import HmacOtp
+from linotp.lib.security.default import DefaultSecurityModule
+from linotp.lib.security.default import KeyFileCache
+
+# the rfc 4226 test vectors
+SEED = '12345678901234567890'
+OTPS = ['755224', '287082', '359152', '969429', '338314',
+        '254676', '287922', '162583', '399871', '520489']
+
+
+class TestHmacWindow(unittest.TestCase):
+
+    def setUp(self):
+
+        key_file = tempfile.NamedTemporaryFile(delete=False)
+        key_file.write(os.urandom(32 * 3))
+        key_file.close()
+
+        self.key_file = key_file.name
+        self.hsm = DefaultSecurityModule({'file': self.key_file})
+
+        self.patch_hsm = patch('linotp.lib.crypto._get_hsm_obj_from_context')
+        get_hsm = self.patch_hsm.start()
+        get_hsm.return_value = self.hsm
+
+        iv = os.urandom(16)
+        enc_seed = self.hsm.encrypt(binascii.hexlify(SEED), iv)
+        self.sec_obj = SecretObj(enc_seed, iv, preserve=False)
+
+    def tearDown(self):
+        self.patch_hsm.stop()
+        KeyFileCache.clear_all()
+        os.unlink(self.key_file)
+
+    def test_window(self):
+        """
+        the window otps are the same as the counter by counter ones
+        """
+
+        hotp = HmacOtp(self.sec_obj, counter=0, digits=6)
+
+        with patch.object(self.hsm, 'decrypt',
+                          wraps=self.hsm.decrypt) as decrypt:
+
+            otps = hotp.window(0, 10)
+            self.assertEqual(decrypt.call_count, 1)
+
+        self.assertEqual(otps, list(enumerate(OTPS)))
+        self.assertEqual(hotp.generate(7, inc_counter=False), OTPS[7])
+
+        # the key is not preserved after the window evaluation
+        self.assertFalse(getattr(self.sec_obj, 'bkey', None))
+
+    def test_check_otp(self):
+        """
+        check an otp within the window with one decryption
+        """
+
+        hotp = HmacOtp(self.sec_obj, counter=2, digits=6)
+
+        with patch.object(self.hsm, 'decrypt',
+                          wraps=self.hsm.decrypt) as decrypt:
+
+            self.assertEqual(hotp.checkOtp(OTPS[5], 5), 5)
+            self.assertEqual(decrypt.call_count, 1)
+
+        self.assertEqual(hotp.counter, 6)
+
+        # outside of the window and symetric lookup
+        hotp = HmacOtp(self.sec_obj, counter=2, digits=6)
+        self.assertEqual(hotp.checkOtp(OTPS[9], 5), -1)
+        self.assertEqual(hotp.counter, 7)
+
+        hotp = HmacOtp(self.sec_obj, counter=4, digits=6)
+        self.assertEqual(hotp.checkOtp(u'254676', 2, symetric=True), 5)
+        self.assertEqual(hotp.checkOtp('12345', 2, symetric=True), -1)
+
+# eof #
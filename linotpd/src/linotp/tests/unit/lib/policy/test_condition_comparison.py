@@ -30,7 +30,14 @@ import unittest
 from nose.tools import raises
 
 from datetime import datetime
+from datetime import timedelta
 
+from netaddr import AddrFormatError
+
+from linotp.lib.policy.evaluate import _compare_cron_value
+from linotp.lib.policy.evaluate import compile_cron
+from linotp.lib.policy.evaluate import compile_ip_conditions
+from linotp.lib.policy.evaluate import match_cron
 from linotp.lib.policy.evaluate import time_list_compare
 from linotp.lib.policy.evaluate import user_list_compare
 from linotp.lib.policy.evaluate import ip_list_compare
@@ -160,6 +167,102 @@ class TestCompare(unittest.TestCase):
         self.assertFalse(
             ip_list_compare(ip_conditions, '192.168.16.152'))
 
+    def test_ip_ranges_compare(self):
+        """
+        test the ip comparison with the compiled network ranges
+        """
+
+        ip_conditions = (
+            # overlapping and adjacent networks
+            '10.0.0.0/24, 10.0.0.128/25, 10.0.1.0/24, 172.16.0.0/12, '
+            # ipv6 network
+            '2001:db8::/32, '
+            # but not this one
+            '-10.0.1.17, !2001:db8:1::/48')
+
+        compiled = compile_ip_conditions(ip_conditions)
+        self.assertIsInstance(compiled, tuple)
+
+        for client, allowed in [('10.0.0.1', True),
+                                ('10.0.1.255', True),
+                                ('10.0.1.17', False),
+                                ('10.0.2.0', False),
+                                ('9.255.255.255', False),
+                                ('172.31.255.255', True),
+                                ('172.32.0.0', False),
+                                ('2001:db8::1', True),
+                                ('2001:db8:1::1', False),
+                                ('::ffff:10.0.0.1', False)]:
+
+            self.assertEqual(ip_list_compare(ip_conditions, client), allowed,
+                             client)
+
+        # a wildcard not condition denies all clients
+
+        self.assertFalse(ip_list_compare('10.0.0.0/8, -*', '10.0.0.1'))
+
+        # no conditions match no client
+
+        self.assertFalse(ip_list_compare(' , ', '10.0.0.1'))
+
+        # an invalid condition is reported, when it is evaluated
+
+        self.assertFalse(ip_list_compare('-10.0.0.1, 10.0.0.300',
+                                         '10.0.0.1'))
+
+        with self.assertRaises(AddrFormatError):
+            ip_list_compare('10.0.0.300, 10.0.0.1', '10.0.0.1')
+
+    def test_compiled_cron(self):
+        """
+        the compiled cron members match like the cron values
+        """
+
+        cron_conditions = [
+            '*/15 */6 1,15,31 * 1-5 *',
+            '0 12 * * 1-5 *',
+            '5,10-20,*/7 7-17 * 2-3,12 0,6 2015-2020',
+            '* * * * * 1969,*/500',
+            ]
+
+        start = datetime(2016, 12, 14, 0, 0)
+
+        for condition in cron_conditions:
+
+            cron_parts = [part for part in condition.split(' ') if part]
+            compiled = compile_cron(condition)
+
+            for days in range(0, 900, 37):
+                for minutes in range(0, 24 * 60, 13):
+
+                    now = start + timedelta(days=days, minutes=minutes)
+                    weekday = now.isoweekday() % 7
+
+                    expected = all(
+                        _compare_cron_value(value, target) for value, target
+                        in zip(cron_parts, [now.minute, now.hour, now.day,
+                                            now.month, weekday, now.year]))
+
+                    self.assertEqual(match_cron(compiled, now), expected,
+                                     (condition, now))
+
+        # years outside of the compiled range are compared as well
+
+        self.assertTrue(match_cron(compile_cron('* * * * * */500'),
+                                   datetime(2500, 1, 1)))
+
+        self.assertFalse(match_cron(compile_cron('* * * * * 2016'),
+                                    datetime(2116, 1, 1)))
+
+    @raises(ValueError)
+    def test_invalid_cron_value(self):
+        """
+        an invalid cron value is reported, when it is evaluated
+        """
+
+        compiled = compile_cron('* */x * * * *')
+        match_cron(compiled, datetime(2016, 12, 14, 15, 30))
+
     def test_user_compare(self):
         """
         test the user list comparison method
@@ -0,0 +1,179 @@
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+""" unit test for the shared policy index """
+
+import unittest
+
+from copy import deepcopy
+from datetime import datetime
+
+from linotp.lib.policy.evaluate import PolicyEvaluator
+from linotp.lib.policy.index import PolicyIndex
+from linotp.lib.policy.index import get_policy_index
+from linotp.lib.policy.util import parse_policies
+
+
+def policy_config(policies):
+    """
+    create the config entries for the given policy definitions
+    """
+    config = {}
+    for name, policy in policies.items():
+        for key, value in policy.items():
+            config['linotp.Policy.%s.%s' % (name, key)] = value
+    return config
+
+
+class VersionedConfig(dict):
+    snapshot_version = None
+
+
+Policies = {
+    'admin_all': {
+        'scope': 'admin', 'action': '*', 'realm': '*',
+        'user': 'superadmin', 'client': '', 'time': '', 'active': 'True'},
+    'admin_realm': {
+        'scope': 'admin', 'action': 'enable, disable', 'realm': 'myRealm',
+        'user': 'admin', 'client': '192.168.0.0/24', 'time': '',
+        'active': 'True'},
+    'otppin': {
+        'scope': 'authentication', 'action': 'otppin=1, passthru',
+        'realm': 'myrealm, !other', 'user': '*',
+        'client': '10.0.0.0/8, !10.1.2.3', 'time': '', 'active': 'True'},
+    'inactive': {
+        'scope': 'authentication', 'action': 'otppin=2',
+        'realm': '*', 'user': '*', 'client': '', 'time': '',
+        'active': 'False'},
+    'office_hours': {
+        'scope': 'authentication', 'action': 'passOnNoToken',
+        'realm': 'myrealm', 'user': '*', 'client': '',
+        'time': '* 8-17 * * 1-5 *;', 'active': 'True'},
+}
+
+
+class TestPolicyIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.config = policy_config(Policies)
+
+    def evaluate(self, policies, params):
+        policy_eval = PolicyEvaluator(policies)
+        policy_eval.set_filters(params)
+        return policy_eval.evaluate()
+
+    def test_same_result_as_plain_evaluation(self):
+        """
+        the index evaluation returns the same policies as the evaluation
+        on the plain policy dict
+        """
+
+        policy_index = get_policy_index(self.config)
+
+        requests = [
+            {'scope': 'admin'},
+            {'scope': 'admin', 'action': 'enable'},
+            {'scope': 'admin', 'action': 'enable', 'realm': 'MyRealm'},
+            {'scope': 'admin', 'action': 'unassign', 'realm': 'myrealm'},
+            {'scope': 'authentication', 'action': 'otppin',
+             'active': True},
+            {'scope': 'authentication', 'action': 'otppin',
+             'active': False},
+            {'scope': 'authentication', 'realm': 'other'},
+            {'scope': 'authentication', 'client': '10.1.2.3'},
+            {'scope': 'authentication', 'client': '10.1.2.4'},
+            {'scope': 'admin', 'client': '192.168.0.12'},
+            {'name': 'otppin'},
+            {'name': 'unknown'},
+            {'action': 'passthru', 'client': '10.0.0.1', 'realm': 'MYREALM'},
+        ]
+
+        for params in requests:
+            plain = self.evaluate(parse_policies(self.config), params)
+            indexed = self.evaluate(policy_index, params)
+
+            self.assertEqual(sorted(plain.keys()), sorted(indexed.keys()),
+                             params)
+
+    def test_time_filter(self):
+        """
+        the prepared time conditions are evaluated on the given time
+        """
+
+        policy_index = get_policy_index(self.config)
+
+        for now, expected in [(datetime(2018, 3, 14, 10, 0), True),
+                              (datetime(2018, 3, 14, 19, 0), False),
+                              (datetime(2018, 3, 17, 10, 0), False)]:
+
+            policy_eval = PolicyEvaluator(policy_index)
+            policy_eval.filter_for_action('passOnNoToken')
+            policy_eval.filter_for_time(now)
+
+            self.assertEqual('office_hours' in policy_eval.evaluate(),
+                             expected)
+
+    def test_index_is_shared_per_version(self):
+        """
+        the index is shared as long as the config version does not change
+        """
+
+        config = VersionedConfig(self.config)
+        config.snapshot_version = 100
+
+        policy_index = get_policy_index(config)
+        self.assertIs(policy_index, get_policy_index(config))
+
+        # a new config version creates a new index
+
+        new_config = VersionedConfig(self.config)
+        new_config['linotp.Policy.otppin.active'] = 'False'
+        new_config.snapshot_version = 101
+
+        new_index = get_policy_index(new_config)
+        self.assertIsNot(policy_index, new_index)
+        self.assertEqual(new_index['otppin']['active'], 'False')
+        self.assertEqual(policy_index['otppin']['active'], 'True')
+
+        # plain configs without version are not shared
+
+        self.assertIsNot(get_policy_index(self.config),
+                         get_policy_index(self.config))
+
+    def test_copy_of_the_index(self):
+        """
+        the copy of the index is a plain policy dict and the evaluation
+        without filters does not return the shared index
+        """
+
+        policy_index = PolicyIndex({'a': {'scope': 'admin'}})
+
+        policies = deepcopy(policy_index)
+        self.assertEqual(type(policies), dict)
+        self.assertEqual(policies, {'a': {'scope': 'admin', 'name': 'a'}})
+
+        self.assertIsNot(PolicyEvaluator(policy_index).evaluate(),
+                         policy_index)
+
+# eof #
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+
+"""
+unit test for the cache of the policy user condition matches
+"""
+
+import time
+import unittest
+
+from mock import patch
+
+from linotp.lib.context import request_context
+from linotp.lib.context import request_context_safety
+from linotp.lib.policy.evaluate import user_list_compare
+from linotp.lib.policy.filter import AttributeCompare
+from linotp.lib.policy.user_match import _user_match_cache
+from linotp.lib.user import User
+
+
+class FakePolicies(dict):
+
+    def __init__(self, version):
+        super(FakePolicies, self).__init__()
+        self.version = version
+
+
+class TestUserMatchCache(unittest.TestCase):
+
+    condition = u'#email ~= example.com, passthru.myResolver:'
+
+    def setUp(self):
+
+        self.user = User(u'hans', u'myrealm')
+
+        self.config = {}
+
+        self.compare = patch.object(AttributeCompare, 'compare',
+                                    return_value=True)
+        self.attr_compare = self.compare.start()
+
+        _user_match_cache.clear()
+
+    def tearDown(self):
+
+        self.compare.stop()
+
+        _user_match_cache.clear()
+
+    def setup_request(self, version=1):
+
+        request_context['Config'] = self.config
+        request_context['Policies'] = FakePolicies(version)
+
+    def test_request_cache(self):
+        """
+        the user conditions are evaluated once per request
+        """
+
+        with request_context_safety():
+
+            self.setup_request()
+
+            for _i in range(5):
+                self.assertTrue(user_list_compare(self.condition, self.user))
+
+            # both user conditions require a user lookup
+
+            self.assertEqual(self.attr_compare.call_count, 2)
+
+            statistics = request_context['PolicyUserMatches'].\
+                get_statistics()
+
+            self.assertEqual(statistics, {'lookups': 2, 'hits': 4,
+                                          'shared_hits': 0, 'misses': 1})
+
+            # other user, other result
+
+            user_list_compare(self.condition, User(u'emma', u'myrealm'))
+            self.assertEqual(self.attr_compare.call_count, 4)
+
+            # a new policy version requires a new evaluation
+
+            request_context['Policies'] = FakePolicies(2)
+
+            user_list_compare(self.condition, self.user)
+            self.assertEqual(self.attr_compare.call_count, 6)
+
+        # the next request evaluates the conditions again
+
+        with request_context_safety():
+
+            self.setup_request(version=2)
+
+            user_list_compare(self.condition, self.user)
+            self.assertEqual(self.attr_compare.call_count, 8)
+
+    def test_shared_cache(self):
+        """
+        with the shared cache, the results are used across the requests
+        until they expire
+        """
+
+        self.config['linotp.policy_user_match_cache.enabled'] = 'True'
+        self.config['linotp.policy_user_match_cache.expiration'] = '30'
+
+        with request_context_safety():
+
+            self.setup_request()
+            user_list_compare(self.condition, self.user)
+
+        with request_context_safety():
+
+            self.setup_request()
+            user_list_compare(self.condition, self.user)
+
+            self.assertEqual(self.attr_compare.call_count, 2)
+            self.assertEqual(request_context['PolicyUserMatches'].
+                             get_statistics()['shared_hits'], 1)
+
+        with patch('linotp.lib.policy.user_match.time') as mock_time:
+
+            mock_time.time.return_value = time.time() + 31
+
+            with request_context_safety():
+
+                self.setup_request()
+                user_list_compare(self.condition, self.user)
+
+        self.assertEqual(self.attr_compare.call_count, 4)
+
+    def test_no_request(self):
+        """
+        outside of a request nothing is cached
+        """
+
+        user_list_compare(self.condition, self.user)
+        user_list_compare(self.condition, self.user)
+
+        self.assertEqual(self.attr_compare.call_count, 4)
+
+# eof #
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+
+
+
+import os
+import tempfile
+import unittest
+
+from mock import patch
+
+from linotp.lib.crypto import zerome
+from linotp.lib.security.default import KeyFileCache
+from linotp.lib.security.default import DefaultSecurityModule
+
+
+class TestKeyFileCache(unittest.TestCase):
+    """
+    Unit test for the in-memory key cache of the default security module
+    """
+
+    def setUp(self):
+
+        self.keys = os.urandom(32 * 3)
+
+        key_file = tempfile.NamedTemporaryFile(delete=False)
+        key_file.write(self.keys)
+        key_file.close()
+
+        self.key_file = key_file.name
+
+    def tearDown(self):
+        os.unlink(self.key_file)
+
+    def test_get_secret(self):
+        """
+        the keys of the slots are returned as copies
+        """
+
+        cache = KeyFileCache(self.key_file)
+
+        secret = cache.get_secret(1)
+        self.assertEqual(secret, self.keys[32:64])
+
+        # zeroing the returned key must not touch the cached key
+
+        zerome(secret)
+        self.assertEqual(cache.get_secret(1), self.keys[32:64])
+
+        with self.assertRaises(Exception):
+            cache.get_secret(3)
+
+        cache.clear()
+
+    def test_reload_on_modification(self):
+        """
+        a modified key file is reloaded
+        """
+
+        cache = KeyFileCache(self.key_file, check_interval=0)
+        self.assertEqual(cache.get_secret(0), self.keys[0:32])
+
+        new_keys = os.urandom(32 * 4)
+        with open(self.key_file, 'wb') as key_file:
+            key_file.write(new_keys)
+
+        self.assertEqual(cache.get_secret(0), new_keys[0:32])
+        self.assertEqual(cache.get_secret(3), new_keys[96:128])
+
+        cache.clear()
+
+    def test_short_read(self):
+        """
+        a key file, which is shorter than expected, keeps the read keys
+        """
+
+        stat = os.stat(self.key_file)
+
+        class LargerStat(object):
+            st_ino = stat.st_ino
+            st_size = stat.st_size + 32
+            st_mtime = stat.st_mtime
+
+        cache = KeyFileCache(self.key_file)
+
+        with patch('linotp.lib.security.default.os.stat',
+                   return_value=LargerStat()):
+            self.assertEqual(cache.get_secret(0), self.keys[0:32])
+            self.assertEqual(cache.get_secret(2), self.keys[64:96])
+
+        cache.clear()
+
+    def test_removed_key_file(self):
+        """
+        the loaded keys stay valid, if the key file is removed
+        """
+
+        cache = KeyFileCache(self.key_file, check_interval=0)
+        self.assertEqual(cache.get_secret(0), self.keys[0:32])
+
+        fixed_cache = KeyFileCache(self.key_file, check_interval=0,
+                                   reload_keys=False)
+        self.assertEqual(fixed_cache.get_secret(0), self.keys[0:32])
+
+        os.unlink(self.key_file)
+
+        self.assertEqual(cache.get_secret(1), self.keys[32:64])
+
+        with patch('linotp.lib.security.default.os.stat') as mock_stat:
+            self.assertEqual(fixed_cache.get_secret(1), self.keys[32:64])
+            self.assertFalse(mock_stat.called)
+
+        # restore the key file for the tearDown
+
+        with open(self.key_file, 'wb') as key_file:
+            key_file.write(self.keys)
+
+        cache.clear()
+        fixed_cache.clear()
+
+    def test_security_module_encrypt_decrypt(self):
+        """
+        the security module works on the shared key cache
+        """
+
+        config = {'file': self.key_file}
+
+        module_1 = DefaultSecurityModule(config)
+        module_2 = DefaultSecurityModule(config)
+
+        self.assertIs(module_1.key_cache, module_2.key_cache)
+
+        crypted_pin = module_1.encryptPin('1234')
+        self.assertEqual(module_2.decryptPin(crypted_pin), '1234')
+        self.assertEqual(module_1.decryptPin(crypted_pin), '1234')
+
+        KeyFileCache.clear_all()
+
+# eof #
@@ -0,0 +1,108 @@
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+unit test for the indexed challenge status column and its migration
+"""
+
+import json
+import unittest
+
+import sqlalchemy as sa
+
+from linotp.model import Challenge
+from linotp.model.migrate import run_data_model_migration
+from linotp.model.migrate import has_column
+from linotp.model.migrate import has_index
+
+
+class Meta(object):
+
+    def __init__(self, engine):
+        self.engine = engine
+
+
+class TestChallengeStatus(unittest.TestCase):
+
+    def test_status_follows_session(self):
+        """
+        the status column is set with every session update
+        """
+
+        challenge = Challenge(transid=u'123456789012', tokenserial=u'TOK1')
+        self.assertEqual(challenge.status, u'open')
+
+        challenge.setSession(json.dumps({'status': 'open', 'mac': 'x'}))
+        self.assertEqual(challenge.status, u'open')
+
+        challenge.close()
+        self.assertEqual(challenge.status, u'closed')
+        self.assertEqual(challenge.getStatus(), 'closed')
+
+        challenge.add_session_info({'reject': True})
+        self.assertEqual(challenge.status, u'closed')
+
+        challenge.session = 'not a json'
+        self.assertEqual(challenge.status, u'open')
+
+    def test_migration(self):
+        """
+        the migration adds and fills the status column from the session info
+        """
+
+        engine = sa.create_engine('sqlite://')
+        engine.execute(
+            "CREATE TABLE challenges (id INTEGER PRIMARY KEY, "
+            "transid VARCHAR(64), session VARCHAR(512), "
+            "timestamp DATETIME, lchallenge VARCHAR(2000), "
+            "ptransid VARCHAR(64))")
+
+        sessions = [
+            json.dumps({'status': 'open', 'mac': 'x'}),
+            json.dumps({'status': 'closed', 'mac': 'x'}),
+            '',
+        ]
+        for i, session in enumerate(sessions):
+            engine.execute(
+                "INSERT INTO challenges (id, transid, session) "
+                "VALUES (?, ?, ?)", (i, 'trans%d' % i, session))
+
+        meta = Meta(engine)
+        run_data_model_migration(meta, target_version='2.10.1.0')
+
+        self.assertTrue(has_column(meta, 'challenges', sa.Column('status')))
+        self.assertTrue(has_index(meta, 'challenges', sa.Column('status')))
+        self.assertTrue(has_index(meta, 'challenges',
+                                  sa.Column('timestamp')))
+
+        rows = engine.execute(
+            "SELECT id, status FROM challenges ORDER BY id").fetchall()
+        self.assertEqual([row[1] for row in rows],
+                         [u'open', u'closed', u'open'])
+
+        # running the migration again does not harm
+
+        run_data_model_migration(meta, target_version='2.10.1.0')
+
+# eof #
@@ -28,8 +28,10 @@
 Test lib challenge methods
 """
 
+import datetime
 import unittest
 from mock import patch
+from mock import MagicMock
 from linotp.lib.challenges import Challenges
 
 
@@ -55,3 +57,59 @@ class TestChallengesTransactionidLength(unittest.TestCase):
                 Challenges.get_tranactionid_length()
 
             self.assertEqual(wrong_range.exception.message, wrong_range_message)
+
+
+class FakeChallenge(object):
+
+    def __init__(self, serial, age):
+        self.tokenserial = serial
+        self.timestamp = datetime.datetime.now() - datetime.timedelta(
+                                                                seconds=age)
+
+    def get(self, key):
+        return getattr(self, key)
+
+
+def fake_token(serial, validity):
+    token = MagicMock()
+    token.getSerial.return_value = serial
+    token.get_challenge_validity.return_value = validity
+    return token
+
+
+class TestChallengesExpiry(unittest.TestCase):
+
+    @patch('linotp.lib.token.getTokens4UserOrSerial')
+    @patch('linotp.lib.challenges.Challenges.lookup_challenges')
+    def test_validity_from_loaded_tokens(self, mock_lookup, mock_get_tokens):
+        """
+        the challenge validity is taken from the given tokens without
+        reloading a token per challenge
+        """
+
+        token_1 = fake_token('TOK1', 120)
+        token_2 = fake_token('TOK2', 10)
+
+        fresh_1 = FakeChallenge('TOK1', 60)
+        old_1 = FakeChallenge('TOK1', 600)
+        fresh_2 = FakeChallenge('TOK2', 5)
+        old_2 = FakeChallenge('TOK2', 60)
+
+        mock_lookup.return_value = [fresh_1, old_1, fresh_2, old_2]
+
+        expired, valid = Challenges.get_challenges(transid='123456789012',
+                                                   tokens=[token_1, token_2])
+
+        self.assertEqual(expired, [old_1, old_2])
+        self.assertEqual(valid, [fresh_1, fresh_2])
+
+        self.assertFalse(mock_get_tokens.called)
+        self.assertEqual(token_1.get_challenge_validity.call_count, 1)
+
+        # an unknown token is loaded only once
+
+        mock_get_tokens.return_value = [token_2]
+
+        Challenges.get_challenges(transid='123456789012', tokens=[token_1])
+
+        self.assertEqual(mock_get_tokens.call_count, 1)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+"""
+unit test for the copy on write config snapshots of the app_globals
+"""
+
+import unittest
+
+from linotp.lib.app_globals import Globals
+
+
+class TestConfigSnapshot(unittest.TestCase):
+
+    def test_snapshot_is_shared(self):
+        """
+        the snapshot is handed out without copy until the config changes
+        """
+
+        glo = Globals()
+        glo.setConfig({'linotp.a': '1', 'linotp.b': '2'})
+
+        snapshot = glo.getConfigSnapshot()
+        self.assertIs(snapshot, glo.getConfigSnapshot())
+        self.assertEqual(snapshot.get('linotp.a'), '1')
+        self.assertEqual(len(snapshot), 2)
+
+        glo.setConfig({'linotp.a': '3'})
+
+        # the former snapshot is not touched by the change
+
+        new_snapshot = glo.getConfigSnapshot()
+        self.assertIsNot(snapshot, new_snapshot)
+        self.assertEqual(snapshot.get('linotp.a'), '1')
+        self.assertEqual(new_snapshot.get('linotp.a'), '3')
+        self.assertEqual(new_snapshot.get('linotp.b'), '2')
+        self.assertTrue(new_snapshot.version > snapshot.version)
+
+    def test_replace_and_delete(self):
+        """
+        replace and delete create new snapshots as well
+        """
+
+        glo = Globals()
+        glo.setConfig({'linotp.a': '1', 'linotp.b': '2'})
+        snapshot = glo.getConfigSnapshot()
+
+        glo.delConfig('linotp.a')
+        self.assertNotIn('linotp.a', glo.getConfigSnapshot())
+        self.assertIn('linotp.a', snapshot)
+
+        glo.setConfig({'linotp.c': '3'}, replace=True)
+        self.assertEqual(sorted(glo.getConfigSnapshot().keys()),
+                         ['linotp.c'])
+
+    def test_get_config_copy(self):
+        """
+        getConfig still returns a modifiable copy
+        """
+
+        glo = Globals()
+        glo.setConfig({'linotp.a': '1'})
+
+        conf = glo.getConfig()
+        conf['linotp.a'] = '2'
+
+        self.assertEqual(glo.getConfigSnapshot().get('linotp.a'), '1')
+
+        target = {}
+        glo.getConfigSnapshot().copy_into(target)
+        self.assertEqual(target, {'linotp.a': '1'})
+
+        with self.assertRaises(Exception):
+            glo.setConfig(['linotp.a'])
+
+# eof #
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+
+"""
+unit test for the otp lookahead index of the unassigned tokens
+"""
+
+import os
+import tempfile
+import unittest
+
+from mock import patch
+
+import sqlalchemy as sa
+
+from linotp.lib import otp_lookahead
+from linotp.lib.HMAC import HmacOtp
+from linotp.lib.context import request_context
+from linotp.lib.context import request_context_safety
+from linotp.lib.security.default import DefaultSecurityModule
+from linotp.lib.security.default import KeyFileCache
+from linotp.lib.token import TokenHandler
+from linotp.model import OtpLookahead
+from linotp.model import Token
+from linotp.model import init_model
+from linotp.model.meta import Session
+from linotp.model.meta import metadata
+from linotp.tokens.hmactoken import HmacTokenClass
+
+SEEDS = ['3132333435363738393031323334353637383930',
+         '3132333435363738393031323334353637383931',
+         '3132333435363738393031323334353637383932']
+
+
+class TestOtpLookahead(unittest.TestCase):
+
+    def setUp(self):
+
+        self.engine = sa.create_engine('sqlite://')
+        init_model(self.engine)
+        metadata.create_all(self.engine)
+
+        key_file = tempfile.NamedTemporaryFile(delete=False)
+        key_file.write(os.urandom(32 * 4))
+        key_file.close()
+        self.key_file = key_file.name
+
+        self.request_context = request_context_safety()
+        self.request_context.__enter__()
+
+        request_context['hsm'] = {
+            'obj': DefaultSecurityModule({'file': self.key_file})}
+
+        self.config = {'otp_lookahead.enabled': 'True',
+                       'otp_lookahead.window': '20'}
+
+        self.config_patch = patch('linotp.lib.config.getLinotpConfig',
+                                  return_value=self.config)
+        self.config_patch.start()
+
+        self.tokens = []
+        for i, seed in enumerate(SEEDS):
+            token = HmacTokenClass(Token(u'LOOK%02d' % i))
+            token.setOtpKey(seed)
+            token.setOtpLen(6)
+            Session.add(token.token)
+            otp_lookahead.update_token(token)
+            self.tokens.append(token)
+
+        Session.commit()
+
+    def tearDown(self):
+
+        Session.remove()
+
+        self.config_patch.stop()
+        self.request_context.__exit__(None, None, None)
+
+        KeyFileCache.clear_all()
+        os.unlink(self.key_file)
+
+    def otp(self, token, counter):
+        hmac_otp = HmacOtp(token._get_secret_object(), digits=6)
+        return hmac_otp.generate(counter=counter, inc_counter=False)
+
+    def test_lookup(self):
+        """
+        the next otp values of the window are found in the index
+        """
+
+        self.assertEqual(Session.query(OtpLookahead).count(), 3 * 20)
+
+        token = self.tokens[1]
+
+        self.assertEqual(
+            otp_lookahead.lookup_serials([self.otp(token, 5)]),
+            set([u'LOOK01']))
+
+        self.assertEqual(
+            otp_lookahead.lookup_serials([self.otp(token, 25)]), set())
+
+    def test_indexed_token_search(self):
+        """
+        only the token, which generates the otp value, is verified
+        """
+
+        th = TokenHandler()
+        otp = self.otp(self.tokens[2], 3)
+
+        tokens = th._get_indexed_tokens([otp], typ=u'hmac', window=10)
+        self.assertEqual([t.getSerial() for t in tokens], [u'LOOK02'])
+
+        token = th.get_token_by_otp(otp=otp, window=10, typ=u'hmac',
+                                    assigned=0)
+        self.assertEqual(token.getSerial(), u'LOOK02')
+
+        # the counter of the found token moved on and the index as well
+
+        self.assertEqual(token.getOtpCount(), 4)
+        self.assertEqual(
+            otp_lookahead.lookup_serials([otp]), set())
+        self.assertEqual(
+            otp_lookahead.lookup_serials([self.otp(self.tokens[2], 23)]),
+            set([u'LOOK02']))
+
+    def test_index_not_usable(self):
+        """
+        without index the unassigned tokens are searched as before
+        """
+
+        th = TokenHandler()
+        otp = self.otp(self.tokens[0], 3)
+
+        # the window exceeds the indexed window
+
+        self.assertIsNone(th._get_indexed_tokens([otp], window=50))
+
+        # the token type is not indexed
+
+        self.assertIsNone(th._get_indexed_tokens([otp], typ=u'totp'))
+
+        self.config['otp_lookahead.enabled'] = 'False'
+
+        with patch.object(TokenHandler, '_get_indexed_tokens') as indexed:
+            token = th.get_token_by_otp(otp=otp, window=10, typ=u'hmac',
+                                        assigned=0)
+            self.assertFalse(indexed.called)
+
+        self.assertEqual(token.getSerial(), u'LOOK00')
+
+    def test_token_without_index_entries(self):
+        """
+        the tokens without index entries are searched as before
+        """
+
+        th = TokenHandler()
+        otp = self.otp(self.tokens[1], 3)
+
+        Session.query(OtpLookahead).filter(
+            OtpLookahead.serial == u'LOOK01').delete()
+        Session.commit()
+
+        tokens = th._get_indexed_tokens([otp], typ=u'hmac', window=10)
+        self.assertEqual([t.getSerial() for t in tokens], [u'LOOK01'])
+
+    def test_index_follows_token_changes(self):
+        """
+        the index entries follow the changes of the otp length, the hash
+        algorithm and the seed of a stored token
+        """
+
+        token = self.tokens[0]
+
+        token.setOtpLen(8)
+        self.assertEqual(
+            otp_lookahead.lookup_serials([self.otp(token, 3)]), set())
+
+        hmac_otp = HmacOtp(token._get_secret_object(), digits=8)
+        otp = hmac_otp.generate(counter=3, inc_counter=False)
+        self.assertEqual(
+            otp_lookahead.lookup_serials([otp]), set([u'LOOK00']))
+
+        token.setHashLib('sha256')
+        self.assertEqual(otp_lookahead.lookup_serials([otp]), set())
+
+        token.setOtpLen(6)
+        token.setOtpKey(SEEDS[1])
+
+        # the token now shares the otp values with the token LOOK01
+
+        self.assertEqual(
+            otp_lookahead.lookup_serials([self.otp(self.tokens[1], 3)]),
+            set([u'LOOK01']))
+
+        token.setHashLib('sha1')
+        self.assertEqual(
+            otp_lookahead.lookup_serials([self.otp(self.tokens[1], 3)]),
+            set([u'LOOK00', u'LOOK01']))
+
+    def test_refresh(self):
+        """
+        the refresh drops the entries of the assigned tokens
+        """
+
+        token = self.tokens[0]
+        token.token.LinOtpUserid = u'1000'
+
+        Session.query(OtpLookahead).delete()
+        Session.commit()
+
+        ret = otp_lookahead.refresh_otp_lookahead(batch_size=1)
+        self.assertEqual(ret, {'indexed': 2})
+
+        self.assertEqual(Session.query(OtpLookahead).count(), 2 * 20)
+        self.assertEqual(
+            otp_lookahead.lookup_serials([self.otp(token, 1)]), set())
+
+# eof #
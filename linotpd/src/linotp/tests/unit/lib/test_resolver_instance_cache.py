@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+
+"""
+unit test for the reuse of the resolver instances across the requests
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from linotp.lib import resolver
+from linotp.lib.resolver import closeResolvers
+from linotp.lib.resolver import getResolverObject
+
+RESOLVER_SPEC = 'useridresolver.PasswdIdResolver.IdResolver.my_users'
+
+
+@patch('linotp.lib.resolver._check_for_resolver_cache_flush')
+class TestResolverInstanceCache(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'passwd')
+
+        with open(self.fileName, 'w') as f:
+            f.write('hans:x:1000:1000:Hans Meier:/home/hans:/bin/bash\n')
+
+        self.config = {
+            'linotp.passwdresolver.fileName.my_users': self.fileName,
+            }
+
+        resolver._evict_resolver_instances(RESOLVER_SPEC)
+
+    def tearDown(self):
+
+        resolver._evict_resolver_instances(RESOLVER_SPEC)
+        shutil.rmtree(self.directory)
+
+    def request(self, config=None):
+        """
+        load the resolver within a request and close the request
+        """
+
+        context = {'resolvers_loaded': {}, 'resolver_versions': {}}
+
+        with patch('linotp.lib.resolver.context', context):
+
+            first = getResolverObject(RESOLVER_SPEC,
+                                      config=config or self.config)
+            second = getResolverObject(RESOLVER_SPEC,
+                                       config=config or self.config)
+
+            self.assertIs(first, second)
+            self.assertEqual(first.getUserId('hans'), '1000')
+
+            closeResolvers()
+
+        return first
+
+    def test_reuse_across_requests(self, _mock_flush):
+
+        first = self.request()
+
+        context = {'resolvers_loaded': {}, 'resolver_versions': {}}
+
+        with patch('linotp.lib.resolver.context', context):
+
+            self.assertIs(getResolverObject(RESOLVER_SPEC, config=self.config),
+                          first)
+
+            closeResolvers()
+
+            # the returned resolver is not used by the request anymore
+            self.assertNotIn(RESOLVER_SPEC, context['resolvers_loaded'])
+
+        self.assertIs(self.request(), first)
+
+    def test_config_change(self, _mock_flush):
+
+        first = self.request()
+
+        config = dict(self.config)
+        config['linotp.passwdresolver.fileName.my_users'] = (
+                                            self.fileName + '/../passwd')
+
+        second = self.request(config=config)
+
+        self.assertIsNot(first, second)
+        self.assertIs(self.request(config=config), second)
+
+    def test_eviction(self, _mock_flush):
+
+        first = self.request()
+
+        resolver._evict_resolver_instances(RESOLVER_SPEC)
+
+        self.assertIsNot(self.request(), first)
+
+    def test_disabled(self, _mock_flush):
+
+        config = dict(self.config)
+        config['linotp.resolver_instance_cache.enabled'] = 'False'
+
+        self.assertIsNot(self.request(config=config),
+                         self.request(config=config))
+
+# eof #
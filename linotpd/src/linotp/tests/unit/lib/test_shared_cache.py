@@ -0,0 +1,179 @@
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+unit test for the shared lookup cache
+"""
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from mock import patch
+
+from linotp.lib import shared_cache
+from linotp.lib.shared_cache import SharedCache
+from linotp.lib.shared_cache import SharedCacheError
+from linotp.lib.shared_cache import secure_cache_file
+
+
+class TestSharedCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'lookup_cache.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_value(self):
+        """ the value is created once and shared with other processes """
+
+        calls = []
+
+        def create():
+            calls.append(1)
+            return (u'hans', u'1000', {'username': u'hans'})
+
+        cache = SharedCache(self.path)
+        namespace = cache.namespace('user_lookup::resolver_1')
+
+        self.assertEqual(namespace.get_value('key', create),
+                         (u'hans', u'1000', {'username': u'hans'}))
+
+        # the values are stored as json
+
+        self.assertEqual(namespace.get_value('key', create),
+                         [u'hans', u'1000', {'username': u'hans'}])
+        self.assertEqual(len(calls), 1)
+
+        self.assertEqual(cache.get_statistics(), {
+            'hits': {'user_lookup::resolver_1': 1},
+            'misses': {'user_lookup::resolver_1': 1}})
+
+        # an other process uses its own cache object on the same file
+        other = SharedCache(self.path).namespace('user_lookup::resolver_1')
+        self.assertEqual(other.get_value('key', create)[0], u'hans')
+        self.assertEqual(len(calls), 1)
+
+    def test_expiration(self):
+        """ expired entries are created again """
+
+        cache = SharedCache(self.path)
+        namespace = cache.namespace('resolvers_lookup::realm', expiretime=10)
+
+        namespace.get_value('key', lambda: ['resolver_1'])
+
+        now = shared_cache.time.time
+        try:
+            shared_cache.time.time = lambda: now() + 20
+            self.assertEqual(namespace.get_value('key', lambda: ['other']),
+                             ['other'])
+        finally:
+            shared_cache.time.time = now
+
+    def test_clear(self):
+        """ only the entries of the cleared namespace are removed """
+
+        cache = SharedCache(self.path)
+        resolver_1 = cache.namespace('user_lookup::resolver_1')
+        resolver_2 = cache.namespace('user_lookup::resolver_2')
+
+        resolver_1.get_value('key', lambda: 1)
+        resolver_2.get_value('key', lambda: 2)
+
+        resolver_1.clear()
+
+        self.assertEqual(resolver_1.get_value('key', lambda: 3), 3)
+        self.assertEqual(resolver_2.get_value('key', lambda: 4), 2)
+
+    def test_evict(self):
+        """ the least recently used entries are evicted """
+
+        cache = SharedCache(self.path, max_entries=10)
+        namespace = cache.namespace('user_lookup::resolver_1')
+
+        now = shared_cache.time.time
+        try:
+            for i in range(20):
+                shared_cache.time.time = lambda: 1000.0 + i * 100
+                namespace.get_value('key_%d' % i, lambda: i)
+
+            # the oldest entry is used again, so it is not evicted
+            shared_cache.time.time = lambda: 5000.0
+            namespace.get_value('key_0', lambda: None)
+
+            self.assertEqual(cache.evict(), 11)
+        finally:
+            shared_cache.time.time = now
+
+        self.assertEqual(namespace.get_value('key_0', lambda: None), 0)
+        self.assertEqual(namespace.get_value('key_19', lambda: None), 19)
+        self.assertEqual(namespace.get_value('key_1', lambda: None), None)
+
+    def test_secure_cache_file(self):
+        """ the cache file is created with mode 0600 """
+
+        namespace = SharedCache(self.path).namespace('user_lookup::resolver')
+        namespace.get_value('key', lambda: 1)
+
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+        # an existing file is restricted as well
+
+        os.chmod(self.path, 0o666)
+        secure_cache_file(self.path)
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_insecure_cache_location(self):
+        """ a cache directory, which is writable by others, is refused """
+
+        os.chmod(self.directory, 0o777)
+
+        with self.assertRaises(SharedCacheError):
+            shared_cache.get_shared_cache(self.path)
+
+        os.chmod(self.directory, 0o700)
+
+        # a cache location of an other user is refused
+
+        secure_cache_file(self.path)
+
+        with patch('linotp.lib.shared_cache.os.geteuid',
+                   return_value=os.geteuid() + 1):
+            with self.assertRaises(SharedCacheError):
+                secure_cache_file(self.path)
+
+    def test_no_json_value(self):
+        """ a value, which could not be stored as json, is not cached """
+
+        namespace = SharedCache(self.path).namespace('user_lookup::resolver')
+
+        value = object()
+        self.assertIs(namespace.get_value('key', lambda: value), value)
+        self.assertEqual(namespace.get_value('key', lambda: 2), 2)
+
+# eof #
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+
+"""
+unit test for the bulk token administration
+"""
+
+import unittest
+
+from mock import patch
+
+import sqlalchemy as sa
+
+from linotp.lib.context import request_context
+from linotp.lib.context import request_context_safety
+from linotp.lib.policy import PolicyException
+from linotp.lib.token_bulk import bulk_token_operation
+from linotp.model import Realm
+from linotp.model import Token
+from linotp.model import TokenRealm
+from linotp.model import init_model
+from linotp.model.meta import Session
+from linotp.model.meta import metadata
+
+
+class TestTokenBulk(unittest.TestCase):
+
+    def setUp(self):
+
+        self.engine = sa.create_engine('sqlite://')
+        init_model(self.engine)
+        metadata.create_all(self.engine)
+
+        self.request_context = request_context_safety()
+        self.request_context.__enter__()
+        request_context['Config'] = {}
+
+        self.config_patch = patch('linotp.lib.config.getLinotpConfig',
+                                  return_value={})
+        self.config_patch.start()
+
+        self.policies = {'active': True, 'realms': ['realm_a', 'realm_b'],
+                         'resolvers': [], 'admin': 'admin'}
+
+        self.policy_patch = patch('linotp.lib.token_bulk.getAdminPolicies',
+                                  side_effect=lambda action: dict(
+                                      self.policies))
+        self.get_admin_policies = self.policy_patch.start()
+
+        # the enrollment policies with the 'tokencount' limit per realm
+
+        self.token_count = {}
+
+        self.get_policy_patch = patch(
+            'linotp.lib.token_bulk.getPolicy',
+            side_effect=lambda param: self._get_policy(param['realm']))
+        self.get_policy_patch.start()
+
+        realms = {}
+        for name in ['realm_a', 'realm_b', 'realm_c']:
+            realms[name] = Realm(unicode(name))
+            Session.add(realms[name])
+
+        for i in range(10):
+            token = Token(u'BULK%02d' % i)
+            token.LinOtpTokenType = u'spass'
+            token.LinOtpFailCount = 3
+            token.LinOtpUserid = u'1000'
+            token.setRealms([realms['realm_c' if i == 9 else 'realm_a']])
+            Session.add(token)
+
+        Session.commit()
+
+    def tearDown(self):
+
+        Session.remove()
+
+        self.get_policy_patch.stop()
+        self.policy_patch.stop()
+        self.config_patch.stop()
+        self.request_context.__exit__(None, None, None)
+
+    def _get_policy(self, realm):
+
+        if realm not in self.token_count:
+            return {}
+
+        return {'tokencount': {
+                    'action': 'tokencount=%d' % self.token_count[realm],
+                    'scope': 'enrollment',
+                    'realm': realm}}
+
+    def get_token(self, serial):
+        return Session.query(Token).filter(
+            Token.LinOtpTokenSerialnumber == serial).first()
+
+    def test_disable(self):
+        """
+        the tokens are disabled in chunks with one policy evaluation
+        """
+
+        serials = [u'BULK%02d' % i for i in range(10)] + [u'UNKNOWN']
+
+        result = bulk_token_operation('disable', serials, chunk_size=3)
+
+        self.assertEqual(result, {'processed': 9,
+                                  'denied': [u'BULK09'],
+                                  'not_found': [u'UNKNOWN'],
+                                  'realms': [u'realm_a']})
+
+        self.assertEqual(self.get_admin_policies.call_count, 1)
+
+        self.assertFalse(self.get_token(u'BULK00').LinOtpIsactive)
+        self.assertFalse(self.get_token(u'BULK08').LinOtpIsactive)
+        self.assertTrue(self.get_token(u'BULK09').LinOtpIsactive)
+
+    def test_reset_and_unassign(self):
+        """
+        reset the fail counter and unassign the tokens
+        """
+
+        serials = [u'BULK00', u'BULK01']
+
+        bulk_token_operation('reset', serials)
+        self.assertEqual(self.get_token(u'BULK00').LinOtpFailCount, 0)
+        self.assertEqual(self.get_token(u'BULK02').LinOtpFailCount, 3)
+
+        with patch('linotp.tokens.base.getUserResolverId',
+                   return_value=(u'', u'', u'')):
+            bulk_token_operation('unassign', serials)
+
+        self.assertEqual(self.get_token(u'BULK01').LinOtpUserid, u'')
+        self.assertEqual(self.get_token(u'BULK02').LinOtpUserid, u'1000')
+
+    def test_remove(self):
+        """
+        the tokens and their realm relations are removed
+        """
+
+        result = bulk_token_operation(
+            'remove', [u'BULK%02d' % i for i in range(10)], chunk_size=4)
+
+        self.assertEqual(result['processed'], 9)
+
+        self.assertEqual(Session.query(Token).count(), 1)
+        self.assertEqual(Session.query(TokenRealm).count(), 1)
+
+    def test_tokenrealm(self):
+        """
+        the realms of the tokens are replaced, if the admin may manage the
+        new realms
+        """
+
+        result = bulk_token_operation('tokenrealm', [u'BULK00', u'BULK01'],
+                                      realms=['realm_b'])
+
+        self.assertEqual(result['realms'], [u'realm_a'])
+        self.assertEqual(self.get_token(u'BULK00').getRealmNames(),
+                         [u'realm_b'])
+
+        with self.assertRaises(PolicyException):
+            bulk_token_operation('tokenrealm', [u'BULK00'],
+                                 realms=['realm_c'])
+
+    def test_tokenrealm_of_foreign_realm(self):
+        """
+        the realms of a token, which is in a realm the admin may not manage,
+        are not replaced
+        """
+
+        token = self.get_token(u'BULK01')
+        token.setRealms(Session.query(Realm).filter(
+            Realm.name.in_([u'realm_a', u'realm_c'])).all())
+        Session.commit()
+
+        result = bulk_token_operation('tokenrealm', [u'BULK00', u'BULK01'],
+                                      realms=['realm_b'])
+
+        self.assertEqual(result['processed'], 1)
+        self.assertEqual(result['denied'], [u'BULK01'])
+        self.assertEqual(sorted(self.get_token(u'BULK01').getRealmNames()),
+                         [u'realm_a', u'realm_c'])
+
+        # other operations only require one realm of the token
+
+        result = bulk_token_operation('disable', [u'BULK01'])
+        self.assertEqual(result['processed'], 1)
+
+    def test_token_count(self):
+        """
+        the tokens, which exceed the token count of a realm, are denied
+        """
+
+        self.token_count['realm_b'] = 3
+
+        result = bulk_token_operation(
+            'tokenrealm', [u'BULK%02d' % i for i in range(5)],
+            realms=['realm_b'], chunk_size=2)
+
+        self.assertEqual(result['processed'], 3)
+        self.assertEqual(len(result['denied']), 2)
+
+        self.assertEqual(Session.query(TokenRealm).filter(
+            TokenRealm.realm_id == Realm.id,
+            Realm.name == u'realm_b').count(), 3)
+
+        # the disabled tokens do not count
+
+        bulk_token_operation('disable', [u'BULK%02d' % i for i in range(9)])
+
+        self.token_count['realm_a'] = 2
+
+        result = bulk_token_operation(
+            'enable', [u'BULK%02d' % i for i in range(5, 9)], chunk_size=3)
+
+        self.assertEqual(result['processed'], 2)
+        self.assertEqual(len(result['denied']), 2)
+        self.assertEqual(Session.query(Token).filter(
+            Token.LinOtpIsactive == True).count(), 3)
+
+# eof #
@@ -36,13 +36,17 @@ from linotp.lib.user import User
 
 class TestTokenSearch(unittest.TestCase):
 
+    @patch('linotp.lib.tokeniterator.getRealms')
+    @patch('linotp.lib.tokeniterator.has_unresolved_token_owners')
     @patch('linotp.lib.tokeniterator.getTokens4UserOrSerial')
     @patch('linotp.lib.tokeniterator.token_owner_iterator')
     @patch('linotp.lib.tokeniterator.TokenIterator.__init__')
     def test_singechar_wildcard(self,
                                 mocked_tokenIterator_init,
                                 mocked_token_owner_iterator,
-                                mocked_getTokens4UserOrSerial
+                                mocked_getTokens4UserOrSerial,
+                                mocked_has_unresolved_token_owners,
+                                mocked_getRealms
                                 ):
 
         valid_realms = ['*']
@@ -50,6 +54,12 @@ class TestTokenSearch(unittest.TestCase):
         mocked_tokenIterator_init.return_value = None
         tik = TokenIterator(None, None)
 
+        # the resolver lookup of the token owners is only made for tokens,
+        # where the owner login is not resolved yet
+
+        mocked_has_unresolved_token_owners.return_value = True
+        mocked_getRealms.return_value = {}
+
         # ------------------------------------------------------------------ --
 
         # test the old behaviour with '*' wildcard, which takes the
@@ -0,0 +1,202 @@
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+unit test for the lookup of the tokens of a user
+"""
+
+import unittest
+
+import sqlalchemy as sa
+
+from linotp.lib.token import getTokens4UserOrSerial
+from linotp.lib.token import get_token_ids_of_batch
+from linotp.model import Realm
+from linotp.model import Token
+from linotp.model import init_model
+from linotp.model.meta import Session
+from linotp.model.meta import metadata
+from linotp.model.migrate import migrate_2_10_1_1
+
+RESOLVERS = [u'useridresolver.PasswdIdResolver.IdResolver.res_%d' % i
+             for i in range(3)]
+
+
+class Meta(object):
+
+    def __init__(self, engine):
+        self.engine = engine
+
+
+class FakeUser(object):
+    """ the user with the uid of the user in each of its resolvers """
+
+    is_empty = False
+    login = 'hans'
+
+    def __init__(self, realm, uids):
+        self.realm = realm
+        self.uids = uids
+
+    def get_uid_resolver(self):
+        for resolver_spec, uid in zip(RESOLVERS, self.uids):
+            yield uid, resolver_spec
+
+
+class TestTokensOfUser(unittest.TestCase):
+
+    def setUp(self):
+
+        self.engine = sa.create_engine('sqlite://')
+        init_model(self.engine)
+        metadata.create_all(self.engine)
+
+        self.statements = []
+        sa.event.listen(self.engine, 'before_cursor_execute',
+                        self.count_statement)
+
+        realm = Realm(u'myrealm')
+        other_realm = Realm(u'other')
+        Session.add_all([realm, other_realm])
+
+        # 10 tokens of the user spread across the three resolvers, one token
+        # in another realm and one token of another user
+
+        for i in range(10):
+            token = self.create_token(u'TOK%02d' % i, u'100%d' % (i % 3),
+                                      RESOLVERS[i % 3])
+            token.realms.append(realm)
+
+        token = self.create_token(u'OTHER_REALM', u'1000', RESOLVERS[0])
+        token.realms.append(other_realm)
+
+        self.create_token(u'OTHER_USER', u'2000', RESOLVERS[0])
+
+        # and a token with the legacy resolver class prefix
+
+        legacy = RESOLVERS[1].replace('useridresolver.', 'useridresolveree.')
+        self.create_token(u'LEGACY', u'1001', legacy)
+
+        Session.flush()
+        Session.commit()
+        Session.expunge_all()
+
+    def tearDown(self):
+
+        Session.remove()
+
+    def count_statement(self, conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith('SELECT'):
+            self.statements.append(statement)
+
+    def create_token(self, serial, uid, resolver_class):
+
+        token = Token(serial)
+        token.LinOtpUserid = uid
+        token.LinOtpIdResClass = resolver_class
+        token.LinOtpIdResolver = u'/etc/passwd'
+        Session.add(token)
+
+        return token
+
+    def test_single_query(self):
+        """
+        all tokens of the user are fetched in one query and their realms
+        are loaded eagerly by one more query
+        """
+
+        user = FakeUser('myrealm', [u'1000', u'1001', u'1002'])
+
+        tokens = getTokens4UserOrSerial(user, _class=False)
+
+        self.assertEqual(len(self.statements), 2)
+
+        serials = sorted(token.LinOtpTokenSerialnumber for token in tokens)
+        self.assertEqual(serials, ['TOK%02d' % i for i in range(10)])
+
+        # the realms are already loaded
+        for token in tokens:
+            self.assertEqual(token.getRealmNames(), ['myrealm'])
+        self.assertEqual(len(self.statements), 2)
+
+    def test_read_for_update(self):
+
+        user = FakeUser('*', [u'1000'])
+
+        tokens = getTokens4UserOrSerial(user, _class=False,
+                                        read_for_update=True)
+
+        serials = sorted(token.LinOtpTokenSerialnumber for token in tokens)
+        self.assertEqual(serials, ['OTHER_REALM', 'TOK00', 'TOK03',
+                                   'TOK06', 'TOK09'])
+
+        for token in tokens:
+            token.getRealmNames()
+        self.assertEqual(len(self.statements), 2)
+
+    def test_batch(self):
+        """
+        the tokens of many users and serials are fetched in one query
+        """
+
+        users = [FakeUser('myrealm', [u'1000']),
+                 FakeUser('*', [u'2000']),
+                 FakeUser('*', [u'nobody'])]
+
+        user_token_ids, serial_token_ids = get_token_ids_of_batch(
+                                    users, [u'TOK01', u'UNKNOWN'])
+
+        self.assertEqual(len(self.statements), 2)
+
+        def serials(token_ids):
+            return sorted(token.LinOtpTokenSerialnumber for token in
+                          Session.query(Token).filter(
+                              Token.LinOtpTokenId.in_(token_ids)))
+
+        self.assertEqual([serials(ids) for ids in user_token_ids],
+                         [['TOK00', 'TOK03', 'TOK06', 'TOK09'],
+                          ['OTHER_USER'], []])
+
+        self.assertEqual(serials(serial_token_ids[u'TOK01']), ['TOK01'])
+        self.assertEqual(serial_token_ids[u'UNKNOWN'], [])
+
+    def test_legacy_resolver_class_migration(self):
+        """
+        the migration normalizes the legacy resolver class prefix
+        """
+
+        user = FakeUser('*', [u'nobody', u'1001'])
+
+        def serials():
+            return sorted(token.LinOtpTokenSerialnumber for token in
+                          getTokens4UserOrSerial(user, _class=False))
+
+        self.assertNotIn('LEGACY', serials())
+
+        migrate_2_10_1_1(Meta(self.engine))
+        Session.expunge_all()
+
+        self.assertIn('LEGACY', serials())
+
+# eof #
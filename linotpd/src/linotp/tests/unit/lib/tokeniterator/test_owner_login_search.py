@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+Tests the token search by the preserved owner login of the tokens
+"""
+
+import unittest
+
+import sqlalchemy as sa
+from mock import patch
+
+from linotp.lib.tokeniterator import TokenIterator
+from linotp.lib.tools.update_token_owner import UpdateTokenOwnerHandler
+from linotp.lib.user import User
+from linotp.model import Token
+from linotp.model import init_model
+from linotp.model.meta import Session
+from linotp.model.meta import metadata
+
+RESOLVER_1 = u'useridresolver.PasswdIdResolver.IdResolver.res_1'
+RESOLVER_2 = u'useridresolver.PasswdIdResolver.IdResolver.res_2'
+
+REALMS = {
+    'realm_1': {'useridresolver': [RESOLVER_1]},
+    'realm_2': {'useridresolver': [RESOLVER_2]},
+    }
+
+# serial, uid, resolver class, owner login
+TOKENS = [
+    (u'T_SMITH', u'1000', RESOLVER_1, u'smith'),
+    (u'T_SMITHERS', u'1001', RESOLVER_1, u'smithers'),
+    (u'T_JOHN_SMITH', u'1002', RESOLVER_2, u'john_smith'),
+    (u'T_JOHNXSMITH', u'1003', RESOLVER_2, u'johnxsmith'),
+    (u'T_SMITH_2', u'2000', RESOLVER_2, u'smith'),
+    (u'T_UNRESOLVED', u'1004', RESOLVER_1, None),
+    (u'T_UNASSIGNED', u'', u'', u''),
+    ]
+
+
+@patch('linotp.lib.tokeniterator.getRealms', return_value=REALMS)
+class TestOwnerLoginSearch(unittest.TestCase):
+
+    def setUp(self):
+
+        engine = sa.create_engine('sqlite://')
+        init_model(engine)
+        metadata.create_all(engine)
+
+        for serial, uid, resolver_class, login in TOKENS:
+            token = Token(serial)
+            token.LinOtpUserid = uid
+            token.LinOtpIdResClass = resolver_class
+            token.LinOtpIdResolver = u''
+            token.LinOtpOwnerLogin = login
+            Session.add(token)
+
+        Session.commit()
+
+        with patch('linotp.lib.tokeniterator.TokenIterator.__init__',
+                   return_value=None):
+            self.tik = TokenIterator(None, None)
+
+    def tearDown(self):
+
+        Session.remove()
+
+    def search(self, login, realm='', valid_realms=None):
+
+        condition = self.tik._get_user_condition(
+            User(login=login, realm=realm), valid_realms or ['*'])
+
+        return sorted(token.LinOtpTokenSerialnumber for token in
+                      Session.query(Token).filter(condition))
+
+    @patch('linotp.lib.tokeniterator.token_owner_iterator')
+    def test_wildcard_search(self, mocked_token_owner_iterator,
+                             _mocked_getRealms):
+
+        mocked_token_owner_iterator.return_value = [
+            (u'T_UNRESOLVED', u'blacksmith')]
+
+        self.assertEqual(self.search('smith*'),
+                         ['T_SMITH', 'T_SMITHERS', 'T_SMITH_2'])
+
+        # the like wildcards of the search are escaped
+        self.assertEqual(self.search('john_*'), ['T_JOHN_SMITH'])
+
+        # the not resolved token owners are looked up in the resolvers
+        self.assertEqual(self.search('*SMITH'),
+                         ['T_JOHNXSMITH', 'T_JOHN_SMITH', 'T_SMITH',
+                          'T_SMITH_2', 'T_UNRESOLVED'])
+
+        # the unassigned tokens are not matched by the wildcard
+        self.assertEqual(self.search('*'),
+                         ['T_JOHNXSMITH', 'T_JOHN_SMITH', 'T_SMITH',
+                          'T_SMITHERS', 'T_SMITH_2', 'T_UNRESOLVED'])
+
+        mocked_token_owner_iterator.assert_called_with(unresolved=True)
+
+    @patch('linotp.lib.tokeniterator.getTokens4UserOrSerial',
+           return_value=[])
+    def test_exact_search(self, _mocked_getTokens4UserOrSerial,
+                          _mocked_getRealms):
+
+        self.assertEqual(self.search('Smith'), ['T_SMITH', 'T_SMITH_2'])
+        self.assertEqual(self.search('smith', realm='realm_2'),
+                         ['T_SMITH_2'])
+        self.assertEqual(self.search('smith', valid_realms=['realm_1']),
+                         ['T_SMITH'])
+        self.assertEqual(self.search('smith', realm='unknown'), [])
+
+    @patch('linotp.lib.tools.update_token_owner.getUserInfo')
+    def test_update_token_owners(self, mocked_getUserInfo,
+                                 _mocked_getRealms):
+
+        mocked_getUserInfo.return_value = {'username': u'Blacksmith'}
+
+        handler = UpdateTokenOwnerHandler()
+
+        self.assertEqual(handler.update_token_owners(batch_size=2),
+                         {'updated': 1, 'unknown': 0})
+
+        token = Session.query(Token).filter(
+            Token.LinOtpTokenSerialnumber == u'T_UNRESOLVED').one()
+        self.assertEqual(token.LinOtpOwnerLogin, u'blacksmith')
+
+        # an exact search does not require the resolver lookup anymore
+
+        with patch('linotp.lib.tokeniterator.getTokens4UserOrSerial') as \
+                mocked_getTokens4UserOrSerial:
+            self.assertEqual(self.search('blacksmith'), ['T_UNRESOLVED'])
+            self.assertFalse(mocked_getTokens4UserOrSerial.called)
+
+        # the refresh updates all assigned tokens
+
+        mocked_getUserInfo.return_value = {}
+
+        self.assertEqual(
+            handler.update_token_owners(refresh=True, batch_size=2),
+            {'updated': 6, 'unknown': 6})
+
+        with patch('linotp.lib.token.getUserInfo', return_value={}):
+            self.assertEqual(self.search('/:no user info:/'),
+                             ['T_JOHNXSMITH', 'T_JOHN_SMITH', 'T_SMITH',
+                              'T_SMITHERS', 'T_SMITH_2', 'T_UNRESOLVED'])
+
+    @patch('linotp.lib.tokeniterator.token_owner_iterator')
+    def test_no_user_info_search(self, mocked_token_owner_iterator,
+                                 _mocked_getRealms):
+        """
+        the tokens of deleted owners are found without the refresh of the
+        owner logins
+        """
+
+        mocked_token_owner_iterator.return_value = [
+            (u'T_SMITH', u'/:no user info:/'),
+            (u'T_SMITHERS', u'smithers')]
+
+        self.assertEqual(self.search('/:no user info:/'), ['T_SMITH'])
+
+        # all token owners are looked up, not only the unresolved ones
+
+        mocked_token_owner_iterator.assert_called_with()
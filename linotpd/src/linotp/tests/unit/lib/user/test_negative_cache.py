@@ -0,0 +1,193 @@
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""
+unit test for the negative caching of unknown users
+"""
+
+import unittest
+
+from mock import patch
+
+from linotp.lib import negative_cache
+from linotp.lib.negative_cache import NegativeCache
+from linotp.lib.user import delete_realm_resolver_cache
+from linotp.lib.user import get_resolvers_of_user
+
+
+class FakeCache(object):
+    """ the beaker cache interface """
+
+    def __init__(self):
+        self.values = {}
+
+    def get_value(self, key, createfunc):
+        if key not in self.values:
+            self.values[key] = createfunc()
+        return self.values[key]
+
+    def clear(self):
+        self.values.clear()
+
+
+class FakeCacheManager(object):
+
+    def __init__(self):
+        self.caches = {}
+
+    def get_cache(self, cache_name, type="memory", expiretime=None):
+        return self.caches.setdefault(cache_name, FakeCache())
+
+
+class FakeResolver(object):
+
+    def __init__(self, users):
+        self.users = users
+        self.lookups = 0
+
+    def getUserId(self, login):
+        self.lookups += 1
+        return self.users.get(login)
+
+    def getUserInfo(self, user_id):
+        return {'username': user_id, 'userid': user_id}
+
+
+class TestNegativeCache(unittest.TestCase):
+
+    def test_expiration(self):
+
+        cache = NegativeCache(max_entries=10, expiretime=60)
+        cache.add('realm', 'unknown')
+
+        self.assertTrue(cache.contains('realm', 'unknown'))
+        self.assertFalse(cache.contains('other_realm', 'unknown'))
+
+        now = negative_cache.time.time
+        try:
+            negative_cache.time.time = lambda: now() + 61
+            self.assertFalse(cache.contains('realm', 'unknown'))
+        finally:
+            negative_cache.time.time = now
+
+        self.assertEqual(cache.get_statistics(),
+                         {'hits': 1, 'misses': 2, 'entries': 0})
+
+    def test_size_bound(self):
+
+        cache = NegativeCache(max_entries=3, expiretime=60)
+
+        for login in ['a', 'b', 'c', 'd']:
+            cache.add('realm', login)
+
+        self.assertFalse(cache.contains('realm', 'a'))
+        self.assertTrue(cache.contains('realm', 'd'))
+
+        cache.clear('realm')
+        self.assertFalse(cache.contains('realm', 'd'))
+
+
+class TestUnknownUserLookup(unittest.TestCase):
+
+    def setUp(self):
+
+        self.resolver = FakeResolver({'hans': '1000'})
+
+        self.context = {
+            'Config': {
+                'linotp.negative_user_cache.enabled': 'True',
+                'linotp.negative_user_cache.expiration': '60',
+                'linotp.user_lookup_cache.enabled': 'True',
+                'linotp.resolver_lookup_cache.enabled': 'True',
+                },
+            'CacheManager': FakeCacheManager(),
+            'UserLookup': {},
+            }
+
+        self.realms = {'realm': {'useridresolver': ['resolver_1']}}
+        self.resolvers = {'resolver_1': self.resolver}
+
+        patches = [
+            patch('linotp.lib.user.request_context', new=self.context),
+            patch('linotp.lib.user.getRealms', return_value=self.realms),
+            patch('linotp.lib.user.getResolverObject',
+                  new=self.resolvers.get),
+            patch('linotp.lib.user.get_negative_cache',
+                  new=lambda max_entries, expiretime:
+                        self.negative_cache),
+            ]
+
+        self.negative_cache = NegativeCache()
+
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def lookup(self, login):
+        # every request starts with an empty request local lookup
+        self.context['UserLookup'] = {}
+        return get_resolvers_of_user(login, 'realm')
+
+    def test_unknown_user(self):
+        """ the unknown user is only looked up once in the resolver """
+
+        self.assertEqual(self.lookup('unknown'), [])
+        self.assertEqual(self.lookup('unknown'), [])
+        self.assertEqual(self.resolver.lookups, 1)
+
+        # the unknown user is not kept in the lookup caches
+        for cache in self.context['CacheManager'].caches.values():
+            self.assertEqual(cache.values, {})
+
+        self.assertEqual(self.lookup('hans'), ['resolver_1'])
+        self.assertEqual(self.lookup('hans'), ['resolver_1'])
+        self.assertEqual(self.resolver.lookups, 2)
+
+    def test_realm_change(self):
+        """ a realm change invalidates the negative cache entries """
+
+        self.assertEqual(self.lookup('unknown'), [])
+
+        # the user is defined in the new resolver of the realm
+        self.realms['realm']['useridresolver'].append('resolver_2')
+        self.resolvers['resolver_2'] = FakeResolver({'unknown': '1001'})
+
+        delete_realm_resolver_cache('realm')
+
+        self.assertEqual(self.lookup('unknown'), ['resolver_2'])
+
+    def test_disabled(self):
+        """ without negative cache, the unknown users are looked up again """
+
+        self.context['Config']['linotp.negative_user_cache.enabled'] = 'False'
+        self.context['Config']['linotp.user_lookup_cache.enabled'] = 'False'
+        self.context['Config']['linotp.resolver_lookup_cache.enabled'] = \
+            'False'
+
+        self.lookup('unknown')
+        self.lookup('unknown')
+
+        self.assertEqual(self.resolver.lookups, 2)
+
+# eof #
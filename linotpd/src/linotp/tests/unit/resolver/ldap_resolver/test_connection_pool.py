@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+#
+#   LinOTP - the open source solution for two factor authentication
+#   Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#   This file is part of LinOTP userid resolvers.
+#
+#   This program is free software: you can redistribute it and/or
+#   modify it under the terms of the GNU Affero General Public
+#   License, version 3, as published by the Free Software Foundation.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Affero General Public License for more details.
+#
+#   You should have received a copy of the
+#              GNU Affero General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#   E-mail: linotp@keyidentity.com
+#   Contact: www.linotp.org
+#   Support: www.keyidentity.com
+
+"""
+LDAP Resolver unit test for the connection pool
+"""
+
+import unittest
+from mock import patch
+from ldap import SERVER_DOWN
+from ldap import INVALID_CREDENTIALS
+
+from linotp.useridresolver.LDAPIdResolver import LDAPConnectionPool
+from linotp.useridresolver.LDAPIdResolver import connection_pool_registry
+from linotp.useridresolver.LDAPIdResolver import IdResolver as LDAPResolver
+
+
+class MockedLdapObject(object):
+    """
+    Mocked LDAP Object - tracks the unbind and the health check
+    """
+
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.unbound = False
+        self.bound_as = None
+
+    def simple_bind_s(self, user, passw, *args, **kwargs):
+        if user and passw != 'geheim1':
+            raise INVALID_CREDENTIALS('not geheim1!')
+        self.bound_as = user
+        return True
+
+    def whoami_s(self):
+        if not self.alive:
+            raise SERVER_DOWN('server down')
+        return ''
+
+    def unbind_s(self):
+        self.unbound = True
+
+
+class TestLDAPConnectionPool(unittest.TestCase):
+    """
+    tests the pool of the bound ldap connections
+    """
+
+    def test_release_and_acquire(self):
+        """
+        a released connection is handed out again
+        """
+
+        pool = LDAPConnectionPool(size=2, idle_timeout=300)
+
+        self.assertEqual(pool.acquire(), (None, None))
+
+        l_obj = MockedLdapObject()
+        pool.release(l_obj, 'ldap://server1')
+
+        self.assertEqual(pool.acquire(), (l_obj, 'ldap://server1'))
+        self.assertEqual(pool.acquire(), (None, None))
+
+    def test_pool_size(self):
+        """
+        connections beyond the pool size are closed
+        """
+
+        pool = LDAPConnectionPool(size=1, idle_timeout=300)
+
+        l_obj_1 = MockedLdapObject()
+        l_obj_2 = MockedLdapObject()
+
+        pool.release(l_obj_1, 'ldap://server1')
+        pool.release(l_obj_2, 'ldap://server1')
+
+        self.assertFalse(l_obj_1.unbound)
+        self.assertTrue(l_obj_2.unbound)
+
+    @patch('linotp.useridresolver.LDAPIdResolver.time')
+    def test_idle_eviction_and_health_check(self, mocked_time):
+        """
+        idle connections are evicted and broken ones are dropped
+        """
+
+        pool = LDAPConnectionPool(size=3, idle_timeout=300)
+
+        mocked_time.time.return_value = 1000
+
+        l_obj_old = MockedLdapObject()
+        pool.release(l_obj_old, 'ldap://server1')
+
+        mocked_time.time.return_value = 1200
+
+        l_obj_broken = MockedLdapObject(alive=False)
+        pool.release(l_obj_broken, 'ldap://server1')
+
+        mocked_time.time.return_value = 1400
+
+        # the broken one is detected by the health check and the
+        # old one has exceeded the idle timeout
+
+        self.assertEqual(pool.acquire(), (None, None))
+        self.assertTrue(l_obj_broken.unbound)
+        self.assertTrue(l_obj_old.unbound)
+
+    def test_discard_uri(self):
+        """
+        all connections to a server could be dropped
+        """
+
+        pool = LDAPConnectionPool(size=3, idle_timeout=300)
+
+        l_obj_1 = MockedLdapObject()
+        l_obj_2 = MockedLdapObject()
+
+        pool.release(l_obj_1, 'ldap://server1')
+        pool.release(l_obj_2, 'ldap://server2')
+
+        pool.discard_uri('ldap://server1')
+
+        self.assertTrue(l_obj_1.unbound)
+        self.assertEqual(pool.acquire(), (l_obj_2, 'ldap://server2'))
+
+    def test_resolver_returns_connection_to_pool(self):
+        """
+        the resolver returns its connection to the pool at the request end
+        """
+
+        resolver = LDAPResolver()
+        resolver.conf = 'test_pool'
+        resolver.ldapuri = 'ldap://server1'
+
+        l_obj = MockedLdapObject()
+        resolver.l_obj = l_obj
+        resolver.l_obj_uri = 'ldap://server1'
+
+        resolver.close()
+        self.assertFalse(l_obj.unbound)
+
+        other_resolver = LDAPResolver()
+        other_resolver.conf = 'test_pool'
+        other_resolver.ldapuri = 'ldap://server1'
+
+        self.assertIs(other_resolver.bind(), l_obj)
+        other_resolver.close()
+
+        LDAPResolver.flush_connections('test_pool')
+        self.assertTrue(l_obj.unbound)
+
+    def test_pool_per_bind_password(self):
+        """
+        resolvers, which differ only in the bind password, do not share
+        their connections
+        """
+
+        resolvers = []
+        for conf, bindpw in [('test_pool_pw_1', 'geheim1'),
+                             ('test_pool_pw_2', 'geheim1'),
+                             ('test_pool_pw_3', 'wrong')]:
+            resolver = LDAPResolver()
+            resolver.conf = conf
+            resolver.ldapuri = 'ldap://server1'
+            resolver.binddn = 'cn=admin'
+            resolver.bindpw = bindpw
+            resolvers.append(resolver)
+
+        pools = [resolver._get_connection_pool() for resolver in resolvers]
+
+        self.assertIs(pools[0], pools[1])
+        self.assertIsNot(pools[0], pools[2])
+
+        # the bind password is not part of the pool key in plain text
+
+        for key in connection_pool_registry._pools:
+            self.assertNotIn('geheim1', key)
+
+        # neither is a different ca certificate shared
+
+        resolvers[1].cacertificate = 'other ca'
+        self.assertIsNot(resolvers[1]._get_connection_pool(), pools[0])
+
+        for resolver in resolvers:
+            LDAPResolver.flush_connections(resolver.conf)
+
+    def test_checkPass_reuses_connection(self):
+        """
+        the password check reuses the connection of the previous check
+        """
+
+        connections = []
+
+        def m_connect(uri, caller, trace_level=0):
+            l_obj = MockedLdapObject()
+            connections.append(l_obj)
+            return l_obj
+
+        resolver = LDAPResolver()
+        resolver.conf = 'test_auth_pool'
+        resolver.ldapuri = 'ldap://server1'
+
+        with patch.object(LDAPResolver, 'connect', side_effect=m_connect):
+
+            self.assertTrue(resolver.checkPass('cn=user', 'geheim1'))
+            self.assertTrue(resolver.checkPass('cn=user', 'geheim1'))
+
+            self.assertEqual(len(connections), 1)
+            self.assertFalse(connections[0].unbound)
+
+            # the idle connection does not keep the identity of the user
+
+            self.assertEqual(connections[0].bound_as, '')
+
+            # a failed password check does not return the connection
+
+            self.assertFalse(resolver.checkPass('cn=user', 'wrong'))
+            self.assertTrue(connections[0].unbound)
+
+        LDAPResolver.flush_connections('test_auth_pool')
+
+    def test_auth_pool_per_ca_certificate(self):
+        """
+        resolvers with a different ca certificate do not share the
+        connections of the password check
+        """
+
+        resolver = LDAPResolver()
+        resolver.conf = 'test_auth_pool_ca_1'
+        resolver.ldapuri = 'ldap://server1'
+        resolver.cacertificate = 'ca 1'
+
+        other_resolver = LDAPResolver()
+        other_resolver.conf = 'test_auth_pool_ca_2'
+        other_resolver.ldapuri = 'ldap://server1'
+        other_resolver.cacertificate = 'ca 2'
+
+        self.assertIsNot(resolver._get_auth_connection_pool(),
+                         other_resolver._get_auth_connection_pool())
+
+        other_resolver.cacertificate = 'ca 1'
+
+        self.assertIs(resolver._get_auth_connection_pool(),
+                      other_resolver._get_auth_connection_pool())
+
+        LDAPResolver.flush_connections('test_auth_pool_ca_1')
+        LDAPResolver.flush_connections('test_auth_pool_ca_2')
+
+# eof #
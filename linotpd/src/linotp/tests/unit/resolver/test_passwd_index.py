@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP userid resolvers.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+
+"""
+unit test for the shared passwd file index of the PasswdIdResolver
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from linotp.useridresolver.PasswdIdResolver import IdResolver
+from linotp.useridresolver.PasswdIdResolver import get_passwd_index
+
+PASSWD = (
+    'root:x:0:0:root:/root:/bin/bash\n'
+    '\n'
+    'hans:x:1000:1000:Hans Meier,Room 1,0301,0171,hans@example.com'
+    ':/home/hans:/bin/bash\n'
+    'hanna:x:1001:1001:Hanna Schmidt:/home/hanna:/bin/bash\n'
+    'otto:x:1002:1002:Otto Hans:/home/otto:/bin/bash\n'
+    'invalid\n'
+    )
+
+
+class TestPasswdIndex(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'passwd')
+        self.write(PASSWD)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+    def write(self, content):
+
+        with open(self.fileName, 'w') as f:
+            f.write(content)
+
+    def resolver(self):
+
+        resolver = IdResolver()
+        resolver.loadConfig(
+            {'linotp.passwdresolver.fileName.my': self.fileName}, 'my')
+        return resolver
+
+    def test_index_is_shared(self):
+        """
+        all resolvers of an unchanged file share the same parsed index
+        """
+
+        first = self.resolver()
+        second = self.resolver()
+
+        self.assertIs(first.index, second.index)
+        self.assertEqual(first.getUserId('hans'), '1000')
+
+    def test_index_is_reloaded_on_change(self):
+        """
+        a changed file is parsed again
+        """
+
+        index = get_passwd_index(self.fileName)
+
+        self.write(PASSWD + 'fritz:x:1003:1003:Fritz:/home/fritz:/bin/sh\n')
+
+        resolver = self.resolver()
+
+        self.assertIsNot(resolver.index, index)
+        self.assertEqual(resolver.getUserId('fritz'), '1003')
+
+    def test_reused_resolver_sees_change(self):
+        """
+        a reused resolver uses the index of the changed file
+        """
+
+        resolver = self.resolver()
+        self.assertEqual(resolver.getUserId('fritz'), '')
+
+        self.write(PASSWD + 'fritz:x:1003:1003:Fritz:/home/fritz:/bin/sh\n')
+
+        self.assertEqual(resolver.getUserId('fritz'), '1003')
+
+    def test_user_info(self):
+
+        resolver = self.resolver()
+
+        info = resolver.getUserInfo('1000', no_passwd=True)
+
+        self.assertNotIn('cryptpass', info)
+        self.assertEqual(info['username'], 'hans')
+        self.assertEqual(info['givenname'], 'Hans')
+        self.assertEqual(info['surname'], 'Meier')
+        self.assertEqual(info['mobile'], '0301')
+        self.assertEqual(info['phone'], '0171')
+        self.assertEqual(info['email'], 'hans@example.com')
+
+        self.assertEqual(resolver.getUserInfo('4711'), {})
+        self.assertFalse(resolver.getUsername('4711'))
+
+    def test_user_list(self):
+        """
+        the prefix index returns the same results as the pattern match
+        """
+
+        resolver = self.resolver()
+
+        def names(searchDict):
+            return sorted(info['username']
+                          for info in resolver.getUserList(searchDict))
+
+        self.assertEqual(names({}), ['hanna', 'hans', 'otto', 'root'])
+        self.assertEqual(names({'username': 'HAN*'}), ['hanna', 'hans'])
+        self.assertEqual(names({'username': 'hans'}), ['hans'])
+        self.assertEqual(names({'username': 'ha'}), [])
+        self.assertEqual(names({'username': '*ns'}), ['hans'])
+        self.assertEqual(names({'description': 'hans*'}), ['hans'])
+        self.assertEqual(names({'description': '*hans*'}), ['hans', 'otto'])
+        self.assertEqual(names({'username': 'h*', 'userid': '>1000'}),
+                         ['hanna'])
+
+    def test_user_list_index_lookup(self):
+        """
+        the index is looked up once per user list, not once per user
+        """
+
+        resolver = self.resolver()
+
+        with patch('linotp.useridresolver.PasswdIdResolver.get_passwd_index',
+                   wraps=get_passwd_index) as mocked_get_passwd_index:
+
+            users = resolver.getUserList({})
+
+        self.assertEqual(len(users), 4)
+        self.assertEqual(mocked_get_passwd_index.call_count, 1)
+        self.assertNotIn('cryptpass', users[0])
+
+# eof #
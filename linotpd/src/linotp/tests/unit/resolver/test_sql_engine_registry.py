@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+
+"""
+unit test for the process wide engine registry of the sql resolver
+"""
+
+import os
+import unittest
+
+from linotp.useridresolver.SQLIdResolver import EngineRegistry
+
+
+class TestSQLEngineRegistry(unittest.TestCase):
+
+    def setUp(self):
+        current_directory = os.path.dirname(os.path.abspath(__file__))
+        self.connect = ("sqlite:///%s/imported/data/linotp-users.sql" %
+                        current_directory)
+        self.registry = EngineRegistry()
+
+    def test_engine_is_shared(self):
+        """
+        resolvers with the same connect string share one engine
+        """
+
+        entry_1 = self.registry.get_engine(self.connect, {}, 'resolver_1')
+        entry_2 = self.registry.get_engine(self.connect, {}, 'resolver_2')
+
+        self.assertIs(entry_1['engine'], entry_2['engine'])
+        self.assertIs(entry_1['meta'], entry_2['meta'])
+
+        # releasing one owner keeps the engine for the other one
+        self.registry.release('resolver_1')
+
+        entry_3 = self.registry.get_engine(self.connect, {}, 'resolver_2')
+        self.assertIs(entry_2['engine'], entry_3['engine'])
+
+    def test_engine_is_released(self):
+        """
+        the engine is dropped, when the last owner releases it
+        """
+
+        entry_1 = self.registry.get_engine(self.connect, {}, 'resolver_1')
+        self.registry.release('resolver_1')
+
+        entry_2 = self.registry.get_engine(self.connect, {}, 'resolver_1')
+        self.assertIsNot(entry_1['engine'], entry_2['engine'])
+
+    def test_config_change_drops_former_engine(self):
+        """
+        a changed pool config of a resolver replaces the former engine
+        """
+
+        entry_1 = self.registry.get_engine(self.connect,
+                                           {'pool_recycle': 3600},
+                                           'resolver_1')
+
+        entry_2 = self.registry.get_engine(self.connect,
+                                           {'pool_recycle': 60},
+                                           'resolver_1')
+
+        self.assertIsNot(entry_1['engine'], entry_2['engine'])
+        self.assertEqual(len(self.registry._engines), 1)
+
+# eof #
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+
+"""
+unit test for the parsed token info of the token
+"""
+
+import json
+import unittest
+
+from mock import patch
+
+import sqlalchemy as sa
+
+from linotp.model import Token
+from linotp.model import init_model
+from linotp.model.meta import Session
+from linotp.model.meta import metadata
+from linotp.tokens.base.tokeninfo_mixin import TokenInfoMixin
+
+
+class InfoToken(TokenInfoMixin):
+
+    def __init__(self, token):
+        self.token = token
+
+
+class TestTokenInfoCache(unittest.TestCase):
+
+    def setUp(self):
+
+        self.engine = sa.create_engine('sqlite://')
+        init_model(self.engine)
+        metadata.create_all(self.engine)
+
+        token = Token(u'INFO01')
+        token.setInfo(u'' + json.dumps({'hashlib': 'sha1', 'timeStep': 30}))
+        Session.add(token)
+        Session.commit()
+        Session.expunge_all()
+
+    def tearDown(self):
+
+        Session.remove()
+
+    def load_token(self):
+        return InfoToken(Session.query(Token).filter(
+            Token.LinOtpTokenSerialnumber == u'INFO01').one())
+
+    def stored_info(self):
+        row = self.engine.execute(
+            sa.text("SELECT LinOtpTokenInfo FROM Token")).fetchone()
+        return json.loads(row[0])
+
+    def test_info_parsed_once(self):
+        """
+        the token info is parsed only once for all reads
+        """
+
+        token = self.load_token()
+
+        with patch('linotp.model.json.loads', wraps=json.loads) as loads:
+
+            self.assertEqual(token.getFromTokenInfo('hashlib'), 'sha1')
+            self.assertEqual(token.getFromTokenInfo('timeStep'), 30)
+            self.assertEqual(token.getFromTokenInfo('timeShift', 0), 0)
+            self.assertEqual(token.getTokenInfo()['hashlib'], 'sha1')
+
+            self.assertEqual(loads.call_count, 1)
+
+    def test_info_serialized_on_flush(self):
+        """
+        the modified token info is serialized once, when the token is flushed
+        """
+
+        token = self.load_token()
+
+        with patch('linotp.model.json.dumps', wraps=json.dumps) as dumps:
+
+            token.addToTokenInfo('timeShift', -30)
+            token.addToTokenInfo('count_auth', 1)
+            token.removeFromTokenInfo('timeStep')
+
+            self.assertEqual(dumps.call_count, 0)
+            self.assertEqual(token.getFromTokenInfo('timeShift'), -30)
+
+            Session.commit()
+
+            self.assertEqual(dumps.call_count, 1)
+
+        self.assertEqual(self.stored_info(), {'hashlib': 'sha1',
+                                              'timeShift': -30,
+                                              'count_auth': 1})
+
+    def test_unmodified_info_not_serialized(self):
+        """
+        reading the token info does not write it back
+        """
+
+        token = self.load_token()
+        token.getTokenInfo()
+
+        with patch('linotp.model.json.dumps', wraps=json.dumps) as dumps:
+            Session.commit()
+            self.assertEqual(dumps.call_count, 0)
+
+    def test_copy_of_token_info(self):
+        """
+        changes of the returned token info dict are not taken over
+        """
+
+        token = self.load_token()
+
+        info = token.getTokenInfo()
+        info['hashlib'] = 'sha256'
+
+        self.assertEqual(token.getFromTokenInfo('hashlib'), 'sha1')
+
+    def test_direct_info_update(self):
+        """
+        the serialized token info is up to date and a directly set token info
+        replaces the parsed token info
+        """
+
+        token = self.load_token()
+
+        token.addToTokenInfo('timeShift', 30)
+        self.assertEqual(json.loads(token.token.getInfo())['timeShift'], 30)
+
+        token.token.setInfo(u'' + json.dumps({'hashlib': 'sha256'}))
+        self.assertEqual(token.getTokenInfo(), {'hashlib': 'sha256'})
+
+        Session.commit()
+
+        self.assertEqual(self.stored_info(), {'hashlib': 'sha256'})
+
+    def test_info_rollback(self):
+        """
+        the modified token info is dropped by a rollback
+        """
+
+        token = self.load_token()
+
+        token.addToTokenInfo('timeShift', 30)
+        self.assertEqual(token.getFromTokenInfo('timeShift'), 30)
+
+        Session.rollback()
+
+        self.assertEqual(token.getFromTokenInfo('timeShift', 0), 0)
+
+        token.addToTokenInfo('count_auth', 1)
+        Session.commit()
+
+        self.assertEqual(self.stored_info(), {'hashlib': 'sha1',
+                                              'timeStep': 30,
+                                              'count_auth': 1})
+
+    def test_token_repr(self):
+        """
+        the parsed token info does not break the token representation
+        """
+
+        token = self.load_token()
+        token.addToTokenInfo('timeShift', 30)
+
+        self.assertIn('INFO01', repr(token.token))
+
+# eof #
@@ -48,6 +48,8 @@ import linotp
 
 from linotp.lib.challenges import Challenges
 from linotp.lib.config import getFromConfig
+from linotp.lib.otp_lookahead import is_otp_lookahead_enabled
+from linotp.lib.otp_lookahead import update_token as update_lookahead
 from linotp.lib.crypto import SecretObj
 from linotp.lib.crypto import get_hashalgo_from_description
 
@@ -980,6 +982,12 @@ class TokenClass(TokenInfoMixin, TokenValidityMixin):
         self.token.LinOtpIdResClass = uidResolverClass
         self.token.LinOtpUserid = uuserid
 
+        # the owner login is preserved for the token search by user
+        owner_login = u''
+        if uuserid and user is not None:
+            owner_login = user.login.lower()
+        self.token.LinOtpOwnerLogin = owner_login
+
     def getUser(self):
         """
         get the user info of the token
@@ -998,13 +1006,23 @@ class TokenClass(TokenInfoMixin, TokenValidityMixin):
         uuserid = self.token.LinOtpUserid or ''
         return (uuserid, uidResolver, uidResolverClass)
 
-    def setUid(self, uid, uidResolver, uidResClass):
+    def setUid(self, uid, uidResolver, uidResClass, login=None):
         '''
         sets the UID values in the database
+
+        :param login: the login of the user - if not provided, the owner
+                      login is left to be resolved by the token owner update
         '''
         self.token.LinOtpIdResolver = uidResolver
         self.token.LinOtpIdResClass = uidResClass
         self.token.LinOtpUserid = uid
+
+        owner_login = None
+        if not uid:
+            owner_login = u''
+        elif login:
+            owner_login = login.lower()
+        self.token.LinOtpOwnerLogin = owner_login
         return
 
     def reset(self):
@@ -1088,8 +1106,11 @@ class TokenClass(TokenInfoMixin, TokenValidityMixin):
         self.token.set_encrypted_seed(enc_otp_key, iv,
                                       reset_failcount=reset_failcount)
 
+        self._update_otp_lookahead()
+
     def setOtpLen(self, otplen):
         self.token.LinOtpOtpLen = int(otplen)
+        self._update_otp_lookahead()
 
     def getOtpLen(self):
         return self.token.LinOtpOtpLen
@@ -1157,6 +1178,19 @@ class TokenClass(TokenInfoMixin, TokenValidityMixin):
 
     def setHashLib(self, hashlib):
         self.addToTokenInfo("hashlib", hashlib)
+        self._update_otp_lookahead()
+
+    def _update_otp_lookahead(self):
+        '''
+        the otp lookahead index of an unassigned token follows the changes
+        of its otp values - new tokens are indexed, when they are created
+        '''
+
+        if self.token.LinOtpTokenId is None:
+            return
+
+        if not self.token.LinOtpUserid and is_otp_lookahead_enabled():
+            update_lookahead(self)
 
     def incOtpFailCounter(self):
 
@@ -1233,6 +1267,8 @@ class TokenClass(TokenInfoMixin, TokenValidityMixin):
             raise TokenAdminError("Token Counter update failed: %r" % (ex),
                                   id=1106)
 
+        self._update_otp_lookahead()
+
         return self.token.LinOtpCount
 
     def check_otp_exist(self, otp, window=None, user=None, autoassign=False):
@@ -35,8 +35,25 @@ log = logging.getLogger(__name__)
 
 
 class TokenInfoMixin(object):
+    """
+    access to the token info of the token
+
+    the token info is parsed once per token object and serialized when the
+    token is flushed, only if it has been modified
+    """
+
+    def _get_info_dict(self):
+        """
+        get the parsed token info of the token model - a token model without
+        parsed token info support is accessed by the serialized token info
+
+        :return: dict with the token info
+        """
+
+        get_info_dict = getattr(self.token, 'getInfoDict', None)
+        if get_info_dict is not None:
+            return get_info_dict()
 
-    def getTokenInfo(self):
         info = {}
 
         tokeninfo = self.token.getInfo()
@@ -48,36 +65,49 @@ class TokenInfoMixin(object):
 
         return info
 
+    def _set_info_dict(self, info):
+        """
+        set the parsed token info of the token model
+
+        :param info: dict with the token info
+        """
+
+        set_info_dict = getattr(self.token, 'setInfoDict', None)
+        if set_info_dict is not None:
+            set_info_dict(info)
+            return
+
+        tokeninfo = u'' + json.dumps(info, indent=0)
+        self.token.setInfo(tokeninfo)
+
+    def getTokenInfo(self):
+        """
+        :return: a copy of the token info dict
+        """
+
+        return dict(self._get_info_dict())
+
     def setTokenInfo(self, info):
 
         if info is not None:
-            tokeninfo = u'' + json.dumps(info, indent=0)
-            self.token.setInfo(tokeninfo)
+            self._set_info_dict(dict(info))
 
     def addToTokenInfo(self, key, value):
-        info = {}
-        tokeninfo = self.token.getInfo()
-
-        if tokeninfo:
-            info = json.loads(tokeninfo)
 
+        info = self._get_info_dict()
         info[key] = value
 
-        self.setTokenInfo(info)
+        self._set_info_dict(info)
 
     def getFromTokenInfo(self, key, default=None):
-        ret = default
-
-        info = self.getTokenInfo()
 
-        if key in info:
-            ret = info.get(key, default)
-        return ret
+        return self._get_info_dict().get(key, default)
 
     def removeFromTokenInfo(self, key):
-        info = self.getTokenInfo()
+
+        info = self._get_info_dict()
         if key in info:
             del info[key]
-            self.setTokenInfo(info)
+            self._set_info_dict(info)
 
 # eof #
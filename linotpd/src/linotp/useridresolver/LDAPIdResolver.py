@@ -36,6 +36,8 @@ import binascii
 import logging
 import os
 import tempfile
+import threading
+import time
 import traceback
 
 import json
@@ -43,6 +45,7 @@ import sys
 
 from datetime import datetime
 from hashlib import sha1
+from hashlib import sha256
 
 import ldap.filter
 from ldap.controls import SimplePagedResultsControl
@@ -70,6 +73,12 @@ DEFAULT_EnforceTLS = False
 BIND_NOT_POSSIBLE_TIMEOUT = 30
 TIMEOUT_NO_LIMIT = -1
 
+# the pooled connections, which are idle for longer than the health check
+# interval, are verified before they are handed out again
+DEFAULT_POOLSIZE = 10
+DEFAULT_POOL_IDLE_TIMEOUT = 300
+POOL_HEALTH_CHECK_INTERVAL = 30
+
 
 def escape_filter_chars(filterstr):
     """
@@ -107,6 +116,216 @@ def _add_cacertificates_to_file(ca_file, cacertificates):
     return ca_file
 
 
+def _unbind_quietly(l_obj):
+    """
+    helper - unbind a connection, which is not used anymore
+
+    :param l_obj: the ldap connection object
+    """
+    try:
+        l_obj.unbind_s()
+    except Exception as exx:
+        log.debug("[_unbind_quietly] unbind failed: %r", exx)
+
+
+def _pool_key_digest(*values):
+    """
+    helper - digest of the secret connection parameters like the bind
+    password, so that they separate the connection pools without being part
+    of the pool key in plain text
+
+    :param values: the text values
+    :return: the hex digest
+    """
+
+    digest = sha256()
+
+    for value in values:
+        if isinstance(value, unicode):
+            value = value.encode(ENCODING)
+        value = value or ''
+        digest.update('%d:%s' % (len(value), value))
+
+    return digest.hexdigest()
+
+
+class LDAPConnectionPool(object):
+    """
+    pool of already bound ldap (service account) connections
+
+    the connections of the pool are shared across the requests, so that a
+    user lookup could be made without the round trips for the connection
+    setup, the start_tls and the bind.
+
+    - the number of idle connections is limited by the pool size
+    - connections, which are idle longer than the idle timeout, are evicted
+    - connections, which are idle longer than the health check interval, are
+      verified by a 'whoami' request, before they are handed out again
+    """
+
+    def __init__(self, size=DEFAULT_POOLSIZE,
+                 idle_timeout=DEFAULT_POOL_IDLE_TIMEOUT):
+
+        self.size = size
+        self.idle_timeout = idle_timeout
+
+        self._lock = threading.Lock()
+        self._idle = []
+
+    def acquire(self):
+        """
+        borrow an idle connection from the pool
+
+        :return: tuple of the connection and its uri or (None, None)
+        """
+
+        while True:
+
+            with self._lock:
+                if not self._idle:
+                    return None, None
+                l_obj, uri, last_used = self._idle.pop()
+
+            idle_time = time.time() - last_used
+
+            if idle_time > self.idle_timeout:
+                log.debug("[acquire] evict idle connection to %r", uri)
+                _unbind_quietly(l_obj)
+                continue
+
+            if idle_time > POOL_HEALTH_CHECK_INTERVAL:
+                try:
+                    l_obj.whoami_s()
+                except ldap.LDAPError as exx:
+                    log.info("[acquire] drop broken connection to %r: %r",
+                             uri, exx)
+                    _unbind_quietly(l_obj)
+                    continue
+
+            return l_obj, uri
+
+    def release(self, l_obj, uri):
+        """
+        return a connection to the pool - if the pool is already full, the
+        connection is closed
+
+        :param l_obj: the bound ldap connection object
+        :param uri: the uri of the ldap server the connection belongs to
+        """
+
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((l_obj, uri, time.time()))
+                return
+
+        _unbind_quietly(l_obj)
+
+    def discard_uri(self, uri):
+        """
+        drop all idle connections to an ldap server, e.g. if it is down
+
+        :param uri: the uri of the ldap server
+        """
+
+        with self._lock:
+            discarded = [entry for entry in self._idle if entry[1] == uri]
+            self._idle = [entry for entry in self._idle if entry[1] != uri]
+
+        for l_obj, _uri, _last_used in discarded:
+            _unbind_quietly(l_obj)
+
+    def clear(self):
+        """
+        drop all idle connections of the pool
+        """
+
+        with self._lock:
+            discarded = self._idle
+            self._idle = []
+
+        for l_obj, _uri, _last_used in discarded:
+            _unbind_quietly(l_obj)
+
+
+class LDAPConnectionPoolRegistry(object):
+    """
+    process wide registry of the ldap connection pools
+
+    the pools are identified by the connection parameters like the ldap
+    uris and the bind dn. Each resolver, identified by its config identifier,
+    refers to one pool. If the resolver config changes, the reference is
+    dropped and the pool is cleared when no other resolver is using it.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._pools = {}
+        self._owners = {}
+
+    def get_pool(self, key, size, idle_timeout, owner):
+        """
+        get the connection pool for the connection parameters
+
+        :param key: tuple of the connection parameters
+        :param size: the max number of idle connections
+        :param idle_timeout: the max idle time of a connection
+        :param owner: the resolver config identifier
+        :return: the connection pool
+        """
+
+        with self._lock:
+
+            previous_key = self._owners.get(owner)
+            if previous_key is not None and previous_key != key:
+                self._release(owner)
+
+            entry = self._pools.get(key)
+            if entry is None:
+                entry = {'pool': LDAPConnectionPool(size, idle_timeout),
+                         'owners': set()}
+                self._pools[key] = entry
+
+            entry['pool'].size = size
+            entry['pool'].idle_timeout = idle_timeout
+
+            entry['owners'].add(owner)
+            self._owners[owner] = key
+
+            return entry['pool']
+
+    def release(self, owner):
+        """
+        drop the pool reference of a resolver
+
+        :param owner: the resolver config identifier
+        """
+        with self._lock:
+            self._release(owner)
+
+    def _release(self, owner):
+
+        key = self._owners.pop(owner, None)
+        if key is None:
+            return
+
+        entry = self._pools.get(key)
+        if entry is None:
+            return
+
+        entry['owners'].discard(owner)
+
+        if not entry['owners']:
+            del self._pools[key]
+            log.info('clearing ldap connection pool of %r', owner)
+            entry['pool'].clear()
+
+
+connection_pool_registry = LDAPConnectionPoolRegistry()
+
+# the pools of the connections, which are used for the user password check
+auth_connection_pool_registry = LDAPConnectionPoolRegistry()
+
+
 @resolver_registry.class_entry('useridresolver.LDAPIdResolver.IdResolver')
 @resolver_registry.class_entry('useridresolveree.LDAPIdResolver.IdResolver')
 @resolver_registry.class_entry('useridresolver.ldapresolver')
@@ -168,6 +387,11 @@ class IdResolver(UserIdResolver):
         "linotp.certificates.use_system_certificates": (False, False, boolean),
         "CACERTIFICATE": (False, "", text),
 
+        "POOLSIZE": (False, DEFAULT_POOLSIZE, int),
+        "POOLTIMEOUT": (False, DEFAULT_POOL_IDLE_TIMEOUT, int),
+        "AUTHPOOLSIZE": (False, DEFAULT_POOLSIZE, int),
+        "AUTHPOOLREBIND": (False, True, boolean),
+
         }
 
     resolver_parameters.update(UserIdResolver.resolver_parameters)
@@ -574,14 +798,142 @@ class IdResolver(UserIdResolver):
         self.proxy = False
         self.uidType = DEFAULT_UID_TYPE
         self.l_obj = None
+        self.l_obj_uri = None
         self.only_trusted_certs = False
+        self.pool_size = DEFAULT_POOLSIZE
+        self.pool_idle_timeout = DEFAULT_POOL_IDLE_TIMEOUT
+        self.auth_pool_size = DEFAULT_POOLSIZE
+        self.auth_pool_rebind = True
+
+    @classmethod
+    def flush_connections(cls, config_identifier):
+        """
+        drop the pooled connections of a resolver - called when the resolver
+        config has changed or the resolver has been deleted
+
+        :param config_identifier: the resolver config identifier
+        """
+        connection_pool_registry.release(config_identifier)
+        auth_connection_pool_registry.release(config_identifier)
+
+    def _get_connection_pool(self):
+        """
+        get the process wide connection pool of the resolver
+
+        :return: the connection pool or None if pooling is disabled
+        """
+
+        if self.pool_size <= 0:
+            return None
+
+        # the connections are only shared by the resolvers, which bind with
+        # the same password and verify the server with the same certificate
+
+        bindpw = self.bindpw
+        if hasattr(bindpw, 'get_unencrypted'):
+            bindpw = bindpw.get_unencrypted()
+
+        key = (self.ldapuri, self.binddn,
+               self.enforce_tls, self.only_trusted_certs,
+               getattr(self, 'use_sys_cert', False), self.noreferrals,
+               self.network_timeout, self.response_timeout,
+               _pool_key_digest(bindpw, getattr(self, 'cacertificate', '')))
+
+        return connection_pool_registry.get_pool(
+                                            key, self.pool_size,
+                                            self.pool_idle_timeout,
+                                            self.conf)
+
+    def _get_auth_connection_pool(self):
+        """
+        get the process wide pool of the connections for the password check
+
+        these connections are not bound with the service account, but are
+        re-bound with the user dn for every password check
+
+        :return: the connection pool or None if pooling is disabled
+        """
+
+        if self.auth_pool_size <= 0:
+            return None
+
+        # the connections are only shared by the resolvers, which verify
+        # the server with the same certificate
+
+        key = (self.ldapuri,
+               self.enforce_tls, self.only_trusted_certs,
+               getattr(self, 'use_sys_cert', False), self.noreferrals,
+               self.network_timeout, self.response_timeout,
+               _pool_key_digest(getattr(self, 'cacertificate', '')))
+
+        return auth_connection_pool_registry.get_pool(
+                                            key, self.auth_pool_size,
+                                            self.pool_idle_timeout,
+                                            self.conf)
+
+    def _release_auth_connection(self, auth_pool, l_obj, uri):
+        """
+        return a connection to the pool after a successful password check
+
+        by default the connection is re-bound anonymously, so that no
+        connection in the pool keeps the identity of the last user
+
+        :param auth_pool: the password check connection pool
+        :param l_obj: the ldap connection object
+        :param uri: the uri of the ldap server
+        """
+
+        if self.auth_pool_rebind:
+            try:
+                l_obj.simple_bind_s('', '')
+            except ldap.LDAPError as exx:
+                log.warning("[checkPass] anonymous rebind failed: %r", exx)
+                _unbind_quietly(l_obj)
+                return
+
+        auth_pool.release(l_obj, uri)
+
+    def _drop_connection(self):
+        """
+        drop the connection of the resolver, e.g. after the server went down
+
+        the pooled connections to the same server are dropped as well and the
+        server is blocked in the resource scheduler, so that the next bind
+        will fail over to the next server
+        """
+
+        l_obj = self.l_obj
+        uri = self.l_obj_uri
+
+        self.l_obj = None
+        self.l_obj_uri = None
+
+        if l_obj is not None:
+            _unbind_quietly(l_obj)
+
+        if uri:
+            pool = self._get_connection_pool()
+            if pool is not None:
+                pool.discard_uri(uri)
+
+            resource_scheduler = ResourceScheduler(uri_list=[uri])
+            resource_scheduler.block(uri, delay=30, immediately=True)
 
     def close(self):
         """
         closes method is called, when the request ends
-        - here we close the ldap connection by unbind
+        - here we return the ldap connection to the connection pool or, if
+          pooling is disabled, we close the ldap connection by unbind
         """
 
+        if self.l_obj is not None:
+            pool = self._get_connection_pool()
+            if pool is not None:
+                pool.release(self.l_obj, self.l_obj_uri)
+                self.l_obj = None
+                self.l_obj_uri = None
+                return
+
         try:
             if self.l_obj is not None:
 
@@ -601,15 +953,27 @@ class IdResolver(UserIdResolver):
 
         finally:
             self.l_obj = None
+            self.l_obj_uri = None
 
     def bind(self):
         """
         bind() - this function starts an ldap conncetion
+
+        an already bound connection is taken from the connection pool,
+        only if there is none, a new connection is established
         """
 
         if self.l_obj is not None:
             return self.l_obj
 
+        pool = self._get_connection_pool()
+        if pool is not None:
+            l_obj, uri = pool.acquire()
+            if l_obj is not None:
+                self.l_obj = l_obj
+                self.l_obj_uri = uri
+                return l_obj
+
         if self.bind_not_possible:
             t2 = datetime.now()
             tdelta = t2 - self.bind_not_possible_time
@@ -645,6 +1009,7 @@ class IdResolver(UserIdResolver):
                 l_obj.simple_bind_s(dn_encode, pw_encode)
 
                 self.l_obj = l_obj
+                self.l_obj_uri = uri
                 return l_obj
 
             except ldap.LDAPError as error:
@@ -671,6 +1036,36 @@ class IdResolver(UserIdResolver):
         """
         return
 
+    def _search_all(self, base, scope, **kwargs):
+        """
+        search on the bound connection and return all results
+
+        if the connection, e.g. a pooled one, has been closed by the server
+        it is dropped and the search is retried once on a new connection
+
+        :param base: the search base
+        :param scope: the search scope
+        :param kwargs: the additional search_ext parameters
+        :return: the list of the result entries
+        """
+
+        for retry in (True, False):
+
+            l_obj = self.bind()
+            if not l_obj:
+                return None
+
+            try:
+                l_id = l_obj.search_ext(base, scope, **kwargs)
+                return l_obj.result(l_id, all=1)[1]
+
+            except ldap.SERVER_DOWN as exx:
+                log.warning("[_search_all] connection to %r lost: %r",
+                            self.l_obj_uri, exx)
+                self._drop_connection()
+                if not retry:
+                    raise exx
+
     def getUserId(self, loginname):
         '''
         return the userId which mappes to an loginname
@@ -726,15 +1121,12 @@ class IdResolver(UserIdResolver):
 
         resultList = None
         try:
-            # log.error("%r : %r" % (self.uidType, attrlist))
-            l_id = l_obj.search_ext(self.base,
-                                    ldap.SCOPE_SUBTREE,
-                                    filterstr=fil,
-                                    sizelimit=self.sizelimit,
-                                    attrlist=attrlist,
-                                    timeout=self.response_timeout)
-
-            resultList = l_obj.result(l_id, all=1)[1]
+            resultList = self._search_all(self.base,
+                                          ldap.SCOPE_SUBTREE,
+                                          filterstr=fil,
+                                          sizelimit=self.sizelimit,
+                                          attrlist=attrlist,
+                                          timeout=self.response_timeout)
 
         except ldap.LDAPError as exc:
             log.exception("[getUserId] LDAP error: %r", exc)
@@ -860,32 +1252,31 @@ class IdResolver(UserIdResolver):
 
         resultList = {}
 
-        l_id = 0
         l_obj = self.bind()
 
         if l_obj:
             try:
                 if self.uidType.lower() == "dn":
-                    l_id = l_obj.search_ext(UserId,
-                                            ldap.SCOPE_BASE,
-                                            filterstr="ObjectClass=*",
-                                            sizelimit=self.sizelimit)
+                    r = self._search_all(UserId,
+                                         ldap.SCOPE_BASE,
+                                         filterstr="ObjectClass=*",
+                                         sizelimit=self.sizelimit)
 
                 elif self.uidType.lower() == "objectguid":
                     if not self.proxy:
-                        l_id = l_obj.search_ext("<guid=%s>" % (UserId),
-                                                ldap.SCOPE_BASE,
-                                                sizelimit=self.sizelimit,
-                                                timeout=self.response_timeout)
+                        r = self._search_all("<guid=%s>" % (UserId),
+                                             ldap.SCOPE_BASE,
+                                             sizelimit=self.sizelimit,
+                                             timeout=self.response_timeout)
                     else:
                         e_u = escape_filter_chars(binascii.unhexlify(UserId))
 
                         filterstr = "(ObjectGUID=%s)" % (e_u)
-                        l_id = l_obj.search_ext(self.base,
-                                                ldap.SCOPE_SUBTREE,
-                                                filterstr=filterstr,
-                                                sizelimit=self.sizelimit,
-                                                timeout=self.response_timeout)
+                        r = self._search_all(self.base,
+                                             ldap.SCOPE_SUBTREE,
+                                             filterstr=filterstr,
+                                             sizelimit=self.sizelimit,
+                                             timeout=self.response_timeout)
                 else:
                     # ------------------------------------------------------ --
 
@@ -899,7 +1290,7 @@ class IdResolver(UserIdResolver):
                                         UserId.decode(ENCODING))
                                 ).encode(ENCODING)
 
-                    l_id = l_obj.search_ext(
+                    r = self._search_all(
                                         self.base,
                                         ldap.SCOPE_SUBTREE,
                                         filterstr=filterstr,
@@ -908,8 +1299,6 @@ class IdResolver(UserIdResolver):
 
                     # ------------------------------------------------------ --
 
-                r = l_obj.result(l_id, all=1)[1]
-
                 if r:
                     resList = r[0][1]
                     resList["dn"] = [r[0][0]]
@@ -1110,7 +1499,11 @@ class IdResolver(UserIdResolver):
                                 'USERINFO': 'string',
                                 'TIMEOUT': 'float',
                                 'SIZELIMIT': 'int',
-                                'NOREFERRALS': 'string', }
+                                'NOREFERRALS': 'string',
+                                'POOLSIZE': 'int',
+                                'POOLTIMEOUT': 'int',
+                                'AUTHPOOLSIZE': 'int',
+                                'AUTHPOOLREBIND': 'string', }
         return {typ: descriptor}
 
     def getResolverDescriptor(self):
@@ -1205,6 +1598,16 @@ class IdResolver(UserIdResolver):
         self.noreferrals = l_config["NOREFERRALS"]
         self.proxy = l_config["PROXY"]
 
+        # the process wide pool of bound connections - 0 disables pooling
+
+        self.pool_size = l_config["POOLSIZE"]
+        self.pool_idle_timeout = l_config["POOLTIMEOUT"]
+
+        # the pool of connections, which are re-bound for the password check
+
+        self.auth_pool_size = l_config["AUTHPOOLSIZE"]
+        self.auth_pool_rebind = l_config["AUTHPOOLREBIND"]
+
         return self
 
     @classmethod
@@ -1288,6 +1691,10 @@ class IdResolver(UserIdResolver):
                     else:
                         if result_type == ldap.RES_SEARCH_ENTRY:
                             resultList.append(result_data)
+            except ldap.SERVER_DOWN as exc:
+                log.exception("[searchLDAPUserList] LDAP error: %r", exc)
+                self._drop_connection()
+
             except ldap.LDAPError as exc:
                 log.exception("[searchLDAPUserList] LDAP error: %r", exc)
 
@@ -1351,6 +1758,42 @@ class IdResolver(UserIdResolver):
         log.debug("[checkPass] we will try to authenticate to these LDAP "
                   "servers: %r", urilist)
 
+        # ------------------------------------------------------------------ --
+
+        # first try to verify the password on an already established
+        # connection from the pool, which saves the connect and start_tls
+
+        auth_pool = self._get_auth_connection_pool()
+
+        while auth_pool is not None:
+
+            l_obj, uri = auth_pool.acquire()
+            if l_obj is None:
+                break
+
+            try:
+                log.info("[checkPass] check password for user %r "
+                         "on pooled connection to %r", DN, uri)
+
+                l_obj.simple_bind_s(DN, password)
+                log.info("[checkPass] ldap bind for %r successful", DN)
+
+                self._release_auth_connection(auth_pool, l_obj, uri)
+                return True
+
+            except ldap.INVALID_CREDENTIALS as error:
+                log.warning("[checkPass] invalid credentials: %r", error)
+                _unbind_quietly(l_obj)
+                return False
+
+            except ldap.LDAPError as error:
+                log.warning("[checkPass] pooled connection to %r "
+                            "failed: %r", uri, error)
+                _unbind_quietly(l_obj)
+                auth_pool.discard_uri(uri)
+
+        # ------------------------------------------------------------------ --
+
         last_error = None
         resource_scheduler = ResourceScheduler(tries=2, uri_list=urilist)
 
@@ -1363,6 +1806,13 @@ class IdResolver(UserIdResolver):
 
                 l_obj.simple_bind_s(DN, password)
                 log.info("[checkPass] ldap bind for %r successful", DN)
+
+                # keep the connection for the next password check
+
+                if auth_pool is not None:
+                    self._release_auth_connection(auth_pool, l_obj, uri)
+                    l_obj = None
+
                 return True
 
             except ldap.INVALID_CREDENTIALS as error:
@@ -1593,6 +2043,10 @@ class IdResolver(UserIdResolver):
                                     userdata[ukey] = udata
 
                             resultList.append(userdata)
+            except ldap.SERVER_DOWN as exce:
+                log.exception("[getUserList] LDAP error: %r", exce)
+                self._drop_connection()
+
             except ldap.LDAPError as exce:
                 log.exception("[getUserList] LDAP error: %r", exce)
 
@@ -1809,6 +2263,11 @@ class IdResolver(UserIdResolver):
                 results_size = results_size + len(user_list)
                 yield user_list
 
+        except ldap.SERVER_DOWN as exce:
+            log.exception("LDAP error: %r", exce)
+            self._drop_connection()
+            raise exce
+
         except ldap.LDAPError as exce:
             log.exception("LDAP error: %r", exce)
             raise exce
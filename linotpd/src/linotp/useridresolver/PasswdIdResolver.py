@@ -37,6 +37,10 @@ Remarks:
 import os
 import re
 import logging
+import threading
+
+from bisect import bisect_left
+from collections import namedtuple
 
 from . import resolver_registry
 
@@ -74,6 +78,155 @@ def str2unicode(input_str):
     return output_str
 
 
+# the parsed passwd entry - the phone is the office phone and the mobile is
+# the home phone of the gecos field
+PasswdEntry = namedtuple('PasswdEntry', ['username', 'cryptpass', 'userid',
+                                         'description', 'givenname',
+                                         'surname', 'phone', 'mobile',
+                                         'email'])
+
+# very basic e-mail regex
+EMAIL_PATTERN = re.compile(r'.+@.+\..+')
+
+
+def parse_passwd_line(line):
+    """
+    parse a line of the passwd file
+
+    :param line: unicode line
+    :return: PasswdEntry or None, if the line is not a valid entry
+    """
+
+    fields = line.split(":", 7)
+    if len(fields) < 3:
+        return None
+
+    description = fields[4] if len(fields) > 4 else u''
+
+    # surname, givenname and phones are taken from the gecos field
+    descriptions = description.split(",")
+    names = descriptions[0].split(' ', 1)
+
+    givenname = names[0]
+    surname = names[1] if len(names) >= 2 else u''
+
+    phone = mobile = u''
+    if len(descriptions) >= 4:
+        phone = descriptions[2]
+        mobile = descriptions[3]
+
+    email = u''
+    for field in descriptions[4:]:
+        email_match = EMAIL_PATTERN.search(field)
+        if email_match:
+            email = email_match.group(0)
+
+    return PasswdEntry(fields[0], fields[1], fields[2], description,
+                       givenname, surname, phone, mobile, email)
+
+
+class PasswdIndex(object):
+    """
+    the parsed passwd file with the lookup indexes
+
+    the index is immutable after it has been build and is shared by all
+    resolver instances of the same file
+    """
+
+    def __init__(self, fileName):
+
+        self.fileName = fileName
+
+        # the user id and login lookup
+        self.by_uid = {}
+        self.by_login = {}
+
+        with open(fileName, "r") as fileHandle:
+            for line in fileHandle:
+
+                line = line.strip()
+                if not line:
+                    continue
+
+                entry = parse_passwd_line(str2unicode(line))
+                if entry is None:
+                    log.warning('[PasswdIndex] skipping invalid line in %s',
+                                fileName)
+                    continue
+
+                self.by_login[entry.username] = entry.userid
+                self.by_uid[entry.userid] = entry
+
+        # the sorted prefix indexes for the user list search
+        self.prefix_index = {
+            'username': self._sorted_index('username'),
+            'description': self._sorted_index('description'),
+            }
+
+    def _sorted_index(self, attribute):
+
+        index = sorted((getattr(entry, attribute).lower(), uid)
+                       for uid, entry in self.by_uid.iteritems())
+
+        return [key for key, _uid in index], [uid for _key, uid in index]
+
+    def search_prefix(self, attribute, prefix, exact=False):
+        """
+        lookup the user ids by the prefix or the exact value of the
+        attribute - the comparison is case insensitive
+
+        :return: list of user ids
+        """
+
+        keys, uids = self.prefix_index[attribute]
+        prefix = prefix.lower()
+
+        result = []
+
+        pos = bisect_left(keys, prefix)
+        while pos < len(keys):
+            key = keys[pos]
+            if exact and key != prefix:
+                break
+            if not key.startswith(prefix):
+                break
+            result.append(uids[pos])
+            pos += 1
+
+        return result
+
+
+# the passwd indexes per file, which are reloaded if the file changes
+_passwd_indexes = {}
+_passwd_indexes_lock = threading.Lock()
+
+
+def get_passwd_index(fileName):
+    """
+    get the shared index of the passwd file - the file is only parsed again,
+    if the file has changed, which is detected by its mtime, size and inode
+
+    :param fileName: the passwd file name
+    :return: PasswdIndex
+    """
+
+    stat = os.stat(fileName)
+    file_key = (stat.st_mtime, stat.st_size, stat.st_ino)
+
+    with _passwd_indexes_lock:
+
+        cached = _passwd_indexes.get(fileName)
+        if cached and cached[0] == file_key:
+            return cached[1]
+
+        log.info('[get_passwd_index] loading users from file %s', fileName)
+
+        index = PasswdIndex(fileName)
+        _passwd_indexes[fileName] = (file_key, index)
+
+    return index
+
+
 def tokenise(r):
     def _(s):
         ret = None
@@ -142,15 +295,20 @@ class IdResolver (UserIdResolver):
         self.fileName = ""
 
         self.name = "P"
-        self.nameDict = {}
-        self.descDict = {}
-        self.reversDict = {}
-        self.passDict = {}
-        self.officePhoneDict = {}
-        self.homePhoneDict = {}
-        self.surnameDict = {}
-        self.givennameDict = {}
-        self.emailDict = {}
+
+    @property
+    def index(self):
+        """
+        the shared index of the passwd file - it is requested on every
+        access, so that a reused resolver sees the modifications of the file
+
+        :return: PasswdIndex or None, if the file is not loaded yet
+        """
+
+        if not self.fileName:
+            return None
+
+        return get_passwd_index(self.fileName)
 
     def close(self):
         """
@@ -164,63 +322,14 @@ class IdResolver (UserIdResolver):
           init loads the /etc/passwd
             user and uid as a dict for /
             user loginname lookup
+
+          the parsed file is shared by all resolvers of the same file
         """
 
         if (self.fileName == ""):
             self.fileName = "/etc/passwd"
 
-        log.info('[loadFile] loading users from file %s' % (self.fileName))
-
-        fileHandle = open(self.fileName, "r")
-
-        line = fileHandle.readline()
-
-        ID = self.sF["userid"]
-        NAME = self.sF["username"]
-        PASS = self.sF["cryptpass"]
-        DESCRIPTION = self.sF["description"]
-
-        while line:
-            line = line.strip()
-            if len(line) == 0:
-                continue
-
-            line = str2unicode(line)
-            fields = line.split(":", 7)
-            self.nameDict["%s" % fields[NAME]] = fields[ID]
-
-            ## for speed reason - build a revers lookup
-            self.reversDict[fields[ID]] = "%s" % fields[NAME]
-
-            ## for full info store the line
-            self.descDict[fields[ID]] = fields
-
-            ## store the crypted password
-            self.passDict[fields[ID]] = fields[PASS]
-
-            ## store surname, givenname and phones
-            descriptions = fields[DESCRIPTION].split(",")
-            name = descriptions[0]
-            names = name.split(' ', 1)
-            self.givennameDict[fields[ID]] = names[0]
-            self.surnameDict[fields[ID]] = ""
-            self.officePhoneDict[fields[ID]] = ""
-            self.homePhoneDict[fields[ID]] = ""
-            self.emailDict[fields[ID]] = ""
-            if len(names) >= 2:
-                self.surnameDict[fields[ID]] = names[1]
-            if len(descriptions) >= 4:
-                self.officePhoneDict[fields[ID]] = descriptions[2]
-                self.homePhoneDict[fields[ID]] = descriptions[3]
-            if len(descriptions) >= 5:
-                for field in descriptions[4:]:
-                    # very basic e-mail regex
-                    email_match = re.search('.+@.+\..+', field)
-                    if email_match:
-                        self.emailDict[fields[ID]] = email_match.group(0)
-
-            """ print ">>" + key[0] + "<< " + key[2] """
-            line = fileHandle.readline()
+        get_passwd_index(self.fileName)
 
     def checkPass(self, uid, password):
         """
@@ -238,7 +347,7 @@ class IdResolver (UserIdResolver):
                        crypt.crypt() function.")
             password = password.encode('utf-8')
         log.info("[checkPass] checking password for user uid %s" % uid)
-        cryptedpasswd = self.passDict[uid]
+        cryptedpasswd = self.index.by_uid[uid].cryptpass
         log.debug("[checkPass] We found the crypted pass %s for uid %s"
                                                     % (cryptedpasswd, uid))
         if cryptedpasswd:
@@ -270,22 +379,34 @@ class IdResolver (UserIdResolver):
         :param no_passwd: retrun no password
         :return: dict of user info
         """
+        entry = self.index.by_uid.get(userId)
+
+        return self._entry_info(entry, no_passwd=no_passwd)
+
+    @staticmethod
+    def _entry_info(entry, no_passwd=False):
+        """
+        get the user info of a passwd entry
+
+        :param entry: the PasswdEntry or None
+        :param no_passwd: retrun no password
+        :return: dict of user info
+        """
         ret = {}
 
-        if userId in self.reversDict:
-            fields = self.descDict.get(userId)
+        if entry:
+            ret['username'] = entry.username
+            ret['userid'] = entry.userid
+            ret['description'] = entry.description
 
-            for key in self.sF:
-                if no_passwd and key == "cryptpass":
-                    continue
-                index = self.sF[key]
-                ret[key] = fields[index]
+            if not no_passwd:
+                ret['cryptpass'] = entry.cryptpass
 
-            ret['givenname'] = self.givennameDict.get(userId)
-            ret['surname'] = self.surnameDict.get(userId)
-            ret['phone'] = self.homePhoneDict.get(userId)
-            ret['mobile'] = self.officePhoneDict.get(userId)
-            ret['email'] = self.emailDict.get(userId)
+            ret['givenname'] = entry.givenname
+            ret['surname'] = entry.surname
+            ret['phone'] = entry.mobile
+            ret['mobile'] = entry.phone
+            ret['email'] = entry.email
 
         return ret
 
@@ -296,7 +417,7 @@ class IdResolver (UserIdResolver):
         :param userId: the user to be searched
         :return: true, if a user id exists
         '''
-        return userId in self.reversDict
+        return userId in self.index.by_uid
 
     def getUserId(self, LoginName):
         """
@@ -307,7 +428,7 @@ class IdResolver (UserIdResolver):
         :param LoginName: the login of the user
         :return: the userId
         """
-        return self.nameDict.get(LoginName, '') or ''
+        return self.index.by_login.get(LoginName, '') or ''
 
     def getSearchFields(self, searchDict=None):
         """
@@ -335,9 +456,13 @@ class IdResolver (UserIdResolver):
         """
         ret = []
 
+        # the index is taken once, so that all entries of the list come from
+        # the same state of the file
+
+        index = self.index
+
         ##  first check if the searches are in the searchDict
-        for l in self.descDict:
-            line = self.descDict[l]
+        for line in self._candidates(searchDict, index):
             ok = True
 
             for search in searchDict:
@@ -363,28 +488,58 @@ class IdResolver (UserIdResolver):
                     break
 
             if ok == True:
-                uid = line[self.sF["userid"]]
-                info = self.getUserInfo(uid, no_passwd=True)
-                ret.append(info)
+                ret.append(self._entry_info(line, no_passwd=True))
 
         return ret
 
+    def _candidates(self, searchDict, index):
+        """
+        get the entries, which might match the search - if there is a
+        prefix or exact search for an indexed field, the candidates are
+        taken from the prefix index, otherwise all entries are candidates
+
+        :param searchDict: dict of search expressions
+        :param index: the PasswdIndex of the file
+        :return: iterable of PasswdEntry
+        """
+
+        by_uid = index.by_uid
+
+        for search in ['username', 'description', 'email']:
+
+            pattern = searchDict.get(search)
+            if not pattern or pattern.startswith('*'):
+                continue
+
+            # the email search is made on the description
+            attribute = 'username' if search == 'username' else 'description'
+
+            if pattern.endswith('*'):
+                uids = index.search_prefix(attribute, pattern[:-1])
+            else:
+                uids = index.search_prefix(attribute, pattern,
+                                                exact=True)
+
+            return [by_uid[uid] for uid in uids]
+
+        return by_uid.itervalues()
+
     def checkUserName(self, line, pattern):
         """
         check for user name
         """
 
-        username = line[self.sF["username"]]
+        username = line.username
         ret = self.stringMatch(username, pattern)
         return ret
 
     def checkDescription(self, line, pattern):
-        description = line[self.sF["description"]]
+        description = line.description
         ret = self.stringMatch(description, pattern)
         return ret
 
     def checkEmail(self, line, pattern):
-        email = line[self.sF["email"]]
+        email = line.description
         ret = self.stringMatch(email, pattern)
         return ret
 
@@ -425,7 +580,7 @@ class IdResolver (UserIdResolver):
         ret = False
 
         try:
-            cUserId = int(line[self.sF["userid"]])
+            cUserId = int(line.userid)
         except:
             return ret
 
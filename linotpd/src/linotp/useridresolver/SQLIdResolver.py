@@ -47,9 +47,10 @@ import json
 
 import traceback
 import logging
+import threading
 
 
-# from sqlalchemy.event import listen
+from sqlalchemy.event import listen
 
 from sqlalchemy import create_engine
 from sqlalchemy import types
@@ -57,6 +58,7 @@ from sqlalchemy.sql import expression
 from sqlalchemy import Table, MetaData
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import NoSuchColumnError
+from sqlalchemy.exc import DisconnectionError
 
 from . import resolver_registry
 from linotp.useridresolver.UserIdResolver import UserIdResolver
@@ -64,11 +66,14 @@ from linotp.useridresolver.UserIdResolver import ResolverLoadConfigError
 
 from linotp.lib.type_utils import encrypted_data
 from linotp.lib.type_utils import text
+from linotp.lib.type_utils import boolean
 
 
 log = logging.getLogger(__name__)
 
 DEFAULT_ENCODING = "utf-8"
+DEFAULT_POOL_TIMEOUT = 30
+DEFAULT_POOL_RECYCLE = 3600
 
 
 def check_php_password(password, stored_hash):
@@ -227,6 +232,156 @@ def build_simple_connect(driver, user=None, pass_=None,
     return ''.join(connect)
 
 
+class EngineRegistry(object):
+    """
+    process wide registry of the sqlalchemy engines of the sql resolvers
+
+    the engines are shared by all resolver instances, which are using the
+    same connect string and pool settings, so that the pooled connections
+    survive the end of the request and could be reused by the next one.
+
+    each resolver, identified by its config identifier, holds a reference
+    to exactly one engine. If the resolver config changes or the resolver
+    is flushed, the reference is dropped and the engine is disposed as soon
+    as no other resolver is using it.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._engines = {}
+        self._owners = {}
+
+    @staticmethod
+    def _engine_key(sqlConnect, pool_args):
+        return (sqlConnect, tuple(sorted(pool_args.items())))
+
+    def get_engine(self, sqlConnect, pool_args, owner):
+        """
+        get the engine for the connect string - create one if required
+
+        :param sqlConnect: sql url for the connection
+        :param pool_args: dict with the pool parameters of the resolver
+        :param owner: the resolver config identifier
+        :return: tuple of engine and the (shared) metadata
+        """
+
+        key = self._engine_key(sqlConnect, pool_args)
+
+        with self._lock:
+
+            previous_key = self._owners.get(owner)
+            if previous_key is not None and previous_key != key:
+                self._release(owner)
+
+            entry = self._engines.get(key)
+            if entry is None:
+                entry = {
+                    'engine': _create_engine(sqlConnect, pool_args),
+                    'meta': MetaData(),
+                    'lock': threading.RLock(),
+                    'owners': set()}
+                self._engines[key] = entry
+
+            entry['owners'].add(owner)
+            self._owners[owner] = key
+
+            return entry
+
+    def release(self, owner):
+        """
+        drop the engine reference of a resolver
+
+        :param owner: the resolver config identifier
+        """
+        with self._lock:
+            self._release(owner)
+
+    def _release(self, owner):
+
+        key = self._owners.pop(owner, None)
+        if key is None:
+            return
+
+        entry = self._engines.get(key)
+        if entry is None:
+            return
+
+        entry['owners'].discard(owner)
+
+        if not entry['owners']:
+            del self._engines[key]
+            log.info('disposing sql resolver engine of %r', owner)
+            entry['engine'].dispose()
+
+    def dispose_all(self):
+        """
+        dispose all engines - e.g. after a fork of the server process
+        """
+        with self._lock:
+            for entry in self._engines.values():
+                entry['engine'].dispose()
+            self._engines = {}
+            self._owners = {}
+
+
+engine_registry = EngineRegistry()
+
+
+def _create_engine(sqlConnect, pool_args=None):
+    """
+    create the sqlalchemy engine with the resolver pool settings
+
+    :param sqlConnect: sql url for the connection
+    :param pool_args: dict with the pool parameters of the resolver
+    :return: the engine
+    """
+
+    pool_args = pool_args or {}
+
+    args = {'echo': False, 'echo_pool': True}
+
+    # the sqlite pool classes do not support the pool sizing
+    if 'sqlite' not in sqlConnect:
+        args['pool_timeout'] = DEFAULT_POOL_TIMEOUT
+
+        if pool_args.get('pool_size'):
+            args['pool_size'] = pool_args['pool_size']
+
+        if pool_args.get('max_overflow') is not None:
+            args['max_overflow'] = pool_args['max_overflow']
+
+    if pool_args.get('pool_recycle'):
+        args['pool_recycle'] = pool_args['pool_recycle']
+
+    engine = create_engine(sqlConnect, **args)
+
+    if pool_args.get('pool_pre_ping'):
+        listen(engine, 'checkout', _ping_connection)
+
+    return engine
+
+
+def _ping_connection(dbapi_con, connection_record, connection_proxy):
+    """
+    checkout callback - verify that the pooled connection is still alive
+
+    as the pooled connections survive the request, the database server
+    might have closed them in the meantime. By raising the DisconnectionError
+    the pool will discard the connection and will try a fresh one.
+    """
+    cursor = dbapi_con.cursor()
+    try:
+        cursor.execute("SELECT 1")
+    except Exception as exx:
+        log.info("[_ping_connection] stale pooled connection: %r", exx)
+        raise DisconnectionError()
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+
 class dbObject():
 
     def __init__(self):
@@ -236,24 +391,34 @@ class dbObject():
         self.engine = None
         self.meta = None
         self.sess = None
+        self.pooled = False
+        self.meta_lock = None
 
         return None
 
-    def connect(self, sqlConnect):
+    def connect(self, sqlConnect, pool_args=None, owner=None):
         """
         create a db session with the sqlConnect string
 
         :param sqlConnect: sql url for the connection
+        :param pool_args: the pool parameters of the resolver
+        :param owner: the resolver config identifier - if given, the engine
+                      is taken from the process wide engine registry
         """
         log.debug('[dbObject::connect] %s' % sqlConnect)
 
-        args = {'echo': False, 'echo_pool': True}
-        if 'sqlite' not in sqlConnect:
-            args['pool_timeout'] = 30
-
-        self.engine = create_engine(sqlConnect, **args)
-
-        self.meta = MetaData()
+        if owner is not None:
+            entry = engine_registry.get_engine(sqlConnect,
+                                               pool_args or {}, owner)
+            self.engine = entry['engine']
+            self.meta = entry['meta']
+            self.meta_lock = entry['lock']
+            self.pooled = True
+        else:
+            self.engine = _create_engine(sqlConnect, pool_args)
+            self.meta = MetaData()
+            self.meta_lock = threading.RLock()
+            self.pooled = False
 
         Session = sessionmaker(bind=self.engine, autoflush=True,
                                autocommit=True, expire_on_commit=True)
@@ -263,8 +428,12 @@ class dbObject():
 
     def getTable(self, tableName):
         log.debug('[dbObject::getTable] %s' % tableName)
-        return Table(tableName, self.meta, autoload=True,
-                     autoload_with=self.engine)
+
+        # the metadata of pooled engines is shared, so the table
+        # reflection is only done once per engine
+        with self.meta_lock:
+            return Table(tableName, self.meta, autoload=True,
+                         autoload_with=self.engine)
 
     def count(self, table, where=""):
         log.debug('[dbObject::count] %s:%s' % (table, where))
@@ -280,9 +449,17 @@ class dbObject():
         return self.sess.execute(select)
 
     def close(self):
+        """
+        close the session, which returns the connection to the pool -
+        only a not pooled engine is disposed as well
+        """
         log.debug('[dbObject::close]')
         if self.sess is not None:
             self.sess.close()
+
+        if self.engine is not None and not self.pooled:
+            self.engine.dispose()
+
         return
 
 
@@ -392,6 +569,10 @@ class IdResolver(UserIdResolver):
         "Where": (False, "", text),
         "Map": (False, "", text),
         "Encoding": (False, DEFAULT_ENCODING, text),
+        "PoolSize": (False, 5, int),
+        "MaxOverflow": (False, 10, int),
+        "PoolRecycle": (False, DEFAULT_POOL_RECYCLE, int),
+        "PoolPrePing": (False, False, boolean),
         }
     resolver_parameters.update(UserIdResolver.resolver_parameters)
 
@@ -485,11 +666,15 @@ class IdResolver(UserIdResolver):
         self.conf = ""
         self.driver = ""
         self.limit = 1000
+        self.pool_args = {}
         self.dbObj = None
 
     def connect(self, sqlConnect=None):
         """
         create a db connection and preserve session in self.dbObj
+
+        the engine and its connection pool are taken from the process wide
+        engine registry, so that the connections are reused across requests
         """
         if self.dbObj is not None:
             return self.dbObj
@@ -498,19 +683,33 @@ class IdResolver(UserIdResolver):
         if sqlConnect is None:
             sqlConnect = self.sqlConnect
 
-        self.dbObj.connect(sqlConnect)
+        self.dbObj.connect(sqlConnect, pool_args=self.pool_args,
+                           owner=self.conf)
 
         return self.dbObj
 
     def close(self):
         """
-        close the db connection - will be called at the end of the request
+        close the db session - will be called at the end of the request
+
+        the pooled connection is only returned to the engine pool and
+        will be reused by the next request
         """
         if self.dbObj is not None:
             self.dbObj.close()
             self.dbObj = None
         return
 
+    @classmethod
+    def flush_connections(cls, config_identifier):
+        """
+        drop the pooled engine of a resolver - called when the resolver
+        config has changed or the resolver has been deleted
+
+        :param config_identifier: the resolver config identifier
+        """
+        engine_registry.release(config_identifier)
+
     def getResolverId(self):
         """
         getResolverId - provide the resolver identifier
@@ -661,7 +860,11 @@ class IdResolver(UserIdResolver):
                                 'Where': 'sting',
                                 'Encoding': 'string',
                                 'UserInfo': 'string',
-                                'conParams': 'string', }
+                                'conParams': 'string',
+                                'PoolSize': 'int',
+                                'MaxOverflow': 'int',
+                                'PoolRecycle': 'int',
+                                'PoolPrePing': 'string', }
 
         return {typ: descriptor}
 
@@ -718,6 +921,13 @@ class IdResolver(UserIdResolver):
         self.sqlWhere = l_config["Where"]
         self.sqlEncoding = l_config.get("Encoding") or DEFAULT_ENCODING
 
+        self.pool_args = {
+            'pool_size': l_config["PoolSize"],
+            'max_overflow': l_config["MaxOverflow"],
+            'pool_recycle': l_config["PoolRecycle"],
+            'pool_pre_ping': l_config["PoolPrePing"],
+            }
+
         # ------------------------------------------------------------------ --
 
         userInfo = l_config["Map"].strip("'").strip('"')
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+#
+#    LinOTP - the open source solution for two factor authentication
+#    Copyright (C) 2010 - 2018 KeyIdentity GmbH
+#
+#    This file is part of LinOTP server.
+#
+#    This program is free software: you can redistribute it and/or
+#    modify it under the terms of the GNU Affero General Public
+#    License, version 3, as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the
+#               GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#    E-mail: linotp@keyidentity.com
+#    Contact: www.linotp.org
+#    Support: www.keyidentity.com
+#
+"""add the indexed created datetime column to the audit table
+
+Revision ID: 3b5c0a7d9e21
+Revises: d21455fbe5f
+Create Date: 2018-06-12 10:21:37.204811
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3b5c0a7d9e21'
+down_revision = 'd21455fbe5f'
+
+import datetime
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+from upgrades.util import get_audit_table_name
+from upgrades.util import table_has_column
+from upgrades.util import where_from
+
+# the timestamp string format of the audit entries
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+BACKFILL_BATCH_SIZE = 10000
+
+log = logging.getLogger(__name__)
+
+
+def upgrade(engine_name):
+    globals()["upgrade_%s" % engine_name]()
+
+
+def downgrade(engine_name):
+    globals()["downgrade_%s" % engine_name]()
+
+
+def upgrade_linotp():
+    pass
+
+
+def downgrade_linotp():
+    pass
+
+
+def upgrade_audit():
+    engine = op.get_bind().engine
+
+    for audit_table_name in get_audit_table_name(engine):
+
+        if table_has_column(engine, audit_table_name, 'created') == False:
+            op.add_column(audit_table_name,
+                          sa.Column('created', sa.types.DateTime))
+            op.create_index('ix_%s_created' % audit_table_name,
+                            audit_table_name, ['created'])
+
+        if 'online' == where_from():
+            backfill_created(audit_table_name)
+        else:
+            log.warning("the created datetime of the existing entries of "
+                        "the audit table %s is not filled by the offline "
+                        "upgrade - the date range search compares the "
+                        "timestamp of these entries instead, which could "
+                        "not make use of the created index",
+                        audit_table_name)
+
+    return
+
+
+def backfill_created(audit_table_name):
+    """
+    set the created datetime of the existing entries from their timestamp
+    string - in batches to not lock the whole audit table
+    """
+
+    connection = op.get_bind()
+
+    table = sa.table(audit_table_name,
+                     sa.column('id', sa.types.Integer),
+                     sa.column('timestamp', sa.types.Unicode(30)),
+                     sa.column('created', sa.types.DateTime))
+
+    select = sa.select([table.c.id, table.c.timestamp])\
+        .where(table.c.created == None)\
+        .order_by(table.c.id)\
+        .limit(BACKFILL_BATCH_SIZE)
+
+    update = table.update()\
+        .where(table.c.id == sa.bindparam('entry_id'))\
+        .values(created=sa.bindparam('entry_created'))
+
+    last_id = -1
+
+    while True:
+
+        rows = connection.execute(select.where(table.c.id > last_id))\
+            .fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for entry_id, timestamp in rows:
+            try:
+                created = datetime.datetime.strptime(timestamp,
+                                                     TIMESTAMP_FORMAT)
+            except (TypeError, ValueError):
+                continue
+
+            updates.append({'entry_id': entry_id, 'entry_created': created})
+
+        if updates:
+            connection.execute(update, updates)
+
+        last_id = rows[-1][0]
+
+    return
+
+
+def downgrade_audit():
+    engine = op.get_bind().engine
+
+    for audit_table_name in get_audit_table_name(engine):
+        if table_has_column(engine, audit_table_name, 'created'):
+            op.drop_index('ix_%s_created' % audit_table_name,
+                          audit_table_name)
+            op.drop_column(audit_table_name, 'created')
+
+    return
+
+
+def upgrade_openid():
+    pass
+
+
+def downgrade_openid():
+    pass